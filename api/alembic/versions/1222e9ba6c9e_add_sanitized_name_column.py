@@ -0,0 +1,66 @@
+"""Add sanitized_name column
+
+Revision ID: 1222e9ba6c9e
+Revises: 684f2e4cbdc5
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+
+import logging
+import re
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "1222e9ba6c9e"
+down_revision: str | None = "684f2e4cbdc5"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def _sanitize(project_name: str) -> str:
+    # Frozen copy of app.project_naming.sanitize_project_name at the time of this migration.
+    sanitized = project_name.lower()
+    sanitized = re.sub(r"\s+", "-", sanitized)
+    sanitized = re.sub(r"[^a-z0-9\-]", "_", sanitized)
+    return sanitized.strip("-_")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("games", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("sanitized_name", sa.String(), nullable=True))
+
+    # Backfill. Rows whose name is already sanitized win collisions, then the oldest row.
+    # Losing rows keep a NULL sanitized_name and are reported so they can be renamed by hand.
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, project FROM games ORDER BY id")).all()
+    owners: dict[str, tuple[int, str]] = {}
+    for row_id, project in sorted(rows, key=lambda row: (_sanitize(row[1]) != row[1], row[0])):
+        sanitized = _sanitize(project)
+        if sanitized in owners:
+            owner_id, owner_project = owners[sanitized]
+            logger.warning(
+                f"sanitized_name collision: project {project!r} (id {row_id}) sanitizes to {sanitized!r}, "
+                f"already taken by {owner_project!r} (id {owner_id}); leaving it NULL"
+            )
+            continue
+        owners[sanitized] = (row_id, project)
+        conn.execute(
+            sa.text("UPDATE games SET sanitized_name = :sanitized WHERE id = :id"),
+            {"sanitized": sanitized, "id": row_id},
+        )
+
+    with op.batch_alter_table("games", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_games_sanitized_name"), ["sanitized_name"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("games", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_games_sanitized_name"))
+        batch_op.drop_column("sanitized_name")
@@ -0,0 +1,40 @@
+"""Add games sort indexes
+
+Revision ID: 4b1f85ebbac2
+Revises: f7eb264164c7
+Create Date: 2026-10-18 17:05:52.630218
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4b1f85ebbac2"
+down_revision: str | None = "f7eb264164c7"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("games", schema=None) as batch_op:
+        batch_op.create_index("ix_games_date_added_id", [sa.text("date_added DESC"), sa.text("id DESC")], unique=False)
+        batch_op.create_index(
+            "ix_games_date_modified_id", [sa.text("date_modified DESC"), sa.text("id DESC")], unique=False
+        )
+        batch_op.create_index(
+            "ix_games_hottest",
+            [sa.text("num_opens DESC"), sa.text("date_added DESC"), sa.text("date_modified DESC"), sa.text("id DESC")],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("games", schema=None) as batch_op:
+        batch_op.drop_index("ix_games_hottest")
+        batch_op.drop_index("ix_games_date_modified_id")
+        batch_op.drop_index("ix_games_date_added_id")
@@ -0,0 +1,53 @@
+"""Add games_fts table
+
+Revision ID: 71185b23be66
+Revises: 4b1f85ebbac2
+Create Date: 2026-10-18 17:48:26.115930
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "71185b23be66"
+down_revision: str | None = "4b1f85ebbac2"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Frozen copy of app.models.GAMES_FTS_DDL at the time of this migration.
+    op.execute("CREATE VIRTUAL TABLE games_fts USING fts5(project, tokenize='trigram')")
+    op.execute(
+        """
+        CREATE TRIGGER games_fts_insert AFTER INSERT ON games BEGIN
+            INSERT INTO games_fts(rowid, project) VALUES (new.id, new.project);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER games_fts_delete AFTER DELETE ON games BEGIN
+            DELETE FROM games_fts WHERE rowid = old.id;
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER games_fts_update AFTER UPDATE OF project ON games BEGIN
+            UPDATE games_fts SET project = new.project WHERE rowid = old.id;
+        END
+        """
+    )
+    op.execute("INSERT INTO games_fts(rowid, project) SELECT id, project FROM games")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER games_fts_update")
+    op.execute("DROP TRIGGER games_fts_delete")
+    op.execute("DROP TRIGGER games_fts_insert")
+    op.execute("DROP TABLE games_fts")
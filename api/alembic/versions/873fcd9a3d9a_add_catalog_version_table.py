@@ -0,0 +1,34 @@
+"""Add catalog_version table
+
+Revision ID: 873fcd9a3d9a
+Revises: 71185b23be66
+Create Date: 2026-10-18 18:31:40.226871
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "873fcd9a3d9a"
+down_revision: str | None = "71185b23be66"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    catalog_version = op.create_table(
+        "catalog_version",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.bulk_insert(catalog_version, [{"id": 1, "version": 0}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("catalog_version")
@@ -0,0 +1,42 @@
+"""Add thumbnail_jobs table
+
+Revision ID: a5aeb2f450a7
+Revises: c6f5ffdcd60a
+Create Date: 2026-10-18 15:02:44.187305
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a5aeb2f450a7"
+down_revision: str | None = "c6f5ffdcd60a"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "thumbnail_jobs",
+        sa.Column("project", sa.String(), nullable=False),
+        sa.Column("game_url", sa.String(), nullable=False),
+        sa.Column("requested_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("due_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("claimed_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("project"),
+    )
+    with op.batch_alter_table("thumbnail_jobs", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_thumbnail_jobs_due_at"), ["due_at"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("thumbnail_jobs", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_thumbnail_jobs_due_at"))
+
+    op.drop_table("thumbnail_jobs")
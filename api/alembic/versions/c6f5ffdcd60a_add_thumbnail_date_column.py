@@ -0,0 +1,30 @@
+"""Add thumbnail_date column
+
+Revision ID: c6f5ffdcd60a
+Revises: 1222e9ba6c9e
+Create Date: 2026-10-18 13:41:07.551903
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c6f5ffdcd60a"
+down_revision: str | None = "1222e9ba6c9e"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("games", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("thumbnail_date", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("games", schema=None) as batch_op:
+        batch_op.drop_column("thumbnail_date")
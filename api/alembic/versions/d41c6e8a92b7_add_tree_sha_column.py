@@ -0,0 +1,29 @@
+"""Add tree_sha column
+
+Revision ID: d41c6e8a92b7
+Revises: 873fcd9a3d9a
+Create Date: 2026-10-18 21:12:44.318205
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d41c6e8a92b7"
+down_revision: str | None = "873fcd9a3d9a"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Not in batch mode: copying the table would drop the games_fts triggers.
+    op.add_column("games", sa.Column("tree_sha", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("games", "tree_sha")
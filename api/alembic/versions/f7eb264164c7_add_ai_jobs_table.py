@@ -0,0 +1,49 @@
+"""Add ai_jobs table
+
+Revision ID: f7eb264164c7
+Revises: a5aeb2f450a7
+Create Date: 2026-10-18 16:20:13.904512
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f7eb264164c7"
+down_revision: str | None = "a5aeb2f450a7"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ai_jobs",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("project", sa.String(), nullable=False),
+        sa.Column("prompt", sa.Text(), nullable=False),
+        sa.Column("api_key_id", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("html_path", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("ai_jobs", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_ai_jobs_api_key_id"), ["api_key_id"], unique=False)
+        batch_op.create_index(batch_op.f("ix_ai_jobs_status"), ["status"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("ai_jobs", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_ai_jobs_status"))
+        batch_op.drop_index(batch_op.f("ix_ai_jobs_api_key_id"))
+
+    op.drop_table("ai_jobs")
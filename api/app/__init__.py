@@ -1,30 +1,61 @@
 import logging
+import math
+import os
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
+from anyio import to_thread
 from fastapi import FastAPI
+from fastapi import Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from app.database import engine
-from app.db_migrations import run_migrations
-from app.models import Base
+from app.ai_jobs import ai_job_queue
+from app.database import async_read_engine
+from app.db_migrations import ensure_schema
+from app.github import GithubUpstreamError
+from app.github_budget import GithubBudgetExhaustedError
+from app.github_budget import github_budget
+from app.http_client import async_github_client
+from app.metrics import MetricsMiddleware
+from app.metrics import mark_worker_stopped
+from app.open_counter import opens_counter
 from app.routes import router
+from app.routes import run_ai_job
 from app.settings import settings
+from app.storage import storage
 from app.subdomain_handler import SubdomainStaticFiles
+from app.thumb_queue import thumbnail_queue
 
-WORKERS = 4  # Number of worker threads for handling requests
+logging.basicConfig(level=logging.DEBUG if settings.DEBUG else logging.INFO)
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
-    # Create the database and tables if they do not exist.
+    # Normally already done by __main__ before the workers started, this only waits for the schema marker.
     try:
-        Base.metadata.create_all(bind=engine)
-        run_migrations()
+        ensure_schema()
     except Exception as e:
-        logging.error(f"Error creating database table at {settings.DB_PATH}: {e}")
+        logging.error(f"Error preparing database at {settings.DB_PATH}: {e}")
         raise e
+    # Sync routes, dependencies and other blocking calls run in anyio's default thread pool.
+    to_thread.current_default_thread_limiter().total_tokens = settings.SYNC_THREADS
+    logging.info(f"Worker {os.getpid()} started with {settings.SYNC_THREADS} threads for blocking calls")
+    static_files.load_assets()
+    github_budget.start()
+    storage.start()
+    opens_counter.start()
+    thumbnail_queue.start()
+    ai_job_queue.start(run_ai_job)
     yield
+    ai_job_queue.stop()
+    thumbnail_queue.stop()
+    opens_counter.stop()
+    storage.stop()
+    github_budget.stop()
+    await async_github_client.aclose()
+    await async_read_engine.dispose()
+    mark_worker_stopped()
 
 
 app = FastAPI(
@@ -35,7 +66,20 @@ app = FastAPI(
 )
 
 app.include_router(router)
-app.mount("/", SubdomainStaticFiles(directory="static", html=True), name="static")
+
+
+@app.exception_handler(GithubBudgetExhaustedError)
+async def github_budget_exhausted(_: Request, e: GithubBudgetExhaustedError) -> JSONResponse:
+    return JSONResponse({"detail": str(e)}, status_code=503, headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+@app.exception_handler(GithubUpstreamError)
+async def github_upstream_error(_: Request, e: GithubUpstreamError) -> JSONResponse:
+    return JSONResponse({"detail": str(e)}, status_code=502)
+
+
+static_files = SubdomainStaticFiles(directory="static", html=True)
+app.mount("/", static_files, name="static")
 
 
 app.add_middleware(
@@ -44,4 +88,6 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
@@ -1,23 +1,30 @@
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import logging
 
 import uvicorn
 
+from app.db_migrations import ensure_schema
+from app.metrics import prepare_multiprocess_dir
 from app.settings import settings
 
-WORKERS = 4  # Number of worker threads for handling requests
-
-
 if __name__ == "__main__":
     app_identifier = "app:app"
-    asyncio.get_event_loop().set_default_executor(ThreadPoolExecutor(max_workers=WORKERS))
+    # Once before the workers start, so they find the schema current.
+    ensure_schema()
+    workers = 1 if settings.RELOAD else settings.WORKERS
+    # A single worker without reload is served by this process, its metrics stay in memory.
+    if workers > 1 or settings.RELOAD:
+        prepare_multiprocess_dir()
+    logging.info(
+        f"Starting {workers} worker processes with {settings.SYNC_THREADS} threads each for blocking calls, "
+        f"{settings.DB_POOL_SIZE} + {settings.DB_MAX_OVERFLOW} database connections per engine"
+    )
 
     uvicorn.run(
         app_identifier,
         host="0.0.0.0",
         port=settings.PORT,
         reload=settings.RELOAD,
-        workers=WORKERS,
+        workers=workers,
         timeout_keep_alive=15,
         log_level="info",
     )
@@ -0,0 +1,210 @@
+import hashlib
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from datetime import datetime
+from datetime import timedelta
+
+import pytz
+from fastapi import HTTPException
+from sqlalchemy import Select
+from sqlalchemy import case
+from sqlalchemy import func
+from sqlalchemy import literal
+from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import aliased
+
+from app.database import ReadSessionLocal
+from app.database import SessionLocal
+from app.models import AIJob
+from app.settings import settings
+
+# Runs a job given its kind, project and prompt, returning the html_path of the game.
+JobHandler = Callable[[str, str, str], str]
+# id, kind, project and prompt of a claimed job.
+ClaimedJob = tuple[str, str, str, str]
+
+
+def api_key_id(api_key: str) -> str:
+    """Stable identifier of an API key that is safe to store."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+class AIJobQueue:
+    """
+    AI jobs waiting in the ai_jobs table, run by `concurrency` background threads per worker.
+
+    A job is claimed by a single UPDATE that picks the oldest queued job whose API key is below its limit of
+    running jobs, and refuses the claim while `concurrency` jobs are running, so both limits hold across worker
+    processes. One poller thread per worker claims jobs for its idle threads, and only takes the write lock
+    once a read found a job to claim, so an idle server does not write. Jobs are not retried: a job still
+    running after `stale_after` is assumed to have lost its worker and is marked failed, as its commit may or
+    may not have happened. Those are looked for every `sweep_interval`.
+    """
+
+    sweep_interval = 60.0
+
+    def __init__(
+        self,
+        concurrency: int,
+        per_key_limit: int,
+        key_limits: dict[str, int],
+        poll_interval: float,
+    ) -> None:
+        self.concurrency = concurrency
+        self.per_key_limit = per_key_limit
+        self.key_limits = {api_key_id(key): limit for key, limit in key_limits.items()}
+        self.poll_interval = poll_interval
+        # A completion followed by a few GitHub requests.
+        self.stale_after = timedelta(
+            seconds=2 * (settings.G4F_CONNECT_TIMEOUT + settings.G4F_READ_TIMEOUT + settings.GITHUB_READ_TIMEOUT)
+        )
+        self._handler: JobHandler | None = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._jobs: queue.Queue[ClaimedJob | None] = queue.Queue()
+        self._idle = threading.Semaphore(concurrency)
+        self._threads: list[threading.Thread] = []
+
+    def submit(self, db: Session, kind: str, project: str, prompt: str, api_key: str) -> AIJob:
+        job = AIJob(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            project=project,
+            prompt=prompt,
+            api_key_id=api_key_id(api_key),
+            status="queued",
+            created_at=datetime.now(pytz.utc),
+        )
+        db.add(job)
+        db.commit()
+        self._wakeup.set()
+        return job
+
+    def start(self, handler: JobHandler) -> None:
+        self._handler = handler
+        self._stopping.clear()
+        self._jobs = queue.Queue()
+        self._idle = threading.Semaphore(self.concurrency)
+        self._threads = [threading.Thread(target=self._poll, name="ai-jobs-poller", daemon=True)] + [
+            threading.Thread(target=self._work, name=f"ai-jobs-{i}", daemon=True) for i in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stops claiming jobs. Jobs in flight are not waited for, LLM calls take minutes."""
+        self._stopping.set()
+        self._wakeup.set()
+        for _ in range(self.concurrency):
+            self._jobs.put(None)
+        self._threads = []
+
+    def _poll(self) -> None:
+        next_sweep = time.monotonic()
+        while not self._stopping.is_set():
+            if time.monotonic() >= next_sweep:
+                try:
+                    self._fail_stale()
+                except Exception as e:
+                    logging.error(f"Failed to sweep stale AI jobs: {e}")
+                next_sweep = time.monotonic() + self.sweep_interval
+            if not self._idle.acquire(timeout=self.poll_interval):
+                continue
+            try:
+                job = self._claim()
+            except Exception as e:
+                logging.error(f"Failed to claim AI job: {e}")
+                job = None
+            if job is not None:
+                self._jobs.put(job)
+                continue
+            self._idle.release()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _work(self) -> None:
+        while (job := self._jobs.get()) is not None:
+            try:
+                self._execute(*job)
+            finally:
+                self._idle.release()
+
+    def _fail_stale(self) -> None:
+        now = datetime.now(pytz.utc)
+        with SessionLocal() as db:
+            db.execute(
+                update(AIJob)
+                .where(AIJob.status == "running", AIJob.started_at < now - self.stale_after)
+                .values(status="failed", error="Worker stopped while running the job", finished_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+
+    def _next_job(self) -> Select[tuple[str]]:
+        """The oldest queued job that can start now: its API key and the server are below their limits."""
+        running = aliased(AIJob)
+        candidate = aliased(AIJob)
+        running_count = select(func.count()).where(running.status == "running").scalar_subquery()
+        running_for_key = (
+            select(func.count())
+            .where(running.status == "running", running.api_key_id == candidate.api_key_id)
+            .scalar_subquery()
+        )
+        key_limit = (
+            case(self.key_limits, value=candidate.api_key_id, else_=self.per_key_limit)
+            if self.key_limits
+            else literal(self.per_key_limit)
+        )
+        return (
+            select(candidate.id)
+            .where(candidate.status == "queued", running_for_key < key_limit, running_count < self.concurrency)
+            .order_by(candidate.created_at)
+            .limit(1)
+        )
+
+    def _claim(self) -> ClaimedJob | None:
+        next_job = self._next_job()
+        with ReadSessionLocal() as db:
+            if db.execute(next_job).first() is None:
+                return None
+        # Another worker may claim it first, the UPDATE checks again.
+        stmt = (
+            update(AIJob)
+            .where(AIJob.id == next_job.scalar_subquery())
+            .values(status="running", started_at=datetime.now(pytz.utc))
+            .returning(AIJob.id, AIJob.kind, AIJob.project, AIJob.prompt)
+            .execution_options(synchronize_session=False)
+        )
+        with SessionLocal() as db:
+            row = db.execute(stmt).one_or_none()
+            db.commit()
+        return None if row is None else (row.id, row.kind, row.project, row.prompt)
+
+    def _execute(self, job_id: str, kind: str, project: str, prompt: str) -> None:
+        assert self._handler is not None
+        logging.info(f"Running AI job {job_id} ({kind} {project})")
+        values: dict[str, str | None]
+        try:
+            values = {"status": "done", "html_path": self._handler(kind, project, prompt)}
+        except HTTPException as e:
+            values = {"status": "failed", "error": str(e.detail)}
+        except Exception as e:
+            logging.error(f"AI job {job_id} failed: {e}")
+            values = {"status": "failed", "error": str(e)}
+        with SessionLocal() as db:
+            db.execute(update(AIJob).where(AIJob.id == job_id).values(**values, finished_at=datetime.now(pytz.utc)))
+            db.commit()
+
+
+ai_job_queue = AIJobQueue(
+    settings.AI_JOB_CONCURRENCY,
+    settings.AI_JOB_PER_KEY_LIMIT,
+    settings.AI_JOB_KEY_LIMITS,
+    settings.AI_JOB_POLL_SECONDS,
+)
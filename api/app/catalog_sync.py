@@ -0,0 +1,167 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import datetime
+from datetime import timezone
+
+from pydantic import BaseModel
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.github import GithubTreeTruncatedError
+from app.listing_cache import bump_catalog_version
+from app.models import Game
+from app.models import ThumbnailJob
+from app.project_naming import sanitize_project_name
+from app.settings import settings
+from app.storage import storage
+
+
+class CatalogSyncReport(BaseModel):
+    # Head commit of the branch the games table was synced with, None when the sync was skipped.
+    commit: str | None
+    added: list[str]
+    # Games whose files changed since they were last dated, dated again from their commits.
+    updated: list[str]
+    removed: list[str]
+    unchanged: int
+    # New or changed projects not dated from their commits yet, as CATALOG_SYNC_DATE_LOOKUPS was used up or the
+    # lookup failed. The next sync tries again, new projects are listed meanwhile with the date of the head commit.
+    pending: list[str]
+    dry_run: bool
+    # Why the sync was skipped, leaving the games table as it was.
+    error: str | None = None
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns naive datetimes, stored in UTC.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _look_up_dates(projects: list[str], commit: str) -> dict[str, datetime | None]:
+    """Last commit date of each project, leaving out the projects whose lookup failed."""
+    dates: dict[str, datetime | None] = {}
+    with ThreadPoolExecutor(max_workers=settings.CATALOG_SYNC_CONCURRENCY) as executor:
+        # Lookups run in a copy of the caller's context, so their GitHub calls keep its priority.
+        futures = {
+            project: executor.submit(copy_context().run, storage.last_modified, project, commit) for project in projects
+        }
+        for project, future in futures.items():
+            try:
+                dates[project] = future.result()
+            except Exception as e:
+                logging.warning(f"Could not date project {project} from its commits: {e}")
+    return dates
+
+
+def sync_catalog(db: Session, dry_run: bool = False) -> CatalogSyncReport:
+    """
+    Brings the games table in line with the project folders at the head of the branch, keeping the opens, locks,
+    thumbnails and date_added of the games already in it.
+
+    The folders are read at once with their tree shas, so a game whose tree sha is the one it was last dated with is
+    left alone. New and changed projects are dated by their last commit, with one lookup each and at most
+    CATALOG_SYNC_DATE_LOOKUPS per sync; the others are left for the next sync. Games whose folder is gone are
+    removed, unless they were never in a snapshot and were added after the head commit: the API may have just
+    created the project. Opens and thumbnails do not matter, a game people still play is removed all the same.
+    When the folders cannot all be listed the sync is skipped, rather than removing the games left out.
+    """
+    try:
+        snapshot = storage.catalog_snapshot()
+    except GithubTreeTruncatedError as e:
+        logging.error(f"Skipped the catalog sync: {e}")
+        return CatalogSyncReport(
+            commit=None,
+            added=[],
+            updated=[],
+            removed=[],
+            unchanged=db.scalar(select(func.count()).select_from(Game)) or 0,
+            pending=[],
+            dry_run=dry_run,
+            error=str(e),
+        )
+    games = {
+        game.project: game
+        for game in db.execute(
+            select(Game.id, Game.project, Game.sanitized_name, Game.tree_sha, Game.date_added, Game.date_modified)
+        )
+    }
+    new = sorted(snapshot.trees.keys() - games.keys())
+    changed = sorted(
+        project
+        for project, game in games.items()
+        if project in snapshot.trees and game.tree_sha != snapshot.trees[project]
+    )
+    # A game the API created after the head commit has never been in a snapshot, and is not in this one yet.
+    removed = sorted(
+        project
+        for project, game in games.items()
+        if project not in snapshot.trees and (game.tree_sha is not None or _as_utc(game.date_added) <= snapshot.date)
+    )
+    dates = _look_up_dates((new + changed)[: settings.CATALOG_SYNC_DATE_LOOKUPS], snapshot.commit)
+
+    # Names of the removed games are free again, they are deleted first.
+    sanitized_names = {game.sanitized_name for game in games.values() if game.sanitized_name} - {
+        games[project].sanitized_name for project in removed
+    }
+    new_games = []
+    for project in new:
+        sanitized_name = sanitize_project_name(project)
+        collides = sanitized_name in sanitized_names
+        if collides:
+            logging.warning(f"Project {project} sanitizes to the already used name {sanitized_name}")
+        sanitized_names.add(sanitized_name)
+        date = dates.get(project) or snapshot.date
+        new_games.append(
+            {
+                "project": project,
+                "sanitized_name": None if collides else sanitized_name,
+                "date_added": date,
+                "date_modified": date,
+                "num_opens": 0,
+                "locked": False,
+                "tree_sha": snapshot.trees[project] if project in dates else None,
+            }
+        )
+    # date_modified is always set, or its onupdate would stamp the sync time.
+    updated_games = [
+        {
+            "id": games[project].id,
+            "tree_sha": snapshot.trees[project],
+            "date_modified": dates[project] or games[project].date_modified,
+        }
+        for project in changed
+        if project in dates
+    ]
+
+    report = CatalogSyncReport(
+        commit=snapshot.commit,
+        added=new,
+        updated=[project for project in changed if project in dates],
+        removed=removed,
+        unchanged=len(games.keys() & snapshot.trees.keys()) - len(changed),
+        pending=[project for project in new + changed if project not in dates],
+        dry_run=dry_run,
+    )
+    if dry_run:
+        return report
+
+    if removed:
+        db.execute(delete(ThumbnailJob).where(ThumbnailJob.project.in_(removed)))
+        db.execute(delete(Game).where(Game.project.in_(removed)))
+    if new_games:
+        db.execute(insert(Game), new_games)
+    if updated_games:
+        db.execute(update(Game), updated_games)
+    if removed or new_games or updated_games:
+        bump_catalog_version(db)
+    db.commit()
+    logging.info(
+        f"Synced the catalog with {snapshot.commit}: {len(report.added)} added, {len(report.updated)} updated,"
+        f" {len(report.removed)} removed, {len(report.pending)} pending"
+    )
+    return report
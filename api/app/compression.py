@@ -0,0 +1,75 @@
+import gzip
+from collections.abc import Callable
+from collections.abc import Collection
+
+import anyio
+import brotli
+
+from app.content_cache import CachedFile
+from app.content_cache import variant_cache
+from app.settings import settings
+
+# Variants are computed once per file version, so the levels favour size over speed.
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {
+    "br": lambda body: brotli.compress(body, quality=9),
+    "gzip": lambda body: gzip.compress(body, compresslevel=9, mtime=0),
+}
+try:
+    import zstandard
+except ImportError:
+    pass
+else:
+    ENCODERS["zstd"] = lambda body: zstandard.ZstdCompressor(level=12).compress(body)
+
+# Our preference when the client accepts several encodings equally.
+PREFERENCE = ["br", "zstd", "gzip"]
+
+
+def is_compressible(media_type: str | None) -> bool:
+    return media_type is not None and media_type.split(";")[0].strip().lower() in settings.COMPRESSIBLE_TYPES
+
+
+def negotiate_encoding(accept_encoding: str | None, encodings: Collection[str] = ENCODERS.keys()) -> str | None:
+    """The best of the encodings among those of the Accept-Encoding header, None for identity."""
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, *params = item.strip().lower().split(";")
+        weight = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip()] = weight
+    wildcard = weights.get("*", 0.0)
+    candidates = [
+        (weights.get(encoding, wildcard), -rank)
+        for rank, encoding in enumerate(PREFERENCE)
+        if encoding in encodings and weights.get(encoding, wildcard) > 0
+    ]
+    if not candidates:
+        return None
+    return PREFERENCE[-max(candidates)[1]]
+
+
+async def compressed_variant(sha: str, encoding: str, body: bytes) -> bytes | None:
+    """
+    The body encoded with the encoding, cached by the git blob sha of the body. None when the body is below
+    COMPRESSION_MIN_SIZE or does not get any smaller, in which case it is served as is.
+    """
+    if len(body) < settings.COMPRESSION_MIN_SIZE:
+        return None
+    cached = variant_cache.get((sha, encoding))
+    if cached is not None:
+        variant_cache.record_hit()
+    else:
+        content = await anyio.to_thread.run_sync(ENCODERS[encoding], body)
+        # A variant that is not smaller is cached empty, so it is not compressed again.
+        cached = CachedFile(content=content if len(content) < len(body) else b"", sha=sha)
+        variant_cache.put((sha, encoding), cached)
+        variant_cache.record_miss()
+    return cached.content or None
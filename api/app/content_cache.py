@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+
+from app.settings import settings
+
+CacheKey = tuple[str, str]
+
+
+def git_blob_sha(content: bytes) -> str:
+    """Returns the git blob sha of the content, the same one GitHub reports for the file."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+@dataclass
+class CachedFile:
+    content: bytes
+    etag: str | None = None
+    sha: str = ""
+    validated_at: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self) -> None:
+        if not self.sha:
+            self.sha = git_blob_sha(self.content)
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+    def is_fresh(self, max_age: float) -> bool:
+        return time.monotonic() - self.validated_at < max_age
+
+
+class ContentCache:
+    """
+    LRU cache of project files bounded by the total size of the cached bodies.
+
+    Entries are keyed by (project, path) and keep the GitHub ETag so that stale
+    entries can be revalidated with a conditional request instead of refetched.
+    The compressed variants of served files are kept in another instance, keyed
+    by (blob sha, encoding) so they never need invalidating.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[CacheKey, CachedFile] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey) -> CachedFile | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: CacheKey, entry: CachedFile) -> None:
+        with self._lock:
+            self._pop(key)
+            if entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+                self.evictions += 1
+
+    def invalidate(self, project: str, path: str | None = None) -> None:
+        """Drops a single file, or every file of the project when no path is given."""
+        with self._lock:
+            if path is not None:
+                self._pop((project, path))
+                return
+            for key in [key for key in self._entries if key[0] == project]:
+                self._pop(key)
+
+    def record_hit(self, revalidated: bool = False, stale: bool = False) -> None:
+        with self._lock:
+            self.hits += 1
+            if revalidated:
+                self.revalidations += 1
+            if stale:
+                self.stale_hits += 1
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "stale_hits": self.stale_hits,
+                "evictions": self.evictions,
+            }
+
+    def _pop(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+
+content_cache = ContentCache(settings.CONTENT_CACHE_MAX_BYTES)
+variant_cache = ContentCache(settings.COMPRESSION_CACHE_MAX_BYTES)
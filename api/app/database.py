@@ -1,15 +1,73 @@
+from collections.abc import AsyncGenerator
 from collections.abc import Generator
+from typing import Any
 
+from sqlalchemy import Engine
 from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import sessionmaker
 
+from app.metrics import instrument_engine
 from app.settings import settings
 
+# Every engine gets its own pool per worker process, SQLite connections are cheap and the write lock is shared anyway.
+ENGINE_OPTIONS: dict[str, Any] = {
+    "echo": settings.DB_ECHO,
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+}
+
+
+def sqlite_pragmas(query_only: bool) -> list[str]:
+    """The pragmas of DB_* settings, applied to each new connection."""
+    pragmas = [
+        # Readers do not block the writer nor each other, and survive a crash with synchronous=NORMAL.
+        f"PRAGMA journal_mode={settings.DB_JOURNAL_MODE}",
+        f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}",
+        # Wait for the write lock instead of failing with "database is locked".
+        f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size=-{settings.DB_CACHE_SIZE_KIB}",
+        f"PRAGMA mmap_size={settings.DB_MMAP_SIZE_BYTES}",
+    ]
+    if query_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def configure_sqlite(engine: Engine, query_only: bool = False) -> Engine:
+    if engine.dialect.name == "sqlite":
+        pragmas = sqlite_pragmas(query_only)
+
+        @event.listens_for(engine, "connect")
+        def apply_pragmas(dbapi_connection: Any, _: Any) -> None:
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return engine
+
+
 # Use future=True to adopt the SQLAlchemy 2.0 style.
-engine = create_engine(settings.DB_PATH, future=True, echo=True)
+engine = configure_sqlite(create_engine(settings.DB_PATH, future=True, **ENGINE_OPTIONS))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+instrument_engine(engine, "write")
+
+# Read-only connections for the routes that only read, so they can never take the write lock:
+# the same database through aiosqlite for the async handlers, and a sync engine for the others.
+async_read_engine = create_async_engine(make_url(settings.DB_PATH).set(drivername="sqlite+aiosqlite"), **ENGINE_OPTIONS)
+configure_sqlite(async_read_engine.sync_engine, query_only=True)
+instrument_engine(async_read_engine.sync_engine, "async_read")
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+read_engine = configure_sqlite(create_engine(settings.DB_PATH, future=True, **ENGINE_OPTIONS), query_only=True)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False, future=True)
+instrument_engine(read_engine, "read")
 
 
 class Base(DeclarativeBase):
@@ -22,3 +80,16 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+def get_read_db() -> Generator[Session, None, None]:
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncReadSessionLocal() as db:
+        yield db
@@ -1,12 +1,69 @@
+import fcntl
+import logging
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
 
 from alembic import command
 from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+from sqlalchemy import make_url
+
+from app.database import engine
+from app.models import Base
+from app.settings import settings
+
+# assume this file lives next to alembic.ini
+ALEMBIC_CONFIG = Path(__file__).resolve().parent.parent / "alembic.ini"
 
 
 def run_migrations():
-    # assume this file lives next to alembic.ini
-    base_dir = Path(__file__).resolve().parent.parent
-    cfg = Config(base_dir / "alembic.ini")
+    cfg = Config(ALEMBIC_CONFIG)
     # Apply all pending migrations
     command.upgrade(cfg, "head")
+
+
+def schema_is_current(head: str) -> bool:
+    """The schema marker: the revision stamped in the database is the latest one."""
+    with engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision() == head
+
+
+@contextmanager
+def migration_lock() -> Iterator[None]:
+    database = make_url(settings.DB_PATH).database
+    if not database or database == ":memory:":
+        yield
+        return
+    with open(f"{database}.migrate.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ensure_schema():
+    """
+    Brings the database to the latest revision, once across every worker process.
+
+    Runs under an exclusive file lock next to the database: the first process to get it migrates, the others wait
+    for it and then find the schema current. A new database is created from the models and stamped, as the
+    migrations start from the original games table.
+    """
+    cfg = Config(ALEMBIC_CONFIG)
+    head = ScriptDirectory.from_config(cfg).get_current_head()
+    if schema_is_current(head):
+        return
+    with migration_lock():
+        if schema_is_current(head):
+            return
+        if not inspect(engine).get_table_names():
+            logging.info(f"Creating database at {settings.DB_PATH}")
+            Base.metadata.create_all(bind=engine)
+            command.stamp(cfg, "head")
+        else:
+            logging.info(f"Migrating database at {settings.DB_PATH} to {head}")
+            run_migrations()
@@ -1,10 +1,15 @@
+import json
+import logging
+import re
+from collections.abc import Iterator
 from typing import Literal
 
 import mistletoe
-import requests
 from mistletoe.block_token import CodeFence
 from pydantic import BaseModel
 
+from app.http_client import g4f_client
+from app.metrics import upstream_call
 from app.settings import settings
 
 RoleType = Literal["user", "assistant"]
@@ -15,6 +20,7 @@ class Message(BaseModel):
     content: str
 
 
+@upstream_call("g4f")
 def get_completion(messages: list[Message]) -> str:
     headers = {
         "accept": "application/json",
@@ -25,11 +31,108 @@ def get_completion(messages: list[Message]) -> str:
         "messages": [message.model_dump() for message in messages],
     }
 
-    response = requests.post(f"{settings.GPT4F_API_URL}/api/completions", headers=headers, json=json_data)
+    response = g4f_client.post(f"{settings.GPT4F_API_URL}/api/completions", headers=headers, json=json_data)
     response.raise_for_status()
     return response.json()["completion"]
 
 
+@upstream_call("g4f")
+def stream_completion(messages: list[Message]) -> Iterator[str]:
+    """Like get_completion, yielding the completion in chunks as the backend produces them."""
+    headers = {
+        "accept": "text/event-stream",
+        "Content-Type": "application/json",
+    }
+
+    json_data = {
+        "messages": [message.model_dump() for message in messages],
+        "stream": True,
+    }
+
+    with g4f_client.post(
+        f"{settings.GPT4F_API_URL}/api/completions", headers=headers, json=json_data, stream=True
+    ) as response:
+        response.raise_for_status()
+        if not response.headers.get("content-type", "").startswith(("text/event-stream", "application/x-ndjson")):
+            # Backend without streaming support, the whole completion arrives at once.
+            yield response.json()["completion"]
+            return
+        # requests would decode event streams without a charset as ISO-8859-1, and not decode NDJSON at all.
+        response.encoding = "utf-8"
+        for line in response.iter_lines(decode_unicode=True):
+            if line.removeprefix("data:").strip() == "[DONE]":
+                return
+            chunk = parse_stream_line(line)
+            if chunk:
+                yield chunk
+
+
+def parse_stream_line(line: str) -> str | None:
+    """
+    Text carried by one line of a streamed completion: SSE `data:` lines or bare NDJSON, holding either a JSON
+    string, an object with a completion/content/token field, an OpenAI style delta, or plain text.
+    """
+    if not line or line.startswith((":", "event:", "id:", "retry:")):
+        return None
+    is_event = line.startswith("data:")
+    if is_event:
+        line = line.removeprefix("data:").removeprefix(" ")
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError:
+        # Bare text lines lost their line break to the line splitting, SSE data is a chunk on its own.
+        return line if is_event else f"{line}\n"
+    if isinstance(data, str):
+        return data
+    if not isinstance(data, dict):
+        return None
+    if data.get("error"):
+        raise ValueError(f"Completion failed: {data['error']}")
+    for key in ("completion", "content", "token", "text"):
+        if isinstance(data.get(key), str):
+            return data[key]
+    choices = data.get("choices") or [{}]
+    delta = choices[0].get("delta") or choices[0].get("message") or {}
+    content = delta.get("content")
+    return content if isinstance(content, str) else None
+
+
+class CodeFenceTracker:
+    """
+    Follows a streamed markdown response line by line to tell when its first fenced code block opens and closes,
+    the block extract_code_blocks will take the code from.
+    """
+
+    fence_pattern = re.compile(r"^ {0,3}(`{3,}|~{3,})(.*)$")
+
+    def __init__(self) -> None:
+        self.state: Literal["before", "inside", "after"] = "before"
+        self.lines = 0
+        self._fence = ""
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> list[tuple[str, dict]]:
+        """Events for the fence boundaries completed by this chunk."""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        events = []
+        for line in lines:
+            if self.state == "before":
+                match = self.fence_pattern.match(line)
+                if match:
+                    self.state = "inside"
+                    self._fence = match.group(1)
+                    events.append(("code_start", {"language": match.group(2).strip()}))
+            elif self.state == "inside":
+                stripped = line.strip()
+                if stripped.startswith(self._fence) and not stripped.strip(self._fence[0]):
+                    self.state = "after"
+                    events.append(("code_end", {"lines": self.lines}))
+                else:
+                    self.lines += 1
+        return events
+
+
 class SourceFile(BaseModel):
     name: str
     content: str
@@ -37,6 +140,8 @@ class SourceFile(BaseModel):
 
 class Context(BaseModel):
     messages: list[Message] = []
+    # Older versions of context.json hold the conversation before it was compacted.
+    history_url: str | None = None
 
 
 class Project(BaseModel):
@@ -49,6 +154,15 @@ class Project(BaseModel):
         self.context.messages.append(Message(role="assistant", content=ai_response))
         return ai_response
 
+    def prompt_stream(self, content: str) -> Iterator[str]:
+        """Like prompt, yielding the response as it arrives. It is added to the context once complete."""
+        self.context.messages.append(Message(role="user", content=content))
+        chunks = []
+        for chunk in stream_completion(self.context.messages):
+            chunks.append(chunk)
+            yield chunk
+        self.context.messages.append(Message(role="assistant", content="".join(chunks)))
+
     def prompt_without_tracking(self, content: str) -> str:
         context = self.context.model_copy(deep=True)
         context.messages.append(Message(role="user", content=content))
@@ -72,12 +186,110 @@ def extract_code_blocks(markdown: str) -> str:
     return code
 
 
-def create_project(prompt: str) -> Project:
-    project = Project()
-    response = project.prompt(
+# A whole fenced code block, or an unclosed one running to the end of the message.
+CODE_BLOCK_PATTERN = re.compile(
+    r"^ {0,3}(`{3,}|~{3,})[^\n]*\n.*?(?:^ {0,3}\1[`~]*[ \t]*$|\Z)", re.MULTILINE | re.DOTALL
+)
+
+
+class CompactionReport(BaseModel):
+    tokens_before: int
+    tokens_after: int
+    messages_before: int
+    messages_after: int
+
+
+def estimate_tokens(messages: list[Message]) -> int:
+    return sum(len(message.content) for message in messages) // 4
+
+
+def compact_context(context: Context, max_tokens: int, summarize: bool = False) -> tuple[Context, CompactionReport]:
+    """
+    Shrinks the conversation so it fits in `max_tokens`.
+    - Code blocks of every message before the last one with code are replaced by a short reference.
+    - If that is not enough, the oldest turns after the first request are dropped and replaced by a note, or
+      by a summary from the AI when `summarize` is set. The latest code and what follows it are always kept.
+    """
+    messages = [message.model_copy() for message in context.messages]
+    tokens_before = estimate_tokens(messages)
+    with_code = [i for i, message in enumerate(messages) if CODE_BLOCK_PATTERN.search(message.content)]
+    keep_from = with_code[-1] if with_code else len(messages) - 1
+    for message in messages[:keep_from]:
+        message.content = CODE_BLOCK_PATTERN.sub(code_reference, message.content)
+
+    dropped: list[Message] = []
+    while estimate_tokens(messages) > max_tokens and keep_from > 1:
+        dropped.append(messages.pop(1))
+        keep_from -= 1
+    if dropped:
+        messages.insert(1, Message(role="user", content=summarize_messages(dropped, summarize)))
+
+    report = CompactionReport(
+        tokens_before=tokens_before,
+        tokens_after=estimate_tokens(messages),
+        messages_before=len(context.messages),
+        messages_after=len(messages),
+    )
+    return context.model_copy(update={"messages": messages}), report
+
+
+def code_reference(match: re.Match[str]) -> str:
+    lines = match.group(0).rstrip("\n").split("\n")[1:]
+    if lines and lines[-1].strip(" `~") == "":
+        lines.pop()
+    return f"[{len(lines)} lines of code omitted, superseded by a later version]"
+
+
+def summarize_messages(messages: list[Message], summarize: bool) -> str:
+    note = f"[{len(messages)} earlier messages omitted]"
+    if not summarize:
+        return note
+    transcript = "\n\n".join(f"{message.role}: {message.content}" for message in messages)
+    try:
+        summary = get_completion(
+            [
+                Message(
+                    role="user",
+                    content="Summarize this conversation about a web app in a few sentences, keeping every"
+                    f" requirement and decision:\n\n{transcript}",
+                )
+            ]
+        )
+    except Exception as e:
+        logging.error(f"Failed to summarize AI context, dropping {len(messages)} messages: {e}")
+        return note
+    return f"Summary of the earlier conversation: {summary}"
+
+
+def edit_context(messages: list[Message]) -> Context:
+    """The conversation to prompt an edit with, compacted to AI_CONTEXT_MAX_TOKENS."""
+    context, report = compact_context(
+        Context(messages=messages), settings.AI_CONTEXT_MAX_TOKENS, settings.AI_CONTEXT_SUMMARIZE
+    )
+    logging.info(
+        f"AI context compacted from {report.tokens_before} to {report.tokens_after} tokens"
+        f" ({report.messages_before} to {report.messages_after} messages)"
+    )
+    return context
+
+
+def create_prompt(prompt: str) -> str:
+    return (
         f"{prompt}\nMake sure everything is in a single HTML file with embedded CSS and JS in a single code block to be"
         " used as a web app."
     )
+
+
+def edit_prompt(prompt: str) -> str:
+    return (
+        f"{prompt}\nMake sure everything is kept in a single HTML file with embedded CSS and JS in a single code block to be"
+        " used as a web app."
+    )
+
+
+def create_project(prompt: str) -> Project:
+    project = Project()
+    response = project.prompt(create_prompt(prompt))
     code = extract_code_blocks(response)
     project.add_file("index.html", code)
     return project
@@ -87,11 +299,8 @@ def edit_project(
     messages: list[Message],
     prompt: str,
 ) -> Project:
-    project = Project(context=Context(messages=messages))
-    response = project.prompt(
-        f"{prompt}\nMake sure everything is kept in a single HTML file with embedded CSS and JS in a single code block to be"
-        " used as a web app."
-    )
+    project = Project(context=edit_context(messages))
+    response = project.prompt(edit_prompt(prompt))
     code = extract_code_blocks(response)
     project.add_file("index.html", code)
     return project
@@ -1,11 +1,29 @@
 import base64
+import logging
+import random
 import re
+import threading
+import time
+from collections.abc import Callable
+from collections.abc import Mapping
 from functools import lru_cache
+from urllib.parse import quote
 
 import requests
 
+from app.content_cache import CachedFile
+from app.content_cache import content_cache
+from app.github_budget import GithubBudgetExhaustedError
+from app.http_client import github_client
+from app.metrics import upstream_call
 from app.settings import settings
 
+# Attempts at committing when the branch keeps moving under us, backing off exponentially with full jitter.
+COMMIT_ATTEMPTS = 6
+COMMIT_BACKOFF_SECONDS = 0.25
+# Commits of one worker process are made one at a time, so they never move the branch under each other.
+_commit_lock = threading.Lock()
+
 
 class GithubFileNotFoundError(Exception):
     """Custom exception for file not found in GitHub repository."""
@@ -15,6 +33,14 @@ class GithubNoLastCommitError(Exception):
     """Custom exception for no last commit found in GitHub repository."""
 
 
+class GithubUpstreamError(Exception):
+    """GitHub failed to answer a file request, with nothing cached to serve instead."""
+
+
+class GithubTreeTruncatedError(Exception):
+    """GitHub listed only part of a tree, too large to be listed in one response."""
+
+
 @lru_cache
 def get_repo_owner_and_name(repo_url: str) -> tuple[str, str]:
     repo_url = settings.GITHUB_REPOSITORY
@@ -29,24 +55,26 @@ def get_repo_owner_and_name(repo_url: str) -> tuple[str, str]:
 
 
 @lru_cache
+@upstream_call("github")
 def get_token_user() -> str:
     """Returns the username of the authenticated GitHub user."""
     headers = {"Authorization": f"token {settings.GITHUB_API_TOKEN}"}
-    resp = requests.get("https://api.github.com/user", headers=headers)
+    resp = github_client.get(f"{settings.GITHUB_API_URL}/user", headers=headers)
     resp.raise_for_status()
     return resp.json()["login"]
 
 
+@upstream_call("github")
 def update_or_create_file(path: str, content: str, project: str) -> None:
     repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
     # Construct the GitHub API URL.
     # Files will reside under: {GAMES_PATH}/{project}/{path}
     api_url = (
-        f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents/{settings.PROJECTS_PATH}/{project}/{path}"
+        f"{settings.GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/contents/{settings.PROJECTS_PATH}/{project}/{path}"
     )
 
     headers = {"Authorization": f"token {settings.GITHUB_API_TOKEN}"}
-    get_resp = requests.get(api_url, headers=headers)
+    get_resp = github_client.get(api_url, headers=headers)
 
     # Prepare content for commit (GitHub requires the content in base64)
     content_bytes = content.encode()
@@ -62,153 +90,294 @@ def update_or_create_file(path: str, content: str, project: str) -> None:
         # If it's neither found nor a clear "not found", something is wrong.
         get_resp.raise_for_status()
 
-    put_resp = requests.put(api_url, json=data, headers=headers)
+    put_resp = github_client.put(api_url, json=data, headers=headers)
+    content_cache.invalidate(project, path)
     put_resp.raise_for_status()
 
 
-def get_file_content(project: str, path: str | None = None) -> str:
-    repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
-    base_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents/{settings.PROJECTS_PATH}/{project}"
+@upstream_call("github")
+def _fetch_file(project: str, path: str) -> CachedFile:
+    """
+    Returns the file from the content cache, revalidating it against GitHub once it is no longer fresh.
 
-    path = path or "index.html"
-    base_url = f"{base_url}/{path}"
-    resp = requests.get(
-        base_url,
-        headers={"Authorization": f"token {settings.GITHUB_API_TOKEN}", "Accept": "application/vnd.github.raw+json"},
+    Revalidation uses a conditional request with the cached ETag, which GitHub answers with a bodyless 304
+    that does not count against the rate limit. While the rate limit budget does not allow the request,
+    the cached file is served however stale.
+    """
+    cached = content_cache.get((project, path))
+    if cached is not None and cached.is_fresh(settings.CONTENT_CACHE_FRESH_SECONDS):
+        content_cache.record_hit()
+        return cached
+
+    api_url, headers = contents_request(project, path, cached)
+    try:
+        resp = github_client.get(api_url, headers=headers)
+    except GithubBudgetExhaustedError:
+        if cached is None:
+            raise
+        content_cache.record_hit(stale=True)
+        return cached
+    except requests.RequestException as e:
+        return serve_stale(cached, f"GitHub request for {api_url} failed: {e}")
+    return cache_contents_response(project, path, cached, api_url, resp.status_code, resp.content, resp.headers)
+
+
+def contents_request(project: str, path: str, cached: CachedFile | None) -> tuple[str, dict[str, str]]:
+    """URL and headers to fetch a raw project file, conditional on the cached ETag if there is one."""
+    repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
+    api_url = (
+        f"{settings.GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/contents/{settings.PROJECTS_PATH}/{project}/{path}"
     )
-    if resp.status_code == 200:
-        return resp.text
-    else:
-        raise GithubFileNotFoundError(f"File not found: {base_url}")
+    headers = {"Authorization": f"token {settings.GITHUB_API_TOKEN}", "Accept": "application/vnd.github.raw+json"}
+    if cached is not None and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    return api_url, headers
+
+
+def cache_contents_response(
+    project: str,
+    path: str,
+    cached: CachedFile | None,
+    api_url: str,
+    status_code: int,
+    content: bytes,
+    headers: Mapping[str, str],
+) -> CachedFile:
+    """
+    Updates the content cache from the response to contents_request and returns the current file. Only a 404
+    drops the cached file, on any other failure it is served however stale.
+    """
+    if status_code == 304 and cached is not None:
+        cached.validated_at = time.monotonic()
+        content_cache.record_hit(revalidated=True)
+        return cached
+    if status_code == 404:
+        content_cache.invalidate(project, path)
+        raise GithubFileNotFoundError(f"File not found: {api_url}")
+    if status_code != 200:
+        return serve_stale(cached, f"GitHub answered {status_code} for {api_url}")
+
+    entry = CachedFile(content, etag=headers.get("ETag"))
+    content_cache.put((project, path), entry)
+    content_cache.record_miss()
+    return entry
+
+
+def serve_stale(cached: CachedFile | None, error: str) -> CachedFile:
+    """The cached file after GitHub failed to revalidate it, GithubUpstreamError if there is none."""
+    if cached is None:
+        raise GithubUpstreamError(error)
+    logging.warning(f"{error}, serving the cached copy")
+    content_cache.record_hit(stale=True)
+    return cached
 
 
-def get_raw_file_content(project: str, path: str | None = None) -> bytes:
-    repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
-    base_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents/{settings.PROJECTS_PATH}/{project}"
+def get_file_content(project: str, path: str | None = None) -> str:
+    return _fetch_file(project, path or "index.html").content.decode()
 
-    path = path or "index.html"
-    base_url = f"{base_url}/{path}"
-    resp = requests.get(
-        base_url,
-        headers={"Authorization": f"token {settings.GITHUB_API_TOKEN}"},
-    )
-    if resp.status_code == 200:
-        json_data = resp.json()
-        if "download_url" in json_data:
-            # If the file is large, GitHub provides a download URL
-            download_url = json_data["download_url"]
-            resp = requests.get(download_url, headers={"Authorization": f"token {settings.GITHUB_API_TOKEN}"})
-            resp.raise_for_status()
-            return resp.content
-        # Decode the content from base64
-        content = json_data.get("content")
-        if content:
-            decoded_content = base64.b64decode(content)
-            return decoded_content
-        else:
-            raise GithubFileNotFoundError(f"File content is empty: {base_url}")
-    else:
-        raise GithubFileNotFoundError(f"File not found: {base_url}")
+
+def get_raw_file_content(project: str, path: str | None = None) -> bytes:
+    return _fetch_file(project, path or "index.html").content
 
 
 def get_file_url(project: str, path: str | None = None) -> str:
     """Returns github UI URL to the file."""
     repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
-    return f"https://www.github.com/{repo_owner}/{repo_name}/blob/main/{settings.PROJECTS_PATH}/{project}/{path or 'index.html'}"
+    return f"https://www.github.com/{repo_owner}/{repo_name}/blob/{settings.GITHUB_BRANCH}/{settings.PROJECTS_PATH}/{project}/{path or 'index.html'}"
 
 
-def delete_file(project: str, path: str) -> None:
+def get_file_history_url(project: str, path: str | None = None) -> str:
+    """Returns github UI URL to the commit history of the file."""
     repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
-    api_url = (
-        f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents/{settings.PROJECTS_PATH}/{project}/{path}"
-    )
-    headers = {"Authorization": f"token {settings.GITHUB_API_TOKEN}"}
-    # Get the SHA of the file to delete
-    get_resp = requests.get(api_url, headers=headers)
-    if get_resp.status_code == 404:
-        raise GithubFileNotFoundError(f"File not found: {path}")
-    get_resp.raise_for_status()
-    file_info = get_resp.json()
-    sha = file_info.get("sha")
-    body = {
-        "message": "Delete file via API",
-        "sha": sha,
-    }
-    resp = requests.delete(api_url, headers=headers, json=body)
-    resp.raise_for_status()
-    if resp.status_code != 200:
-        raise GithubFileNotFoundError(f"File not found: {path}")
+    return f"https://www.github.com/{repo_owner}/{repo_name}/commits/{settings.GITHUB_BRANCH}/{settings.PROJECTS_PATH}/{project}/{path or 'index.html'}"
+
 
+@upstream_call("github")
+def commit_files(project: str, changes: Mapping[str, str | None], message: str) -> None:
+    """
+    Writes or deletes (None content) any number of files of a project in a single commit.
 
+    Missing files that are asked to be deleted are skipped. Nothing is committed if there is nothing to change.
+    """
+    _commit_project_tree(project, lambda _: dict(changes), message)
+    for path in changes:
+        content_cache.invalidate(project, path)
+
+
+@upstream_call("github")
 def delete_project(project: str) -> None:
+    """Deletes every file of the project in a single commit."""
+    _commit_project_tree(project, dict.fromkeys, "Delete project via API")
+    content_cache.invalidate(project)
+
+
+def _commit_project_tree(
+    project: str,
+    build_changes: Callable[[set[str]], dict[str, str | None]],
+    message: str,
+) -> None:
+    """
+    Commits changes to the project folder through the Git Data API.
+
+    The number of requests does not depend on the number of files: read the branch ref, its commit and the
+    project tree, then create the new tree (file contents inline), the commit, and move the ref. `build_changes`
+    receives the paths currently in the project. If another process moved the branch before the ref update, the
+    whole sequence starts over from the new head after a backoff.
+    """
+    repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
+    repo_url = f"{settings.GITHUB_API_URL}/repos/{repo_owner}/{repo_name}"
+    headers = {"Authorization": f"token {settings.GITHUB_API_TOKEN}"}
+    project_path = f"{settings.PROJECTS_PATH}/{project}"
+
+    for attempt in range(COMMIT_ATTEMPTS):
+        if attempt:
+            time.sleep(random.uniform(0, COMMIT_BACKOFF_SECONDS * 2**attempt))
+        with _commit_lock:
+            ref_resp = github_client.get(f"{repo_url}/git/ref/heads/{settings.GITHUB_BRANCH}", headers=headers)
+            ref_resp.raise_for_status()
+            head_sha = ref_resp.json()["object"]["sha"]
+
+            commit_resp = github_client.get(f"{repo_url}/git/commits/{head_sha}", headers=headers)
+            commit_resp.raise_for_status()
+            base_tree = commit_resp.json()["tree"]["sha"]
+
+            tree_resp = github_client.get(
+                f"{repo_url}/git/trees/{head_sha}:{quote(project_path)}", headers=headers, params={"recursive": 1}
+            )
+            if tree_resp.status_code == 404:
+                existing = set()
+            else:
+                tree_resp.raise_for_status()
+                existing = {item["path"] for item in tree_resp.json()["tree"] if item["type"] == "blob"}
+
+            tree = []
+            for path, content in build_changes(existing).items():
+                entry: dict[str, str | None] = {"path": f"{project_path}/{path}", "mode": "100644", "type": "blob"}
+                if content is not None:
+                    entry["content"] = content
+                elif path in existing:
+                    entry["sha"] = None
+                else:
+                    continue
+                tree.append(entry)
+            if not tree:
+                return
+
+            new_tree_resp = github_client.post(
+                f"{repo_url}/git/trees", headers=headers, json={"base_tree": base_tree, "tree": tree}
+            )
+            new_tree_resp.raise_for_status()
+            new_commit_resp = github_client.post(
+                f"{repo_url}/git/commits",
+                headers=headers,
+                json={"message": message, "tree": new_tree_resp.json()["sha"], "parents": [head_sha]},
+            )
+            new_commit_resp.raise_for_status()
+
+            update_resp = github_client.patch(
+                f"{repo_url}/git/refs/heads/{settings.GITHUB_BRANCH}",
+                headers=headers,
+                json={"sha": new_commit_resp.json()["sha"], "force": False},
+            )
+            # GitHub answers 422 when the update is not a fast forward, i.e. someone else committed meanwhile.
+            if update_resp.status_code in (409, 422) and attempt < COMMIT_ATTEMPTS - 1:
+                logging.warning(f"Branch {settings.GITHUB_BRANCH} moved while committing to {project}, retrying")
+                continue
+            update_resp.raise_for_status()
+            return
+
+
+@upstream_call("github")
+def get_project_trees() -> tuple[str, str, dict[str, str]]:
+    """
+    The head commit of GITHUB_BRANCH, its date, and the tree sha of every project folder at that commit.
+
+    Three requests however many projects there are: the branch ref, its commit and the PROJECTS_PATH tree. The
+    tree is listed without recursing, its entries already carry the sha of each project folder.
+    """
     repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
-    # Loop through all files in the project and delete them
-    api_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents/{settings.PROJECTS_PATH}/{project}"
+    repo_url = f"{settings.GITHUB_API_URL}/repos/{repo_owner}/{repo_name}"
     headers = {"Authorization": f"token {settings.GITHUB_API_TOKEN}"}
-    files_resp = requests.get(api_url, headers=headers)
-    files_resp.raise_for_status()
-    files = files_resp.json()
-    for file in files:
-        file_path = file["path"]
-        delete_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents/{file_path}"
-        body = {
-            "message": "Delete file via API",
-            "sha": file["sha"],
-        }
-        delete_resp = requests.delete(delete_url, headers=headers, json=body)
-        delete_resp.raise_for_status()
-
-
-def get_projects() -> list[str]:
+
+    ref_resp = github_client.get(f"{repo_url}/git/ref/heads/{settings.GITHUB_BRANCH}", headers=headers)
+    ref_resp.raise_for_status()
+    head_sha = ref_resp.json()["object"]["sha"]
+
+    commit_resp = github_client.get(f"{repo_url}/git/commits/{head_sha}", headers=headers)
+    commit_resp.raise_for_status()
+    head_date = commit_resp.json()["committer"]["date"]
+
+    tree_resp = github_client.get(f"{repo_url}/git/trees/{head_sha}:{quote(settings.PROJECTS_PATH)}", headers=headers)
+    tree_resp.raise_for_status()
+    tree = tree_resp.json()
+    if tree.get("truncated"):
+        # A partial listing would make the missing projects look deleted.
+        raise GithubTreeTruncatedError(f"GitHub truncated the tree of {settings.PROJECTS_PATH}")
+    return head_sha, head_date, {item["path"]: item["sha"] for item in tree["tree"] if item["type"] == "tree"}
+
+
+@upstream_call("github")
+def get_last_commit_date(project: str, ref: str) -> str | None:
+    """Committer date of the newest commit reachable from `ref` that changed the project folder."""
     repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
-    api_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents/{settings.PROJECTS_PATH}"
     headers = {"Authorization": f"token {settings.GITHUB_API_TOKEN}"}
-    resp = requests.get(api_url, headers=headers)
+    commits_url = f"{settings.GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/commits"
+    params: dict[str, str | int] = {"path": f"{settings.PROJECTS_PATH}/{project}", "sha": ref, "per_page": 1}
+    resp = github_client.get(commits_url, headers=headers, params=params)
     resp.raise_for_status()
-    return [item["name"] for item in resp.json() if item["type"] == "dir"]
+    commits = resp.json()
+    return commits[0]["commit"]["committer"]["date"] if commits else None
 
 
-def is_last_committer_token_user(project: str, path: str) -> bool:
-    """
-    Checks if the last person who committed to a file is the same as the token user.
-    Returns True if the last committer matches the token user, False otherwise.
-    """
+@upstream_call("github")
+def get_project_files(project: str) -> list[str]:
+    """Returns the paths of all files in the project, relative to the project folder."""
+    repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
+    base_url = f"{settings.GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/contents/{settings.PROJECTS_PATH}/{project}"
+    headers = {"Authorization": f"token {settings.GITHUB_API_TOKEN}"}
+    files = []
+    pending = [""]
+    while pending:
+        folder = pending.pop()
+        resp = github_client.get(f"{base_url}/{folder}".rstrip("/"), headers=headers)
+        if resp.status_code == 404:
+            raise GithubFileNotFoundError(f"Project not found: {project}")
+        resp.raise_for_status()
+        for item in resp.json():
+            relative_path = f"{folder}/{item['name']}".lstrip("/")
+            if item["type"] == "dir":
+                pending.append(relative_path)
+            else:
+                files.append(relative_path)
+    return sorted(files)
+
+
+@upstream_call("github")
+def get_commits(project: str, path: str, limit: int) -> list[dict]:
+    """Returns the most recent commits that touched the file, newest first."""
     repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
     file_path = f"{settings.PROJECTS_PATH}/{project}/{path}"
 
     headers = {"Authorization": f"token {settings.GITHUB_API_TOKEN}"}
-    commits_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/commits"
-    params: dict[str, str | int] = {"path": file_path, "per_page": 1}
+    commits_url = f"{settings.GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/commits"
+    params: dict[str, str | int] = {"path": file_path, "per_page": limit}
 
-    resp = requests.get(commits_url, headers=headers, params=params)
+    resp = github_client.get(commits_url, headers=headers, params=params)
     resp.raise_for_status()
+    return resp.json()
 
-    commits = resp.json()
-    if not commits:
-        return False
-
-    token_user = get_token_user()
-    last_committer = commits[0]["commit"]["author"]["name"]
-
-    return token_user == last_committer
 
-
-def revert_file_to_previous_commit(project: str, path: str) -> None:
+@upstream_call("github")
+def get_previous_file_content(project: str, path: str) -> str:
     """
-    Reverts a file to its previous commit version.
+    Returns the content of the file before the latest commit that touched it.
     Raises GithubFileNotFoundError if the file doesn't exist.
     """
     repo_owner, repo_name = get_repo_owner_and_name(settings.GITHUB_REPOSITORY)
     file_path = f"{settings.PROJECTS_PATH}/{project}/{path}"
-
     headers = {"Authorization": f"token {settings.GITHUB_API_TOKEN}"}
-    commits_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/commits"
-    params = {"path": file_path}
 
-    resp = requests.get(commits_url, headers=headers, params=params)
-    resp.raise_for_status()
-
-    commits = resp.json()
+    commits = get_commits(project, path, limit=2)
     if not commits:
         raise GithubFileNotFoundError(f"File not found or has no commit history: {path}")
 
@@ -217,11 +386,10 @@ def revert_file_to_previous_commit(project: str, path: str) -> None:
         raise GithubNoLastCommitError(f"No previous commit found for file: {path}")
 
     last_commit_sha = commits[1]["sha"]
-    content_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents/{file_path}?ref={last_commit_sha}"
+    content_url = f"{settings.GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/contents/{file_path}?ref={last_commit_sha}"
 
-    content_resp = requests.get(content_url, headers=headers)
+    content_resp = github_client.get(content_url, headers=headers)
     if content_resp.status_code != 200:
         raise GithubFileNotFoundError(f"Could not retrieve file version: {path}")
 
-    file_content = base64.b64decode(content_resp.json()["content"]).decode()
-    update_or_create_file(path, file_content, project)
+    return base64.b64decode(content_resp.json()["content"]).decode()
@@ -0,0 +1,79 @@
+from collections.abc import Mapping
+
+import httpx
+
+from app.content_cache import CachedFile
+from app.content_cache import content_cache
+from app.github import cache_contents_response
+from app.github import contents_request
+from app.github import serve_stale
+from app.github_budget import GithubBudgetExhaustedError
+from app.http_client import async_github_client
+from app.metrics import upstream_call
+from app.settings import settings
+
+# Forwarded to GitHub along with a request for a file that is not cached, so it answers them itself.
+STREAM_REQUEST_HEADERS = ("range", "if-range", "if-none-match")
+
+
+async def _fetch_file(project: str, path: str) -> CachedFile:
+    """Async version of github._fetch_file, sharing the same content cache."""
+    opened = await open_raw_file(project, path)
+    if isinstance(opened, CachedFile):
+        return opened
+    # Too large for the cache, read it all the same.
+    await opened.aread()
+    return CachedFile(opened.content, etag=opened.headers.get("ETag"))
+
+
+@upstream_call("github")
+async def open_raw_file(
+    project: str, path: str, request_headers: Mapping[str, str] | None = None
+) -> CachedFile | httpx.Response:
+    """
+    Returns the file from the content cache, revalidating it like github._fetch_file, or the response of GitHub
+    with its body still unread when the file is larger than STREAM_THRESHOLD_BYTES. That response is to be
+    streamed and closed by the caller.
+
+    When nothing is cached the Range, If-Range and If-None-Match headers of `request_headers` are forwarded,
+    so the response may also be a 206, 304 or 416. Like github._fetch_file, the cached file is served however
+    stale while the rate limit budget does not allow the request.
+    """
+    cached = content_cache.get((project, path))
+    if cached is not None and cached.is_fresh(settings.CONTENT_CACHE_FRESH_SECONDS):
+        content_cache.record_hit()
+        return cached
+
+    api_url, headers = contents_request(project, path, cached)
+    # Content-Length has to be the length of the bytes streamed on.
+    headers["Accept-Encoding"] = "identity"
+    if cached is None and request_headers is not None:
+        headers.update({name: request_headers[name] for name in STREAM_REQUEST_HEADERS if name in request_headers})
+    try:
+        resp = await async_github_client.request("GET", api_url, stream=True, headers=headers)
+    except GithubBudgetExhaustedError:
+        if cached is None:
+            raise
+        content_cache.record_hit(stale=True)
+        return cached
+    except httpx.HTTPError as e:
+        return serve_stale(cached, f"GitHub request for {api_url} failed: {e}")
+    length = resp.headers.get("Content-Length")
+    small = length is not None and int(length) <= settings.STREAM_THRESHOLD_BYTES
+    if (resp.status_code == 200 and small) or (resp.status_code == 304 and cached is not None):
+        await resp.aread()
+        return cache_contents_response(project, path, cached, api_url, resp.status_code, resp.content, resp.headers)
+    if resp.status_code not in (200, 206, 304, 416):
+        await resp.aclose()
+        return cache_contents_response(project, path, cached, api_url, resp.status_code, b"", resp.headers)
+    # A new version that is too large for the cache.
+    content_cache.invalidate(project, path)
+    return resp
+
+
+async def get_file_content(project: str, path: str | None = None) -> str:
+    return (await _fetch_file(project, path or "index.html")).content.decode()
+
+
+async def get_raw_file_content(project: str, path: str | None = None) -> bytes:
+    return (await _fetch_file(project, path or "index.html")).content
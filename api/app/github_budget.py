@@ -0,0 +1,203 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Iterator
+from collections.abc import Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import replace
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+from typing import Literal
+from typing import get_args
+
+from app.metrics import GITHUB_BUDGET_REFUSALS
+from app.settings import settings
+
+# From the most to the least important.
+Priority = Literal["user_write", "ai_edit", "game_read", "admin"]
+PRIORITIES: tuple[Priority, ...] = get_args(Priority)
+
+# Priority of the GitHub calls made in this context, set per router with github_priority.
+current_priority: ContextVar[Priority] = ContextVar("github_priority", default="game_read")
+
+
+def github_priority(priority: Priority) -> Callable[[], Awaitable[None]]:
+    """
+    Router dependency setting the priority of the GitHub calls made while handling the request. Async, so the
+    priority is set in the context the endpoint runs in, even a sync one.
+    """
+
+    async def set_priority() -> None:
+        current_priority.set(priority)
+
+    return set_priority
+
+
+class GithubBudgetExhaustedError(Exception):
+    """What is left of the GitHub rate limit is kept for calls of higher priority, or GitHub asked to back off."""
+
+    def __init__(self, priority: Priority, retry_after: float) -> None:
+        super().__init__(f"GitHub rate limit budget exhausted for {priority} calls, retry in {retry_after:.0f}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+@dataclass
+class BudgetState:
+    # Latest X-RateLimit-* values, unknown until the first response.
+    limit: int | None = None
+    remaining: int | None = None
+    used: int = 0
+    reset_at: float = 0.0
+    # Retry-After of a secondary rate limit, every call waits for it.
+    blocked_until: float = 0.0
+
+
+def merge_states(current: BudgetState, other: BudgetState) -> BudgetState:
+    """
+    Responses to concurrent calls come back in any order and other workers see other responses: the state of the
+    latest window with the highest X-RateLimit-Used wins, and a back-off lasts until the latest Retry-After.
+    """
+    latest = other if (other.reset_at, other.used) > (current.reset_at, current.used) else current
+    return replace(latest, blocked_until=max(current.blocked_until, other.blocked_until))
+
+
+class GithubBudget:
+    """
+    The GitHub rate limit left, shared by the worker processes.
+
+    A call is only made while more than the reserve of its priority is left, less the calls of this worker still
+    waiting for their response, so that a spike of game reads cannot starve uploads and AI edits. Every response
+    updates the budget from its headers. The budget is kept in memory, so calls never wait on file I/O, and a
+    background thread merges it every `sync_interval` seconds with a small file shared by the workers under an
+    exclusive lock.
+    """
+
+    def __init__(self, path: str, reserves: Mapping[str, int], sync_interval: float) -> None:
+        self.path = path
+        self.reserves = reserves
+        self.sync_interval = sync_interval
+        self._state = BudgetState()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self.sync()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="github-budget-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sync()
+
+    @contextmanager
+    def spend(self) -> Iterator[None]:
+        """Wraps a call of the current priority, raising GithubBudgetExhaustedError if it may not be made."""
+        priority = current_priority.get()
+        now = time.time()
+        with self._lock:
+            retry_after = self._retry_after(self._current(now), priority, now)
+            if retry_after is None:
+                self._in_flight += 1
+        if retry_after is not None:
+            GITHUB_BUDGET_REFUSALS.labels(priority).inc()
+            raise GithubBudgetExhaustedError(priority, retry_after)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        remaining = headers.get("X-RateLimit-Remaining", "")
+        reset = headers.get("X-RateLimit-Reset", "")
+        retry_after = headers.get("Retry-After", "")
+        received = BudgetState()
+        if remaining.isdigit() and reset.isdigit():
+            received.remaining = int(remaining)
+            received.reset_at = float(reset)
+            received.used = int(headers.get("X-RateLimit-Used") or 0)
+            received.limit = int(headers.get("X-RateLimit-Limit") or self._state.limit or 0)
+        if retry_after.isdigit():
+            received.blocked_until = time.time() + int(retry_after)
+        if received != BudgetState():
+            with self._lock:
+                self._state = merge_states(self._state, received)
+
+    def sync(self) -> None:
+        """Merges the budget of this worker with the shared file, and writes the result back if it changed."""
+        with os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), "r+") as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    shared = BudgetState(**json.loads(state_file.read() or "{}"))
+                except (ValueError, TypeError):
+                    shared = BudgetState()
+                with self._lock:
+                    self._state = merge_states(shared, self._state)
+                    merged = self._state
+                if merged != shared:
+                    state_file.seek(0)
+                    state_file.truncate()
+                    state_file.write(json.dumps(asdict(merged)))
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
+
+    def stats(self) -> dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            state = self._current(now)
+            in_flight = self._in_flight
+            allowed = {priority: self._retry_after(state, priority, now) is None for priority in PRIORITIES}
+        return {
+            "limit": state.limit,
+            "remaining": state.remaining,
+            "used": state.used,
+            "reset_at": datetime.fromtimestamp(state.reset_at, timezone.utc).isoformat() if state.reset_at else None,
+            "blocked_for_seconds": round(max(state.blocked_until - now, 0), 1),
+            "in_flight": in_flight,
+            "reserves": {priority: self.reserves.get(priority, 0) for priority in PRIORITIES},
+            "allowed": allowed,
+        }
+
+    def _current(self, now: float) -> BudgetState:
+        """The budget as of now: a new window starts with the whole limit."""
+        state = self._state
+        if state.reset_at and now >= state.reset_at:
+            return BudgetState(limit=state.limit, remaining=state.limit, blocked_until=state.blocked_until)
+        return state
+
+    def _retry_after(self, state: BudgetState, priority: Priority, now: float) -> float | None:
+        """None if a call of the priority may be made, otherwise the seconds until it may be."""
+        if state.blocked_until > now:
+            return state.blocked_until - now
+        if state.remaining is None or state.remaining - self._in_flight > self.reserves.get(priority, 0):
+            return None
+        return max(state.reset_at - now, 1.0)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.sync_interval):
+            try:
+                self.sync()
+            except OSError as e:
+                logging.error(f"Failed to sync the GitHub budget with {self.path}: {e}")
+
+
+github_budget = GithubBudget(
+    settings.GITHUB_BUDGET_PATH, settings.GITHUB_BUDGET_RESERVES, settings.GITHUB_BUDGET_SYNC_SECONDS
+)
@@ -0,0 +1,181 @@
+import hashlib
+import re
+from collections.abc import AsyncIterator
+from datetime import datetime
+from datetime import timezone
+from email.utils import format_datetime
+from email.utils import parsedate_to_datetime
+
+import httpx
+from fastapi import Request
+from fastapi import Response
+from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
+
+from app.compression import compressed_variant
+from app.compression import is_compressible
+from app.compression import negotiate_encoding
+from app.models import Game
+from app.settings import settings
+from app.storage import storage
+
+# Memory held per streamed response.
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# A single byte range, the only kind served partially.
+BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def strong_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag, compared weakly as RFC 9110 requires for this header."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag.removeprefix("W/") for candidate in if_none_match.split(",")
+    )
+
+
+def http_date(value: datetime) -> str:
+    # SQLite hands back naive datetimes, they are stored in UTC.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def modified_since(if_modified_since: str | None, last_modified: datetime) -> bool:
+    """Whether the resource changed after the If-Modified-Since date, True when the header is missing or invalid."""
+    if not if_modified_since:
+        return True
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return True
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(http_date(last_modified)) > since
+
+
+class RangeNotSatisfiableError(ValueError):
+    pass
+
+
+def byte_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    The (first, last) byte asked for by a Range header, or None to send the whole file: without the header, when it
+    is malformed, or for several ranges, which RFC 9110 lets us answer with the whole file.
+    Raises RangeNotSatisfiableError when the range is past the end of the file.
+    """
+    match = BYTE_RANGE.fullmatch(range_header.strip()) if range_header else None
+    if match is None or not any(match.groups()):
+        return None
+    first_text, last_text = match.groups()
+    if not first_text:
+        # The last n bytes.
+        if int(last_text) == 0 or size == 0:
+            raise RangeNotSatisfiableError(range_header)
+        return max(size - int(last_text), 0), size - 1
+    first = int(first_text)
+    if last_text and int(last_text) < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiableError(range_header)
+    return first, min(int(last_text), size - 1) if last_text else size - 1
+
+
+def byte_range_response(request: Request, body: bytes, media_type: str | None, headers: dict[str, str]) -> Response:
+    """Serves the body, or the part of it asked for by a Range request unless If-Range shows it changed."""
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range != headers.get("ETag"):
+        range_header = None
+    try:
+        span = byte_range(range_header, len(body))
+    except RangeNotSatisfiableError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(body)}"})
+    if span is None:
+        return Response(body, media_type=media_type, headers=headers)
+    first, last = span
+    headers["Content-Range"] = f"bytes {first}-{last}/{len(body)}"
+    return Response(body[first : last + 1], status_code=206, media_type=media_type, headers=headers)
+
+
+async def upstream_file_response(upstream: httpx.Response, media_type: str | None, headers: dict[str, str]) -> Response:
+    """Pipes a streaming GitHub response to the client chunk by chunk, keeping its status and validators."""
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    for name in ("ETag", "Content-Range"):
+        if name in upstream.headers:
+            headers[name] = upstream.headers[name]
+    if upstream.status_code in (304, 416):
+        await upstream.aclose()
+        return Response(status_code=upstream.status_code, headers=headers)
+    if "Content-Length" in upstream.headers:
+        headers["Content-Length"] = upstream.headers["Content-Length"]
+
+    async def chunks() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in upstream.aiter_raw(STREAM_CHUNK_BYTES):
+                yield chunk
+        finally:
+            await upstream.aclose()
+
+    return StreamingResponse(chunks(), status_code=upstream.status_code, media_type=media_type, headers=headers)
+
+
+async def game_file_response(
+    request: Request, game: Game, path: str | None, media_type: str | None, cache_control: str
+) -> Response:
+    """
+    Serves a file of the game with validators, answering 304 without reading the file when the client's copy
+    is current. The ETag is the git blob sha of the file and Last-Modified the game's date_modified, which only
+    changes with the game's files: opens, thumbnails and locks leave it alone.
+    Compressible files are encoded as the client prefers, with an ETag of their own for each encoding.
+    Files larger than STREAM_THRESHOLD_BYTES are never encoded, so they are never held in memory whole: they
+    are streamed from disk, or from GitHub with the ETag GitHub has for them. Files sent as they are honour
+    Range requests.
+    Raises github.GithubFileNotFoundError like the storage.
+    """
+    headers = {"Cache-Control": cache_control, "Last-Modified": http_date(game.date_modified)}
+    encoding = None
+    if is_compressible(media_type):
+        headers["Vary"] = "Accept-Encoding"
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if_none_match = request.headers.get("if-none-match")
+    # If-None-Match takes precedence, If-Modified-Since alone is answered from the game row.
+    if if_none_match is None and not modified_since(request.headers.get("if-modified-since"), game.date_modified):
+        return Response(status_code=304, headers=headers)
+
+    upstream = await storage.open_stream(game.project, path, request.headers)
+    if upstream is not None:
+        return await upstream_file_response(upstream, media_type, headers)
+    local_path = storage.local_path(game.project, path)
+    if local_path is not None and local_path.stat().st_size > settings.STREAM_THRESHOLD_BYTES:
+        encoding = None
+
+    if encoding is None:
+        sha = await storage.file_etag(game.project, path)
+        if etag_matches(if_none_match, f'"{sha}"'):
+            return Response(status_code=304, headers={**headers, "ETag": f'"{sha}"'})
+        headers["ETag"] = f'"{sha}"'
+        if local_path is not None:
+            # Streamed from disk, FileResponse handles Range itself.
+            return FileResponse(local_path, media_type=media_type, headers=headers)
+        return byte_range_response(request, await storage.read_file_async(game.project, path), media_type, headers)
+
+    # The body is needed to encode it anyway, the backend reads it once for both.
+    body, sha = await storage.read_file_with_etag(game.project, path)
+    # A file below the size limit is sent unencoded under the plain ETag, so the client may hold either one.
+    for etag in [f'"{sha}"', f'"{sha}-{encoding}"']:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={**headers, "ETag": etag})
+    variant = await compressed_variant(sha, encoding, body)
+    if variant is None:
+        return Response(body, media_type=media_type, headers={**headers, "ETag": f'"{sha}"'})
+    headers.update({"ETag": f'"{sha}-{encoding}"', "Content-Encoding": encoding})
+    return Response(variant, media_type=media_type, headers=headers)
@@ -0,0 +1,173 @@
+import asyncio
+import random
+from typing import Any
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.github_budget import GithubBudget
+from app.github_budget import github_budget
+from app.metrics import record_upstream_response
+from app.settings import settings
+
+# Only calls that are safe to repeat are retried. Writes to GitHub carry a sha and a retried
+# PUT after a lost response would fail anyway, and AI completions are far too expensive.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class UpstreamClient:
+    """
+    Keep-alive HTTP session for a single upstream service.
+
+    Connections are pooled per host, every call gets the upstream's connect/read timeouts unless
+    one is passed explicitly, and idempotent calls are retried with jittered exponential backoff.
+    With a budget, calls are only made while it allows them and it follows the rate limit headers.
+    """
+
+    def __init__(
+        self, name: str, connect_timeout: float, read_timeout: float, budget: GithubBudget | None = None
+    ) -> None:
+        self.name = name
+        self.budget = budget
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=settings.HTTP_MAX_RETRIES,
+            backoff_factor=settings.HTTP_BACKOFF_FACTOR,
+            backoff_jitter=settings.HTTP_BACKOFF_JITTER,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_maxsize=settings.HTTP_POOL_MAXSIZE, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        if self.budget is None:
+            resp = self.session.request(method, url, **kwargs)
+        else:
+            with self.budget.spend():
+                resp = self.session.request(method, url, **kwargs)
+            self.budget.update(resp.headers)
+        record_upstream_response(self.name, resp.status_code, resp.headers)
+        return resp
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        """Connection pool usage per host of this upstream."""
+        stats = {}
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            # The pool queue is prefilled with None placeholders, only real entries are idle connections.
+            idle = sum(conn is not None for conn in list(pool.pool.queue)) if pool.pool is not None else 0
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "max_size": settings.HTTP_POOL_MAXSIZE,
+                "idle_connections": idle,
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+            }
+        return stats
+
+
+class AsyncUpstreamClient:
+    """
+    Async counterpart of UpstreamClient built on httpx, for handlers running on the event loop.
+
+    The underlying httpx client is bound to the event loop it is first used on, so it is created lazily
+    inside the worker's loop and closed on lifespan shutdown.
+    """
+
+    def __init__(
+        self, name: str, connect_timeout: float, read_timeout: float, budget: GithubBudget | None = None
+    ) -> None:
+        self.name = name
+        self.budget = budget
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_POOL_MAXSIZE,
+                    max_keepalive_connections=settings.HTTP_POOL_MAXSIZE,
+                ),
+            )
+        return self._client
+
+    async def request(self, method: str, url: str, stream: bool = False, **kwargs: Any) -> httpx.Response:
+        """
+        Sends the request, retrying idempotent ones. With `stream` the body is left unread, to be iterated
+        and closed by the caller.
+        """
+        retries = settings.HTTP_MAX_RETRIES if method in IDEMPOTENT_METHODS else 0
+        attempt = 0
+        while True:
+            try:
+                resp = await self._send(self.client.build_request(method, url, **kwargs), stream)
+                record_upstream_response(self.name, resp.status_code, resp.headers)
+                if resp.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return resp
+                await resp.aclose()
+            except httpx.TransportError:
+                if attempt >= retries:
+                    raise
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def _send(self, request: httpx.Request, stream: bool) -> httpx.Response:
+        if self.budget is None:
+            return await self.client.send(request, stream=stream)
+        # The shared state is a tiny file, only locked long enough to read or write it.
+        with self.budget.spend():
+            resp = await self.client.send(request, stream=stream)
+        self.budget.update(resp.headers)
+        return resp
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter, using the retry settings of the sync clients."""
+    return settings.HTTP_BACKOFF_FACTOR * (2**attempt) + random.uniform(0, settings.HTTP_BACKOFF_JITTER)
+
+
+github_client = UpstreamClient("github", settings.GITHUB_CONNECT_TIMEOUT, settings.GITHUB_READ_TIMEOUT, github_budget)
+capture_client = UpstreamClient("capture", settings.CAPTURE_CONNECT_TIMEOUT, settings.CAPTURE_READ_TIMEOUT)
+g4f_client = UpstreamClient("g4f", settings.G4F_CONNECT_TIMEOUT, settings.G4F_READ_TIMEOUT)
+
+upstream_clients = [github_client, capture_client, g4f_client]
+
+async_github_client = AsyncUpstreamClient(
+    "github", settings.GITHUB_CONNECT_TIMEOUT, settings.GITHUB_READ_TIMEOUT, github_budget
+)
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.http_cache import strong_etag
+from app.models import CatalogVersion
+from app.settings import settings
+
+# (sort_by, search_query, page, cursor), page is None when a cursor is given.
+ListingKey = tuple[str, str | None, int | None, str | None]
+
+
+@dataclass
+class CachedListing:
+    body: bytes
+    next_cursor: str | None
+    version: int
+    etag: str = ""
+    created_at: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self) -> None:
+        if not self.etag:
+            self.etag = strong_etag(self.body)
+
+
+class ListingCache:
+    """
+    LRU cache of serialized /api/games responses.
+
+    Each entry remembers the catalog version it was built at and is only served while that version is current.
+    The version lives in the database and is bumped by every route that changes the catalog, so a change made
+    through any worker invalidates the entries of all of them.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[ListingKey, CachedListing] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: ListingKey, version: int, max_age: float) -> CachedListing | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version or time.monotonic() - entry.created_at >= max_age:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: ListingKey, entry: CachedListing) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def bump_catalog_version(db: Session) -> None:
+    """Marks the cached listings of every worker as stale, once the caller's transaction commits."""
+    stmt = insert(CatalogVersion).values(id=1, version=1)
+    db.execute(
+        stmt.on_conflict_do_update(index_elements=[CatalogVersion.id], set_={"version": CatalogVersion.version + 1})
+    )
+
+
+async def get_catalog_version(db: AsyncSession) -> int:
+    return await db.scalar(select(CatalogVersion.version).where(CatalogVersion.id == 1)) or 0
+
+
+listing_cache = ListingCache(settings.LISTING_CACHE_MAX_ENTRIES)
@@ -0,0 +1,226 @@
+import functools
+import inspect
+import os
+import shutil
+import time
+from collections.abc import Callable
+from collections.abc import Mapping
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+from typing import TypeVar
+from typing import cast
+
+from prometheus_client import REGISTRY
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import Histogram
+from prometheus_client import generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import Engine
+from sqlalchemy import event
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+from app.settings import settings
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+SQL_STATEMENTS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA"})
+# Upstream calls range from cached GitHub reads to AI completions of several minutes.
+UPSTREAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+# prometheus_client picks where metric values live when it is imported: in memory, or in the files of
+# PROMETHEUS_MULTIPROC_DIR if it is set by then. Setting it later only affects worker processes started afterwards.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP responses sent", ["method", "route", "status"])
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request, streaming included", ["method", "route"]
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being handled", ["method"], multiprocess_mode="livesum"
+)
+UPSTREAM_CALLS = Counter("upstream_calls_total", "Calls to upstream services", ["upstream", "operation", "outcome"])
+UPSTREAM_CALL_DURATION = Histogram(
+    "upstream_call_duration_seconds",
+    "Duration of calls to upstream services, retries and GitHub cache hits included",
+    ["upstream", "operation"],
+    buckets=UPSTREAM_BUCKETS,
+)
+UPSTREAM_REQUESTS = Counter(
+    "upstream_requests_total", "HTTP requests sent to upstream services", ["upstream", "operation", "status"]
+)
+UPSTREAM_RATE_LIMIT_REMAINING = Gauge(
+    "upstream_rate_limit_remaining",
+    "X-RateLimit-Remaining of the latest upstream response",
+    ["upstream"],
+    multiprocess_mode="mostrecent",
+)
+GITHUB_BUDGET_REFUSALS = Counter(
+    "github_budget_refusals_total", "GitHub calls not made to keep the rate limit for more important ones", ["priority"]
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Duration of database statements", ["engine", "statement"], buckets=DB_BUCKETS
+)
+
+# The upstream operation running in this context, to label the HTTP requests it sends.
+current_operation: ContextVar[str] = ContextVar("current_operation", default="other")
+
+
+def upstream_call(upstream: str) -> Callable[[F], F]:
+    """Times every call of the decorated function as an operation of the upstream, named after the function."""
+
+    def decorator(func: F) -> F:
+        operation = func.__name__.lstrip("_")
+
+        def observe(start: float, outcome: str) -> None:
+            UPSTREAM_CALL_DURATION.labels(upstream, operation).observe(time.perf_counter() - start)
+            UPSTREAM_CALLS.labels(upstream, operation, outcome).inc()
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                token = current_operation.set(operation)
+                start = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await func(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    observe(start, outcome)
+                    current_operation.reset(token)
+
+            return cast(F, async_wrapper)
+
+        if inspect.isgeneratorfunction(func):
+
+            @functools.wraps(func)
+            def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                # Streamed calls are timed until exhausted. The operation is set around each step only, as a
+                # consumer such as StreamingResponse resumes the generator in a different context every time.
+                generator = func(*args, **kwargs)
+                start = time.perf_counter()
+                outcome = "error"
+                try:
+                    while True:
+                        token = current_operation.set(operation)
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            outcome = "ok"
+                            return
+                        finally:
+                            current_operation.reset(token)
+                        yield item
+                except GeneratorExit:
+                    # The consumer stopped reading, the upstream did not fail.
+                    outcome = "ok"
+                    raise
+                finally:
+                    generator.close()
+                    observe(start, outcome)
+
+            return cast(F, generator_wrapper)
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            token = current_operation.set(operation)
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                observe(start, outcome)
+                current_operation.reset(token)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def record_upstream_response(upstream: str, status_code: int, headers: Mapping[str, str]) -> None:
+    UPSTREAM_REQUESTS.labels(upstream, current_operation.get(), str(status_code)).inc()
+    remaining = headers.get("X-RateLimit-Remaining")
+    if remaining is not None and remaining.isdigit():
+        UPSTREAM_RATE_LIMIT_REMAINING.labels(upstream).set(int(remaining))
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Times every statement run on the engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        conn.info["query_started_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        DB_QUERY_DURATION.labels(name, keyword if keyword in SQL_STATEMENTS else "OTHER").observe(
+            time.perf_counter() - conn.info["query_started_at"]
+        )
+
+
+class MetricsMiddleware:
+    """Counts and times HTTP requests by route template, the static files and games served at / count as "static"."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"] if scope["method"] in HTTP_METHODS else "OTHER"
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.labels(method).inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.labels(method).dec()
+            # Set by FastAPI once routed.
+            route = scope["route"].path if "route" in scope else "static"
+            HTTP_REQUEST_DURATION.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+
+
+def prepare_multiprocess_dir() -> None:
+    """
+    Makes the worker processes started after this write their metrics to METRICS_MULTIPROC_DIR, so /metrics can
+    add up those of every worker. Called once before the workers start, it drops the files of a previous run.
+    A process that already imported prometheus_client, like the one serving a single worker, keeps its own.
+    """
+    metrics_dir = Path(settings.METRICS_MULTIPROC_DIR)
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    metrics_dir.mkdir(parents=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(metrics_dir)
+
+
+def mark_worker_stopped() -> None:
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_metrics() -> bytes:
+    if not MULTIPROCESS:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
@@ -1,9 +1,16 @@
 from datetime import datetime
 
+from sqlalchemy import DDL
 from sqlalchemy import DateTime
+from sqlalchemy import Float
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import String
+from sqlalchemy import Text
+from sqlalchemy import column
+from sqlalchemy import event
 from sqlalchemy import func
+from sqlalchemy import table
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.types import Boolean
@@ -16,9 +23,91 @@ class Game(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     project: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
+    # sanitize_project_name(project), kept in sync by the routes that create or rename games.
+    # NULL only for legacy rows whose sanitized name collided with another project.
+    sanitized_name: Mapped[str | None] = mapped_column(String, unique=True, nullable=True, index=True)
     date_added: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     date_modified: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
     num_opens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     locked: Mapped[bool] = mapped_column(Boolean, default=0, nullable=False)
+    # When the thumbnail was last rendered successfully, NULL if it never was.
+    thumbnail_date: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Tree sha of the project folder when app.catalog_sync last dated the game from its commits, NULL until then.
+    tree_sha: Mapped[str | None] = mapped_column(String, nullable=True)
+
+
+# One index per sort order of the /api/games listing, see app.pagination.
+Index("ix_games_date_added_id", Game.date_added.desc(), Game.id.desc())
+Index("ix_games_date_modified_id", Game.date_modified.desc(), Game.id.desc())
+Index("ix_games_hottest", Game.num_opens.desc(), Game.date_added.desc(), Game.date_modified.desc(), Game.id.desc())
+
+# Full text index of the games for /api/games searches, see app.search. The FTS5 table stores its own copy of
+# the indexed text keyed by game id, so it can index text that is not a column of games. Triggers keep it in
+# sync with games; it is not part of the ORM metadata and is created with the games table.
+games_fts = table("games_fts", column("rowid", Integer), column("project", String), column("rank", Float))
+
+GAMES_FTS_DDL = [
+    "CREATE VIRTUAL TABLE games_fts USING fts5(project, tokenize='trigram')",
+    """
+    CREATE TRIGGER games_fts_insert AFTER INSERT ON games BEGIN
+        INSERT INTO games_fts(rowid, project) VALUES (new.id, new.project);
+    END
+    """,
+    """
+    CREATE TRIGGER games_fts_delete AFTER DELETE ON games BEGIN
+        DELETE FROM games_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER games_fts_update AFTER UPDATE OF project ON games BEGIN
+        UPDATE games_fts SET project = new.project WHERE rowid = old.id;
+    END
+    """,
+]
+for statement in GAMES_FTS_DDL:
+    event.listen(Game.__table__, "after_create", DDL(statement))
+
+
+class ThumbnailJob(Base):
+    """Pending thumbnail refresh, at most one per project. See app.thumb_queue."""
+
+    __tablename__ = "thumbnail_jobs"
+
+    project: Mapped[str] = mapped_column(String, primary_key=True)
+    game_url: Mapped[str] = mapped_column(String, nullable=False)
+    # Bumped by every enqueue, so a worker can tell whether the job changed while it was rendering.
+    requested_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    due_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    # Lease of the worker rendering the job, NULL while the job waits.
+    claimed_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class AIJob(Base):
+    """AI create or update request run in the background. See app.ai_jobs."""
+
+    __tablename__ = "ai_jobs"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    kind: Mapped[str] = mapped_column(String, nullable=False)  # "create" or "update"
+    project: Mapped[str] = mapped_column(String, nullable=False)
+    prompt: Mapped[str] = mapped_column(Text, nullable=False)
+    # Hash of the API key that submitted the job, keys themselves are not stored.
+    api_key_id: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    status: Mapped[str] = mapped_column(String, nullable=False, index=True)  # queued, running, done or failed
+    error: Mapped[str | None] = mapped_column(String, nullable=True)
+    html_path: Mapped[str | None] = mapped_column(String, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class CatalogVersion(Base):
+    """Single row counting changes to the game catalog, so every worker can tell its cached listings are stale."""
+
+    __tablename__ = "catalog_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
@@ -0,0 +1,84 @@
+import logging
+import threading
+from collections import Counter
+
+from sqlalchemy import case
+from sqlalchemy import update
+
+from app.database import SessionLocal
+from app.models import Game
+from app.settings import settings
+
+
+class OpensCounter:
+    """
+    Accumulates game opens in memory and writes them to the database in batches.
+
+    Opens are flushed by a background thread every `flush_interval` seconds, or sooner once
+    `flush_threshold` opens are pending, using a single UPDATE for all pending games.
+    """
+
+    def __init__(self, flush_interval: float, flush_threshold: int) -> None:
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending: Counter[int] = Counter()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def increment(self, game_id: int) -> None:
+        with self._lock:
+            self._pending[game_id] += 1
+            total = self._pending.total()
+        if total >= self.flush_threshold:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return
+
+        stmt = (
+            update(Game)
+            .where(Game.id.in_(pending.keys()))
+            # An open does not modify the game, keep date_modified from its onupdate.
+            .values(
+                num_opens=Game.num_opens + case(dict(pending), value=Game.id, else_=0),
+                date_modified=Game.date_modified,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            with SessionLocal() as db:
+                db.execute(stmt)
+                db.commit()
+        except Exception as e:
+            logging.error(f"Failed to flush {pending.total()} game opens: {e}")
+            # Keep the counts so the next flush retries them.
+            with self._lock:
+                self._pending.update(pending)
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="opens-counter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the background thread and flushes whatever is still pending."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+opens_counter = OpensCounter(settings.OPENS_FLUSH_INTERVAL_SECONDS, settings.OPENS_FLUSH_THRESHOLD)
@@ -0,0 +1,75 @@
+import base64
+import binascii
+import json
+from typing import Any
+from typing import Literal
+
+from sqlalchemy import ColumnElement
+from sqlalchemy import DateTime
+from sqlalchemy import String
+from sqlalchemy import literal
+from sqlalchemy import tuple_
+from sqlalchemy import type_coerce
+
+from app.models import Game
+
+SortBy = Literal["date_added", "date_modified", "hottest", "relevance"]
+CursorKey = list[str | int | float]
+
+# Every listing is sorted descending on these columns, the id last so the order is total.
+# "relevance" puts the search relevance first when there is one.
+SORT_COLUMNS = {
+    "date_added": (Game.date_added, Game.id),
+    "date_modified": (Game.date_modified, Game.id),
+    "hottest": (Game.num_opens, Game.date_added, Game.date_modified, Game.id),
+    "relevance": (Game.date_added, Game.id),
+}
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def sort_key(sort_by: SortBy, relevance: ColumnElement[float] | None = None) -> list[ColumnElement[Any]]:
+    """
+    The sort columns, dates as the text SQLite stores them. Rows written with func.now() and from Python store
+    dates in different formats, so cursors compare the stored text the same way ORDER BY does.
+    """
+    key: list[ColumnElement[Any]] = [
+        type_coerce(column, String()) if isinstance(column.type, DateTime) else column.expression
+        for column in SORT_COLUMNS[sort_by]
+    ]
+    if sort_by == "relevance" and relevance is not None:
+        key.insert(0, relevance)
+    return key
+
+
+def order_by(key: list[ColumnElement[Any]]) -> list[ColumnElement[Any]]:
+    return [column.desc() for column in key]
+
+
+def after_cursor(key: list[ColumnElement[Any]], sort_by: SortBy, cursor: str) -> ColumnElement[bool]:
+    """Condition selecting the rows that come after the cursor."""
+    return tuple_(*key) < tuple_(*map(literal, decode_cursor(sort_by, cursor, len(key))))
+
+
+def encode_cursor(sort_by: SortBy, values: CursorKey) -> str:
+    data = json.dumps({"sort_by": sort_by, "key": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(sort_by: SortBy, cursor: str, key_length: int) -> CursorKey:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+    if not isinstance(data, dict) or data.get("sort_by") != sort_by:
+        raise InvalidCursorError(f"Cursor was not issued for sort_by={sort_by}")
+    key = data.get("key")
+    if (
+        not isinstance(key, list)
+        or len(key) != key_length
+        or not all(isinstance(value, str | int | float) for value in key)
+    ):
+        raise InvalidCursorError("Invalid cursor")
+    return key
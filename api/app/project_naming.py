@@ -1,5 +1,7 @@
 import re
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.models import Game
@@ -63,19 +65,16 @@ def find_project_by_name_case_insensitive(db: Session, project_name: str) -> Gam
     """
     Find project with case-insensitive sanitized lookup and backwards compatibility.
 
-    Always sanitizes input before matching for consistency.
+    Always sanitizes input before matching for consistency. Legacy projects whose stored name
+    is not sanitized are found through the indexed sanitized_name column.
     """
 
     sanitized_input = sanitize_project_name(project_name)
+    return db.query(Game).filter(Game.sanitized_name == sanitized_input).first()
 
-    exact_match = db.query(Game).filter(Game.project == sanitized_input).first()
-    if exact_match:
-        return exact_match
 
-    # Backwards compatibility: check if any existing project sanitizes to our input
-    all_projects = db.query(Game).all()
-    for project in all_projects:
-        if sanitize_project_name(project.project) == sanitized_input:
-            return project
-
-    return None
+async def find_project_by_name_case_insensitive_async(db: AsyncSession, project_name: str) -> Game | None:
+    """Async version of find_project_by_name_case_insensitive."""
+    sanitized_input = sanitize_project_name(project_name)
+    result = await db.execute(select(Game).where(Game.sanitized_name == sanitized_input).limit(1))
+    return result.scalar_one_or_none()
@@ -1,13 +1,19 @@
 import base64
 import json
 import logging
+import math
 import mimetypes
+import time
+from collections.abc import Generator
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 from datetime import datetime
 from typing import Literal
 
 import pytz
+import requests
 from fastapi import APIRouter
-from fastapi import BackgroundTasks
 from fastapi import Body
 from fastapi import Depends
 from fastapi import HTTPException
@@ -15,32 +21,70 @@ from fastapi import Path
 from fastapi import Query
 from fastapi import Request
 from fastapi import Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from fastapi.responses import RedirectResponse
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST
 from pydantic import BaseModel
 from pydantic import ValidationError
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 
 from app import g4f
 from app import github
+from app import pagination
+from app import search
 from app import thumbs
+from app.ai_jobs import ai_job_queue
+from app.ai_jobs import api_key_id
 from app.auth import get_api_key
+from app.catalog_sync import CatalogSyncReport
+from app.catalog_sync import sync_catalog
+from app.content_cache import content_cache
+from app.content_cache import variant_cache
+from app.database import SessionLocal
+from app.database import get_async_read_db
 from app.database import get_db
+from app.database import get_read_db
+from app.github_budget import GithubBudgetExhaustedError
+from app.github_budget import current_priority
+from app.github_budget import github_budget
+from app.github_budget import github_priority
+from app.http_cache import etag_matches
+from app.http_cache import game_file_response
+from app.http_client import upstream_clients
+from app.listing_cache import CachedListing
+from app.listing_cache import bump_catalog_version
+from app.listing_cache import get_catalog_version
+from app.listing_cache import listing_cache
+from app.metrics import render_metrics
+from app.models import AIJob
 from app.models import Game
+from app.open_counter import opens_counter
+from app.pagination import SortBy
 from app.project_naming import find_project_by_name_case_insensitive
+from app.project_naming import find_project_by_name_case_insensitive_async
 from app.project_naming import sanitize_project_name
 from app.settings import settings
+from app.storage import storage
+from app.thumb_queue import record_thumbnail
+from app.thumb_queue import thumbnail_queue
 
 router = APIRouter()
-admin_router = APIRouter(tags=["Admin"], prefix="/admin")
-file_router = APIRouter(tags=["File management"], prefix="/api")
-ai_router = APIRouter(tags=["AI"], prefix="/api/ai")
+# Priority of the GitHub calls of each group of routes, game reads have the default one.
+admin_router = APIRouter(tags=["Admin"], prefix="/admin", dependencies=[Depends(github_priority("admin"))])
+file_router = APIRouter(tags=["File management"], prefix="/api", dependencies=[Depends(github_priority("user_write"))])
+ai_router = APIRouter(tags=["AI"], prefix="/api/ai", dependencies=[Depends(github_priority("ai_edit"))])
 games_router = APIRouter(tags=["Games"], prefix="/game")
 
 
 # Use the case-insensitive function from project_naming instead
 find_project_by_name = find_project_by_name_case_insensitive
+find_project_by_name_async = find_project_by_name_case_insensitive_async
 
 
 class RequestBody(BaseModel):
@@ -52,20 +96,12 @@ class RequestBody(BaseModel):
 def reset_db(
     _: str = Depends(get_api_key),
     db: Session = Depends(get_db),
-) -> list[str]:
+    dry_run: bool = Query(False, description="Report the changes without applying them"),
+) -> CatalogSyncReport:
     """
-    Initialize the database and create the necessary entries from github
+    Sync the database entries with the projects on github, keeping the opens, locks and dates of existing games
     """
-    names = github.get_projects()
-    # Truncate the database.
-    db.query(Game).delete()
-    db.commit()
-    # Recreate the database entries.
-    for name in names:
-        game = Game(project=name, date_added=datetime.now(pytz.utc), date_modified=datetime.now(pytz.utc), num_opens=0)
-        db.add(game)
-    db.commit()
-    return names
+    return sync_catalog(db, dry_run)
 
 
 @admin_router.get("/create_thumbnails")
@@ -74,29 +110,90 @@ def create_thumbnails(
     _: str = Depends(get_api_key),
     db: Session = Depends(get_db),
     force_recreate: bool = Query(False, description="Force recreate thumbnails"),
-) -> JSONResponse:
-    """Create game thumbnails sequentially. Can be very slow."""
-    # Load all games from the database.
-    success = []
-    failed = []
-    games = db.query(Game).all()
-    for game in games:
-        html_path = str(request.url_for("get_game_html", project=game.project).path)
-        game_url = f"{settings.APP_URL}{html_path}"
-        logging.info(f"Creating thumbnail for {game_url}")
-        try:
-            thumbs.refresh_thumb(game_url, force_recreate=force_recreate)
-            success.append(game.project)
-        except Exception as e:
-            logging.error(f"Failed to create thumbnail for {game_url}: {e}")
-            failed.append(game.project)
-    return JSONResponse(
-        {
-            "status": "success",
-            "success": success,
-            "failed": failed,
-        }
-    )
+) -> StreamingResponse:
+    """
+    Create game thumbnails, THUMBNAIL_CONCURRENCY at a time.
+    - Games whose thumbnail is newer than their last modification are skipped unless force_recreate is set.
+    - Progress is streamed as NDJSON: one line per game as it finishes, then a summary line.
+    """
+    query = db.query(Game)
+    if not force_recreate:
+        query = query.filter(or_(Game.thumbnail_date.is_(None), Game.thumbnail_date < Game.date_modified))
+    games = [(game.project, str(request.url_for("get_game_html", project=game.project).path)) for game in query]
+    skipped = db.query(Game).count() - len(games)
+
+    return StreamingResponse(thumbnail_progress(games, skipped, force_recreate), media_type="application/x-ndjson")
+
+
+def thumbnail_progress(games: list[tuple[str, str]], skipped: int, force_recreate: bool) -> Generator[str, None, None]:
+    """Renders the thumbnails of the (project, html_path) games, yielding the NDJSON lines of create_thumbnails."""
+    counts = {"success": 0, "failed": 0}
+    started = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_CONCURRENCY)
+    try:
+        futures = [
+            executor.submit(render_thumbnail, project, html_path, force_recreate) for project, html_path in games
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            counts[result["status"]] += 1
+            yield json.dumps(result) + "\n"
+    finally:
+        # When the client goes away the renders not started yet are dropped, only those in flight finish.
+        executor.shutdown(wait=False, cancel_futures=True)
+    yield json.dumps({"status": "done", **counts, "skipped": skipped, "seconds": elapsed(started)}) + "\n"
+
+
+def render_thumbnail(project: str, html_path: str, force_recreate: bool) -> dict:
+    game_url = f"{settings.APP_URL}{html_path}"
+    logging.info(f"Creating thumbnail for {game_url}")
+    started = time.monotonic()
+    try:
+        thumbs.refresh_thumb(game_url, force_recreate=force_recreate)
+    except Exception as e:
+        logging.error(f"Failed to create thumbnail for {game_url}: {e}")
+        return {"project": project, "status": "failed", "error": str(e), "seconds": elapsed(started)}
+    record_thumbnail(project)
+    return {"project": project, "status": "success", "seconds": elapsed(started)}
+
+
+def elapsed(started: float) -> float:
+    return round(time.monotonic() - started, 3)
+
+
+@admin_router.get("/cache_stats")
+def cache_stats(
+    _: str = Depends(get_api_key),
+) -> dict:
+    """Hit, miss and eviction counters of this worker's GitHub content cache, and of its /api/games cache."""
+    return {**content_cache.stats(), "compressed": variant_cache.stats(), "listing": listing_cache.stats()}
+
+
+@admin_router.get("/http_pools")
+def http_pools(
+    _: str = Depends(get_api_key),
+) -> dict:
+    """Connection pool usage of this worker's outbound HTTP clients, per upstream and host."""
+    return {client.name: client.pool_stats() for client in upstream_clients}
+
+
+@admin_router.get("/github_budget")
+def github_budget_stats(
+    _: str = Depends(get_api_key),
+) -> dict:
+    """
+    GitHub rate limit left as of the latest response to any worker, and which priorities may still call GitHub.
+    Calls of a priority stop while no more than its reserve is left.
+    """
+    return github_budget.stats()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(
+    _: str = Depends(get_api_key),
+) -> Response:
+    """Prometheus metrics, added up over every worker process."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
 
 
 class LockRequest(BaseModel):
@@ -120,6 +217,9 @@ def lock_project(
         raise HTTPException(status_code=400, detail="Project does not exist")
 
     game.locked = lock_request.locked
+    # Locking does not modify the game's files, keep date_modified (and Last-Modified) from its onupdate.
+    flag_modified(game, "date_modified")
+    bump_catalog_version(db)
     db.commit()
     return {"status": "success"}
 
@@ -143,16 +243,20 @@ def import_project(
         raise HTTPException(status_code=400, detail="Project already exists")
     db.add(
         Game(
-            project=sanitized_name, date_added=datetime.now(pytz.utc), date_modified=datetime.now(pytz.utc), num_opens=0
+            project=sanitized_name,
+            sanitized_name=sanitized_name,
+            date_added=datetime.now(pytz.utc),
+            date_modified=datetime.now(pytz.utc),
+            num_opens=0,
         )
     )
+    bump_catalog_version(db)
     db.commit()
     return {"status": "success"}
 
 
 @file_router.put("/project/{project_name}/{file_path:path}")
 def upload_file(
-    request: Request,
     body: RequestBody = Body(..., description="File content"),
     project_name: str = Path(..., description="Project name"),
     file_path: str = Path(..., description="File path"),
@@ -178,28 +282,47 @@ def upload_file(
     else:
         content = body.content
 
+    # Use sanitized name for GitHub operations
+    return save_project_files(db, game, sanitized_name, {file_path: content}, "Update file via API", file_path)
+
+
+def save_project_files(
+    db: Session,
+    game: Game | None,
+    sanitized_name: str,
+    files: dict[str, str],
+    message: str,
+    file_path: str,
+) -> JSONResponse:
+    """
+    Commits the files in one go, then creates or touches the game row and queues a thumbnail refresh.
+    `file_path` is the file the returned github_url points to.
+    """
     try:
-        # Use sanitized name for GitHub operations
-        github.update_or_create_file(file_path, content, sanitized_name)
+        storage.write_files(sanitized_name, files, message)
+    except GithubBudgetExhaustedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     # Update database entry.
     now = datetime.now(pytz.utc)
     if game is None:
-        game = Game(project=sanitized_name, date_added=now, date_modified=now, num_opens=0)
+        game = Game(
+            project=sanitized_name, sanitized_name=sanitized_name, date_added=now, date_modified=now, num_opens=0
+        )
         db.add(game)
     else:
         game.date_modified = now
         flag_modified(game, "date_modified")
+    # Built without a request, AI jobs save projects outside of one.
+    html_path = router.url_path_for("get_game_html", project=game.project)
+    thumbnail_queue.enqueue(db, game.project, f"{settings.APP_URL}{html_path}")
+    bump_catalog_version(db)
     db.commit()
-    html_path = str(request.url_for("get_game_html", project=game.project).path)
 
-    # TODO might not need to create a thumb for every file
     thumb_url = thumbs.get_thumb_url(f"{settings.APP_URL}{html_path}")
-    background_tasks = BackgroundTasks()
-    background_tasks.add_task(thumbs.refresh_thumb, f"{settings.APP_URL}{html_path}")
-    response = JSONResponse(
+    return JSONResponse(
         {
             "status": "success",
             "html_path": html_path,
@@ -208,24 +331,24 @@ def upload_file(
             "github_url": github.get_file_url(sanitized_name, file_path),
         }
     )
-    response.background = background_tasks
-    return response
 
 
-def update_context_json(project_name: str, project: g4f.Project) -> None:
-    try:
-        github.update_or_create_file(
-            "context.json",
-            project.context.model_dump_json(indent=2),
-            project_name,
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def ai_project_files(name: str, project: g4f.Project) -> dict[str, str]:
+    """
+    Generated page and the conversation that produced it, committed together.
+    Only the latest code is kept verbatim in context.json, earlier versions are in its git history.
+    """
+    context, report = g4f.compact_context(project.context, settings.AI_CONTEXT_MAX_TOKENS)
+    context.history_url = github.get_file_history_url(name, "context.json")
+    logging.info(f"AI context of {name} saved compacted from {report.tokens_before} to {report.tokens_after} tokens")
+    return {
+        "index.html": project.files[0].content,
+        "context.json": context.model_dump_json(indent=2),
+    }
 
 
 @ai_router.post("/{project_name}")
 def create_ai_project(
-    request: Request,
     body: RequestBody = Body(..., description="Prompt for AI to generate the project"),
     project_name: str = Path(..., description="Project name"),
     auth: str = Depends(get_api_key),
@@ -236,7 +359,97 @@ def create_ai_project(
     - The project will be created under the specified path.
     - The content will be the AI generated HTML.
     """
-    prompt = body.content
+    return generate_ai_project(db, project_name, body.content)
+
+
+@ai_router.put("/{project_name}")
+def update_ai_project(
+    body: RequestBody = Body(..., description="Prompt for AI to generate HTML"),
+    project_name: str = Path(..., description="Project name"),
+    auth: str = Depends(get_api_key),
+    db: Session = Depends(get_db),
+) -> JSONResponse:
+    """
+    Update an existing project in GitHub using G4F API.
+    - The project will be updated under the specified path.
+    - The content will be the AI generated HTML.
+    """
+    return regenerate_ai_project(db, project_name, body.content)
+
+
+@ai_router.post("/{project_name}/jobs", status_code=202)
+def create_ai_project_job(
+    body: RequestBody = Body(..., description="Prompt for AI to generate the project"),
+    project_name: str = Path(..., description="Project name"),
+    auth: str = Depends(get_api_key),
+    db: Session = Depends(get_db),
+) -> dict:
+    """
+    Same as POST /api/ai/{project_name}, run in the background.
+    Returns the job right away, poll GET /api/ai/jobs/{job_id} for its outcome.
+    """
+    sanitized_name = sanitize_project_name(project_name)
+    if find_project_by_name(db, project_name) is not None:
+        raise HTTPException(status_code=400, detail="Project already exists")
+    return ai_job_response(ai_job_queue.submit(db, "create", sanitized_name, body.content, auth))
+
+
+@ai_router.put("/{project_name}/jobs", status_code=202)
+def update_ai_project_job(
+    body: RequestBody = Body(..., description="Prompt for AI to generate HTML"),
+    project_name: str = Path(..., description="Project name"),
+    auth: str = Depends(get_api_key),
+    db: Session = Depends(get_db),
+) -> dict:
+    """Same as PUT /api/ai/{project_name}, run in the background like POST /api/ai/{project_name}/jobs."""
+    game: Game | None = find_project_by_name(db, sanitize_project_name(project_name))
+    if game is None:
+        raise HTTPException(status_code=400, detail="Project does not exist")
+    if game.locked:
+        raise HTTPException(status_code=403, detail="Project is locked")
+    return ai_job_response(ai_job_queue.submit(db, "update", game.project, body.content, auth))
+
+
+@ai_router.get("/jobs/{job_id}")
+def get_ai_job(
+    job_id: str = Path(..., description="Job id returned when the job was submitted"),
+    auth: str = Depends(get_api_key),
+    db: Session = Depends(get_read_db),
+) -> dict:
+    """Status of a background AI job. Jobs are only visible to the API key that submitted them."""
+    job = db.get(AIJob, job_id)
+    if job is None or job.api_key_id != api_key_id(auth):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ai_job_response(job)
+
+
+def ai_job_response(job: AIJob) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "project": job.project,
+        "status": job.status,
+        "error": job.error,
+        "html_path": job.html_path,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": ai_router.url_path_for("get_ai_job", job_id=job.id),
+    }
+
+
+def run_ai_job(kind: str, project_name: str, prompt: str) -> str:
+    """Runs a queued AI job like the blocking endpoints would, returning the game's html_path."""
+    current_priority.set("ai_edit")
+    with SessionLocal() as db:
+        if kind == "create":
+            response = generate_ai_project(db, project_name, prompt)
+        else:
+            response = regenerate_ai_project(db, project_name, prompt)
+    return json.loads(response.body)["html_path"]
+
+
+def generate_ai_project(db: Session, project_name: str, prompt: str) -> JSONResponse:
     # Always use sanitized name for storage and lookup
     sanitized_name = sanitize_project_name(project_name)
     # Raise an error if the project already exists.
@@ -249,47 +462,132 @@ def create_ai_project(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    update_context_json(sanitized_name, project)
-    return upload_file(
-        request=request,
-        project_name=sanitized_name,
-        file_path="index.html",
-        body=RequestBody(content=project.files[0].content),
-        db=db,
-        auth=auth,
+    return save_project_files(
+        db, None, sanitized_name, ai_project_files(sanitized_name, project), "Create project with AI", "index.html"
     )
 
 
-@ai_router.put("/{project_name}")
-def update_ai_project(
-    request: Request,
-    body: RequestBody = Body(..., description="Prompt for AI to generate HTML"),
+def regenerate_ai_project(db: Session, project_name: str, prompt: str) -> JSONResponse:
+    # Sanitize project name for consistency
+    sanitized_name = sanitize_project_name(project_name)
+    # Raise an error if the project does not exist.
+    game: Game | None = find_project_by_name(db, sanitized_name)
+    if game is None:
+        raise HTTPException(status_code=400, detail="Project does not exist")
+    if game.locked:
+        raise HTTPException(status_code=403, detail="Project is locked")
+
+    messages = load_ai_messages(game)
+
+    try:
+        project = g4f.edit_project(messages, prompt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return save_project_files(
+        db, game, game.project, ai_project_files(game.project, project), "Update project with AI", "index.html"
+    )
+
+
+@ai_router.post("/{project_name}/stream")
+def create_ai_project_stream(
+    body: RequestBody = Body(..., description="Prompt for AI to generate the project"),
     project_name: str = Path(..., description="Project name"),
     auth: str = Depends(get_api_key),
     db: Session = Depends(get_db),
-) -> JSONResponse:
+) -> StreamingResponse:
     """
-    Update an existing project in GitHub using G4F API.
-    - The project will be updated under the specified path.
-    - The content will be the AI generated HTML.
+    Same as POST /api/ai/{project_name}, streaming the completion as Server-Sent Events.
+    - `token` events carry the completion text as it arrives.
+    - `code_start` and `code_end` mark the code block the page is taken from.
+    - The project is committed when the completion ends, followed by a `done` event with the usual response,
+      or an `error` event.
     """
-    prompt = body.content
-    # Sanitize project name for consistency
     sanitized_name = sanitize_project_name(project_name)
-    # Raise an error if the project does not exist.
-    game: Game | None = find_project_by_name(db, sanitized_name)
+    if find_project_by_name(db, project_name) is not None:
+        raise HTTPException(status_code=400, detail="Project already exists")
+
+    return ai_event_stream(g4f.Project(), g4f.create_prompt(body.content), sanitized_name, "Create project with AI")
+
+
+@ai_router.put("/{project_name}/stream")
+def update_ai_project_stream(
+    body: RequestBody = Body(..., description="Prompt for AI to generate HTML"),
+    project_name: str = Path(..., description="Project name"),
+    auth: str = Depends(get_api_key),
+    db: Session = Depends(get_db),
+) -> StreamingResponse:
+    """Same as PUT /api/ai/{project_name}, streaming the completion like POST /api/ai/{project_name}/stream."""
+    game: Game | None = find_project_by_name(db, sanitize_project_name(project_name))
     if game is None:
         raise HTTPException(status_code=400, detail="Project does not exist")
     if game.locked:
         raise HTTPException(status_code=403, detail="Project is locked")
 
+    project = g4f.Project(context=g4f.edit_context(load_ai_messages(game)))
+    return ai_event_stream(project, g4f.edit_prompt(body.content), game.project, "Update project with AI")
+
+
+def ai_event_stream(project: g4f.Project, prompt: str, project_name: str, message: str) -> StreamingResponse:
+    def events() -> Iterator[str]:
+        tracker = g4f.CodeFenceTracker()
+        try:
+            for chunk in project.prompt_stream(prompt):
+                yield sse_event("token", chunk)
+                for event, data in tracker.feed(chunk):
+                    yield sse_event(event, data)
+            project.add_file("index.html", g4f.extract_code_blocks(project.context.messages[-1].content))
+        except (ValueError, requests.RequestException) as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        except Exception as e:
+            # Anything else would end the stream without telling the client why.
+            logging.error(f"AI generation for {project_name} failed: {e}")
+            yield sse_event("error", {"detail": "AI generation failed"})
+            return
+
+        # The request's session is closed by the time the stream runs.
+        with SessionLocal() as db:
+            game = find_project_by_name(db, project_name)
+            try:
+                response = save_project_files(
+                    db, game, project_name, ai_project_files(project_name, project), message, "index.html"
+                )
+            except HTTPException as e:
+                yield sse_event("error", {"detail": e.detail})
+                return
+            except GithubBudgetExhaustedError as e:
+                yield sse_event("error", {"detail": str(e), "retry_after": math.ceil(e.retry_after)})
+                return
+            except Exception as e:
+                logging.error(f"Failed to save AI project {project_name}: {e}")
+                yield sse_event("error", {"detail": "Failed to save the project"})
+                return
+        yield sse_event("done", json.loads(response.body))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def sse_event(event: str, data: object) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def load_ai_messages(game: Game) -> list[g4f.Message]:
+    """
+    Conversation to continue for an AI edit: context.json, or the current page if there is none.
+    The current page is appended if someone else committed it since the last AI edit.
+    """
     try:
-        context_str = github.get_file_content(game.project, "context.json")
+        context_str = storage.read_file(game.project, "context.json").decode()
         messages = g4f.Context.model_validate_json(context_str).messages
     except github.GithubFileNotFoundError:
         messages = []
         try:
-            content = github.get_file_content(game.project, "index.html")
+            content = storage.read_file(game.project, "index.html").decode()
             messages.append(
                 g4f.Message(
                     role="user",
@@ -304,44 +602,30 @@ def update_ai_project(
         raise HTTPException(status_code=400, detail="Invalid context file format") from e
 
     # We need to make the bot aware if the user is the last committer of the file.
-    if not github.is_last_committer_token_user(game.project, "index.html"):
-        content = github.get_file_content(game.project, "index.html")
+    if not storage.is_last_committer_token_user(game.project, "index.html"):
+        content = storage.read_file(game.project, "index.html").decode()
         messages.append(
             g4f.Message(
                 role="user",
                 content=f"I have modified the codebase to:\n```\n{content}\n```. Please use this as a base to update the code.",
             )
         )
-
-    try:
-        project = g4f.edit_project(messages, prompt)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-
-    update_context_json(game.project, project)
-    return upload_file(
-        request=request,
-        project_name=game.project,
-        file_path="index.html",
-        body=RequestBody(content=project.files[0].content),
-        db=db,
-        auth=auth,
-    )
+    return messages
 
 
 @games_router.get("/{project}/")
-def get_game_html(
+async def get_game_html(
     project: str,
     request: Request,
     count: bool = True,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ) -> Response:
     """
     Retrieve the HTML for a game project from GitHub.
     The endpoint attempts to fetch `index.html` under the project's directory.
     """
     # Find project with backwards compatibility
-    game: Game | None = find_project_by_name(db, project)
+    game: Game | None = await find_project_by_name_async(db, project)
     if game is None:
         sanitized_project = sanitize_project_name(project)
         raise HTTPException(
@@ -349,17 +633,15 @@ def get_game_html(
         )
 
     try:
-        content = github.get_file_content(game.project)
+        response = await game_file_response(request, game, None, "text/html", settings.GAME_HTML_CACHE_CONTROL)
     except github.GithubFileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+    # A revalidated page is a visit all the same.
     if count:
-        # Update the number of opens for the game.
-        game.num_opens += 1
-        flag_modified(game, "num_opens")
-        db.commit()
+        opens_counter.increment(game.id)
 
-    return Response(content, media_type="text/html")
+    return response
 
 
 @games_router.get("/{project}", include_in_schema=False)
@@ -378,59 +660,102 @@ def redicrect_to_game_html(
 
 
 @games_router.get("/{project}/{file_path:path}")
-def get_raw_file(
+async def get_raw_file(
     project: str,
     file_path: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
 ) -> Response:
     """
     Retrieve a raw file from a game project in GitHub.
     The endpoint attempts to fetch the specified file under the project's directory.
     """
     # Find project with backwards compatibility
-    game: Game | None = find_project_by_name(db, project)
+    game: Game | None = await find_project_by_name_async(db, project)
     if game is None:
         sanitized_project = sanitize_project_name(project)
         raise HTTPException(
             status_code=404, detail=f"Game project '{project}' (sanitized: '{sanitized_project}') not found"
         )
 
+    media_type = mimetypes.guess_type(file_path)[0]
     try:
-        content = github.get_raw_file_content(game.project, file_path)
+        return await game_file_response(request, game, file_path, media_type, settings.GAME_ASSET_CACHE_CONTROL)
     except github.GithubFileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    media_type = mimetypes.guess_type(file_path)[0]
-    return Response(content, media_type=media_type)
 
 
-@file_router.get("/games")
-def list_games(
+@file_router.get("/games", response_model=list[dict])
+async def list_games(
     request: Request,
-    sort_by: Literal["date_added", "date_modified", "hottest"] = Query("date_added"),
+    sort_by: SortBy = Query("date_added"),
     search_query: str | None = Query(None, description="Search query for filtering game projects"),
     page: int = Query(1, ge=1, description="Page number for pagination"),
-    db: Session = Depends(get_db),
-) -> list[dict]:
+    cursor: str | None = Query(None, description="X-Next-Cursor of the previous page, takes precedence over page"),
+    db: AsyncSession = Depends(get_async_read_db),
+) -> Response:
     """
     Search game projects.
-    Optional query parameter 'sort_by' sorts by either "date_added", "date_modified", or "hottest".
+    Optional query parameter 'sort_by' sorts by either "date_added", "date_modified", "hottest" or "relevance".
     For "hottest", the sort order is num_opens DESC, then date_added DESC, then date_modified DESC.
+    For "relevance", the best matches of search_query come first, then the order is the same as "date_added".
+    Queries of 3 characters or more are matched with the full text index, shorter ones with a scan.
+    Opens are flushed to the database in batches, so "hottest" can lag behind by OPENS_FLUSH_INTERVAL_SECONDS.
+    When there are more results, the X-Next-Cursor header holds the cursor of the next page. Paging with
+    cursors is faster than with page numbers, and does not skip or repeat games as long as their sort keys do not
+    change between requests: that holds for "date_added", but a game can move under the cursor with "date_modified"
+    and "hottest" when it is edited or opened.
+    Responses are cached until the catalog changes and carry an ETag, so clients can revalidate with If-None-Match.
     """
+    version = await get_catalog_version(db)
+    key = (sort_by, search_query, None if cursor else page, cursor)
+    max_age = settings.LISTING_CACHE_HOTTEST_TTL_SECONDS if sort_by == "hottest" else settings.LISTING_CACHE_TTL_SECONDS
+    entry = listing_cache.get(key, version, max_age)
+    if entry is None:
+        entry = await build_listing(request, db, sort_by, search_query, page, cursor, version)
+        listing_cache.put(key, entry)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if entry.next_cursor is not None:
+        headers["X-Next-Cursor"] = entry.next_cursor
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+async def build_listing(
+    request: Request,
+    db: AsyncSession,
+    sort_by: SortBy,
+    search_query: str | None,
+    page: int,
+    cursor: str | None,
+    version: int,
+) -> CachedListing:
     page_size = 20
-    query = db.query(Game)
+    query = select(Game)
+    relevance = None
     if search_query:
-        search_query = f"%{search_query}%"
-        query = query.filter(Game.project.ilike(search_query))
+        query, relevance = search.apply_search(query, search_query)
 
-    if sort_by == "date_added":
-        query = query.order_by(Game.date_added.desc())
-    elif sort_by == "date_modified":
-        query = query.order_by(Game.date_modified.desc())
-    elif sort_by == "hottest":
-        query = query.order_by(Game.num_opens.desc(), Game.date_added.desc(), Game.date_modified.desc())
+    sort_key = pagination.sort_key(sort_by, relevance)
+    query = query.add_columns(*(column.label(f"sort_{i}") for i, column in enumerate(sort_key)))
+    query = query.order_by(*pagination.order_by(sort_key))
+    if cursor is not None:
+        try:
+            query = query.where(pagination.after_cursor(sort_key, sort_by, cursor))
+        except pagination.InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        query = query.offset((page - 1) * page_size)
 
-    query = query.offset((page - 1) * page_size).limit(page_size)
-    games = query.all()
+    # One extra row tells whether there is a next page.
+    rows = (await db.execute(query.limit(page_size + 1))).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = pagination.encode_cursor(sort_by, list(rows[-1][1:]))
+    games = [row[0] for row in rows]
 
     # Build API relative path for fetching HTML of each game.
     results: list[dict] = []
@@ -461,7 +786,8 @@ def list_games(
             result["subdomain_url"] = subdomain_url
 
         results.append(result)
-    return results
+    # Serialized the same way FastAPI serializes returned values.
+    return CachedListing(JSONResponse(jsonable_encoder(results)).body, next_cursor, version)
 
 
 @file_router.delete("/project/{project_name}")
@@ -483,11 +809,14 @@ def delete_project(
         raise HTTPException(status_code=403, detail="Project is locked")
 
     try:
-        github.delete_project(game.project)
+        storage.delete_project(game.project)
+    except GithubBudgetExhaustedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     db.delete(game)
+    bump_catalog_version(db)
     db.commit()
     return {"status": "success"}
 
@@ -510,40 +839,37 @@ def revert_project(
     if game.locked:
         raise HTTPException(status_code=403, detail="Project is locked")
 
+    # Restore the previous index.html and drop context.json (if it exists) in a single commit.
     try:
-        github.revert_file_to_previous_commit(game.project, "index.html")
+        previous_content = storage.previous_version(game.project, "index.html")
+        storage.write_files(
+            game.project, {"index.html": previous_content, "context.json": None}, "Revert project via API"
+        )
     except github.GithubFileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
     except github.GithubNoLastCommitError:
         raise HTTPException(status_code=400, detail="No previous commit found")
+    except GithubBudgetExhaustedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    # Delete context.json if it exists.
-    try:
-        github.delete_file(game.project, "context.json")
-    except github.GithubFileNotFoundError:
-        pass
-
-    # Update the modification timestamp in the database.
+    # Update the modification timestamp in the database and queue a thumbnail refresh.
     game.date_modified = datetime.now(pytz.utc)
     flag_modified(game, "date_modified")
+    html_path = str(request.url_for("get_game_html", project=game.project).path)
+    thumbnail_queue.enqueue(db, game.project, f"{settings.APP_URL}{html_path}")
+    bump_catalog_version(db)
     db.commit()
 
-    # Refresh the thumbnail.
-    html_path = str(request.url_for("get_game_html", project=game.project).path)
     thumb_url = thumbs.get_thumb_url(f"{settings.APP_URL}{html_path}")
-    background_tasks = BackgroundTasks()
-    background_tasks.add_task(thumbs.refresh_thumb, f"{settings.APP_URL}{html_path}")
-    response = JSONResponse(
+    return JSONResponse(
         {
             "status": "success",
             "html_path": html_path,
             "thumb_url": thumb_url,
         }
     )
-    response.background = background_tasks
-    return response
 
 
 router.include_router(ai_router)
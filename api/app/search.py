@@ -0,0 +1,26 @@
+from typing import Any
+
+from sqlalchemy import ColumnElement
+from sqlalchemy import Select
+from sqlalchemy import literal_column
+
+from app.models import Game
+from app.models import games_fts
+
+# The trigram tokenizer cannot match shorter queries.
+MIN_FTS_QUERY_LENGTH = 3
+
+
+def apply_search(query: Select[Any], search_query: str) -> tuple[Select[Any], ColumnElement[float] | None]:
+    """
+    Restricts the query to games matching `search_query` anywhere in their indexed text, case-insensitively.
+    Also returns the relevance of each match, higher is better, or None for queries too short for the full
+    text index, which are matched with LIKE instead.
+    """
+    if len(search_query) < MIN_FTS_QUERY_LENGTH:
+        return query.where(Game.project.ilike(f"%{search_query}%")), None
+    # A quoted string is matched as a substring by the trigram tokenizer, whatever characters it contains.
+    phrase = '"' + search_query.replace('"', '""') + '"'
+    query = query.join(games_fts, games_fts.c.rowid == Game.id).where(literal_column("games_fts").op("MATCH")(phrase))
+    # rank is the bm25 score of the match, lower is better.
+    return query, -games_fts.c.rank
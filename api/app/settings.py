@@ -1,4 +1,5 @@
 from typing import Any
+from typing import Literal
 
 from pydantic import model_validator
 from pydantic_settings import BaseSettings
@@ -8,6 +9,9 @@ from pydantic_settings import SettingsConfigDict
 class Settings(BaseSettings):
     GITHUB_API_TOKEN: str
     GITHUB_REPOSITORY: str
+    GITHUB_BRANCH: str = "main"
+    # REST API root, pointed at a stand-in by the benchmarks
+    GITHUB_API_URL: str = "https://api.github.com"
     PROJECTS_PATH: str
     API_KEYS: list[str] | str
     DB_PATH: str
@@ -15,11 +19,112 @@ class Settings(BaseSettings):
     GPT4F_API_URL: str = "https://g4f.cloud.mattf.one"
     CAPTURE_API_URL: str
     CAPTURE_API_KEY: str
+    # Thumbnails rendered at the same time by /admin/create_thumbnails
+    THUMBNAIL_CONCURRENCY: int = 4
+    # Thumbnails of edited games are rendered once the game has not changed for this long
+    THUMBNAIL_QUIET_PERIOD_SECONDS: float = 15.0
+    # Queued thumbnails rendered at the same time, across all workers
+    THUMBNAIL_QUEUE_CONCURRENCY: int = 2
+    # How often idle thumbnail workers look for due jobs
+    THUMBNAIL_QUEUE_POLL_SECONDS: float = 2.0
+    # Failed renders are retried with backoff, then dropped
+    THUMBNAIL_MAX_ATTEMPTS: int = 3
+    # Background AI jobs (/api/ai/{project_name}/jobs) running at the same time across all workers,
+    # and per API key unless AI_JOB_KEY_LIMITS sets another limit for the key, e.g. {"key1": 3}
+    AI_JOB_CONCURRENCY: int = 4
+    AI_JOB_PER_KEY_LIMIT: int = 1
+    AI_JOB_KEY_LIMITS: dict[str, int] = {}
+    # How often idle AI job workers look for queued jobs
+    AI_JOB_POLL_SECONDS: float = 1.0
+    # Size of the conversation sent to the AI for an edit, in tokens estimated as 4 characters each. Only the
+    # latest code is kept verbatim, then the oldest turns are dropped, or summarized if AI_CONTEXT_SUMMARIZE is set.
+    AI_CONTEXT_MAX_TOKENS: int = 24000
+    AI_CONTEXT_SUMMARIZE: bool = False
+    # SQLite profile applied to every connection. WAL lets reads run alongside the single writer, and writers wait
+    # up to DB_BUSY_TIMEOUT_MS for the lock instead of failing. Pools are per engine and per worker process.
+    DB_ECHO: bool = False
+    DB_JOURNAL_MODE: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"] = "WAL"
+    DB_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    DB_CACHE_SIZE_KIB: int = 16 * 1024
+    DB_MMAP_SIZE_BYTES: int = 256 * 1024 * 1024
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
     PORT: int = 8080
+    # Uvicorn worker processes (1 with RELOAD), and threads per worker for sync routes and other blocking calls
+    WORKERS: int = 4
+    SYNC_THREADS: int = 40
+    # Where worker processes started by `python -m app` keep their metrics for /metrics, emptied on startup
+    METRICS_MULTIPROC_DIR: str = "/tmp/vibegames-metrics"
     RELOAD: bool = False
     DEBUG: bool = False
     ENABLE_SUBDOMAINS: bool = False
     BASE_DOMAIN: str = "games.h4ks.com"
+    # In-memory cache of project files fetched from GitHub (per worker process)
+    CONTENT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Seconds a cached file is served without revalidating it against GitHub
+    CONTENT_CACHE_FRESH_SECONDS: float = 10.0
+    # Larger files are streamed from GitHub in chunks as they are sent, without being read into memory or cached
+    STREAM_THRESHOLD_BYTES: int = 1024 * 1024
+    # Game files of these types are served brotli, zstd (if zstandard is installed) or gzip encoded when the
+    # client accepts it and the file is at least COMPRESSION_MIN_SIZE bytes. Encoded variants are cached per
+    # worker process and file version.
+    COMPRESSIBLE_TYPES: list[str] = [
+        "text/html",
+        "text/css",
+        "text/javascript",
+        "application/javascript",
+        "application/json",
+        "application/xml",
+        "text/xml",
+        "text/plain",
+        "image/svg+xml",
+        "application/wasm",
+    ]
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    # Cache-Control of game pages and of the other files of a game. Responses carry an ETag and Last-Modified,
+    # so clients revalidate cheaply once max-age is over.
+    GAME_HTML_CACHE_CONTROL: str = "public, max-age=60, stale-while-revalidate=600"
+    GAME_ASSET_CACHE_CONTROL: str = "public, max-age=3600, stale-while-revalidate=86400"
+    # Cache-Control of the frontend build: content-hashed files never change, the others (index.html) are revalidated
+    STATIC_IMMUTABLE_CACHE_CONTROL: str = "public, max-age=31536000, immutable"
+    STATIC_CACHE_CONTROL: str = "public, max-age=0, must-revalidate"
+    # Serialized /api/games responses kept per worker process. Entries are dropped as soon as the catalog changes,
+    # and also expire after a while as open counts drift, sooner for "hottest" which is sorted on them
+    LISTING_CACHE_MAX_ENTRIES: int = 512
+    LISTING_CACHE_TTL_SECONDS: float = 300.0
+    LISTING_CACHE_HOTTEST_TTL_SECONDS: float = 10.0
+    # Game opens are written to the database in batches, whichever limit is reached first
+    OPENS_FLUSH_INTERVAL_SECONDS: float = 5.0
+    OPENS_FLUSH_THRESHOLD: int = 100
+    # GitHub rate limit budget, shared by the workers through GITHUB_BUDGET_PATH. Calls of a priority stop while no
+    # more than its reserve is left: admin jobs give way first, then game reads, then AI edits, and user writes can
+    # use it all. Game files are then served from the content cache, even stale, until the limit resets. Each worker
+    # keeps the budget in memory and merges it with the shared file every GITHUB_BUDGET_SYNC_SECONDS.
+    GITHUB_BUDGET_PATH: str = "/tmp/vibegames-github-budget.json"
+    GITHUB_BUDGET_RESERVES: dict[str, int] = {"user_write": 0, "ai_edit": 250, "game_read": 750, "admin": 1500}
+    GITHUB_BUDGET_SYNC_SECONDS: float = 1.0
+    # Outbound HTTP: timeouts in seconds per upstream, shared pool and retry policy
+    GITHUB_CONNECT_TIMEOUT: float = 5.0
+    GITHUB_READ_TIMEOUT: float = 30.0
+    CAPTURE_CONNECT_TIMEOUT: float = 5.0
+    CAPTURE_READ_TIMEOUT: float = 120.0
+    G4F_CONNECT_TIMEOUT: float = 5.0
+    G4F_READ_TIMEOUT: float = 300.0
+    HTTP_POOL_MAXSIZE: int = 10
+    HTTP_MAX_RETRIES: int = 3
+    HTTP_BACKOFF_FACTOR: float = 0.5
+    HTTP_BACKOFF_JITTER: float = 0.5
+    # Where project files are read from and written to: "github" uses the REST API for everything,
+    # "git_mirror" serves reads from a local clone of GITHUB_REPOSITORY and pushes writes to it.
+    STORAGE_BACKEND: Literal["github", "git_mirror"] = "github"
+    GIT_MIRROR_PATH: str = "./repo-mirror"
+    GIT_MIRROR_FETCH_INTERVAL_SECONDS: float = 60.0
+    # /admin/reset dates new and changed games by their last commit, one request each: at most this many per sync,
+    # the others are dated by later syncs, this many at once
+    CATALOG_SYNC_DATE_LOOKUPS: int = 100
+    CATALOG_SYNC_CONCURRENCY: int = 8
 
     # API keys can be a single string or a comma-separated list
     @model_validator(mode="before")
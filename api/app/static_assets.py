@@ -0,0 +1,112 @@
+import logging
+import mimetypes
+import os
+import re
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+
+from fastapi import Request
+from fastapi import Response
+from fastapi.responses import FileResponse
+
+from app.compression import ENCODERS
+from app.compression import is_compressible
+from app.compression import negotiate_encoding
+from app.http_cache import etag_matches
+from app.http_cache import modified_since
+from app.settings import settings
+
+# Pre-compressed siblings of the frontend files, also produced by the Dockerfile at build time.
+SIBLING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Build outputs named after their content, e.g. static/js/main.3b1c2a4f.js or 453.a1b2c3d4.chunk.js.
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}(\.chunk)?(\.\w+)+$")
+
+
+@dataclass
+class StaticAsset:
+    path: Path
+    stat_result: os.stat_result
+    media_type: str
+    cache_control: str
+    etag: str
+    # Pre-compressed siblings by encoding, with their stat so that serving them needs no stat() either.
+    variants: dict[str, tuple[Path, os.stat_result]] = field(default_factory=dict)
+
+    @property
+    def last_modified(self) -> datetime:
+        return datetime.fromtimestamp(self.stat_result.st_mtime, timezone.utc)
+
+
+def load_static_assets(directory: Path) -> dict[str, StaticAsset]:
+    """
+    Metadata of every file of the frontend build keyed by its path relative to the directory, compressing the
+    files that have no up to date .br/.gz sibling yet. The build only changes on deploy, so this runs once on startup.
+    """
+    sibling_suffixes = tuple(SIBLING_SUFFIXES.values())
+    assets: dict[str, StaticAsset] = {}
+    for path in sorted(directory.rglob("*")):
+        if not path.is_file() or (path.suffix in sibling_suffixes and path.with_suffix("").is_file()):
+            continue
+        stat_result = path.stat()
+        key = path.relative_to(directory).as_posix()
+        asset = StaticAsset(
+            path=path,
+            stat_result=stat_result,
+            media_type=mimetypes.guess_type(path.name)[0] or "text/plain",
+            cache_control=(
+                settings.STATIC_IMMUTABLE_CACHE_CONTROL
+                if HASHED_NAME.search(path.name)
+                else settings.STATIC_CACHE_CONTROL
+            ),
+            etag=f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"',
+        )
+        if is_compressible(asset.media_type) and stat_result.st_size >= settings.COMPRESSION_MIN_SIZE:
+            for encoding, suffix in SIBLING_SUFFIXES.items():
+                sibling = _compressed_sibling(path, stat_result, encoding, path.with_name(path.name + suffix))
+                if sibling is not None:
+                    asset.variants[encoding] = sibling
+        assets[key] = asset
+    logging.info(f"Loaded {len(assets)} static files from {directory}")
+    return assets
+
+
+def _compressed_sibling(
+    path: Path, stat_result: os.stat_result, encoding: str, sibling: Path
+) -> tuple[Path, os.stat_result] | None:
+    try:
+        if not sibling.is_file() or sibling.stat().st_mtime < stat_result.st_mtime:
+            # Written aside and renamed, as every worker process does this at the same time.
+            tmp = sibling.with_name(f".{sibling.name}.{os.getpid()}")
+            tmp.write_bytes(ENCODERS[encoding](path.read_bytes()))
+            os.utime(tmp, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+            tmp.replace(sibling)
+        sibling_stat = sibling.stat()
+    except OSError as e:
+        logging.warning(f"Failed to compress {path}: {e}")
+        return None
+    # Not worth sending when it does not get any smaller.
+    return (sibling, sibling_stat) if sibling_stat.st_size < stat_result.st_size else None
+
+
+def static_asset_response(request: Request, asset: StaticAsset) -> Response:
+    headers = {"Cache-Control": asset.cache_control}
+    if is_compressible(asset.media_type):
+        headers["Vary"] = "Accept-Encoding"
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), asset.variants.keys())
+    etag = asset.etag if encoding is None else f'{asset.etag[:-1]}-{encoding}"'
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, etag) or (
+        if_none_match is None and not modified_since(request.headers.get("if-modified-since"), asset.last_modified)
+    ):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    headers["ETag"] = etag
+    if encoding is None:
+        return FileResponse(asset.path, headers=headers, media_type=asset.media_type, stat_result=asset.stat_result)
+    path, stat_result = asset.variants[encoding]
+    headers["Content-Encoding"] = encoding
+    return FileResponse(path, headers=headers, media_type=asset.media_type, stat_result=stat_result)
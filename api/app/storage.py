@@ -0,0 +1,398 @@
+import base64
+import fcntl
+import logging
+import os
+import subprocess
+import threading
+import time
+from abc import ABC
+from abc import abstractmethod
+from collections.abc import Callable
+from collections.abc import Iterator
+from collections.abc import Mapping
+from contextlib import AbstractContextManager
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import anyio
+import httpx
+
+from app import github
+from app import github_async
+from app.content_cache import CachedFile
+from app.content_cache import git_blob_sha
+from app.settings import settings
+
+
+@dataclass
+class CommitInfo:
+    sha: str
+    author: str
+
+
+@dataclass
+class CatalogSnapshot:
+    """The project folders at one commit of the branch."""
+
+    commit: str
+    date: datetime
+    # Tree sha of each project folder, it changes with any file below it.
+    trees: dict[str, str]
+
+
+class StorageBackend(ABC):
+    """
+    Where project files live.
+
+    Missing files are reported with github.GithubFileNotFoundError and missing history with
+    github.GithubNoLastCommitError regardless of the backend, so routes handle all of them the same way.
+    """
+
+    def start(self) -> None:
+        """Called once per worker on startup."""
+
+    def stop(self) -> None:
+        """Called once per worker on shutdown."""
+
+    @abstractmethod
+    def read_file(self, project: str, path: str | None = None) -> bytes: ...
+
+    async def read_file_async(self, project: str, path: str | None = None) -> bytes:
+        return await anyio.to_thread.run_sync(self.read_file, project, path)
+
+    async def file_etag(self, project: str, path: str | None = None) -> str:
+        """Git blob sha of the file, without reading it again when the backend already knows it."""
+        return git_blob_sha(await self.read_file_async(project, path))
+
+    async def read_file_with_etag(self, project: str, path: str | None = None) -> tuple[bytes, str]:
+        """The file and its git blob sha, from a single read."""
+        body = await self.read_file_async(project, path)
+        return body, git_blob_sha(body)
+
+    def local_path(self, project: str, path: str | None = None) -> Path | None:
+        """Path of the file on local disk if the backend has one, so it can be served straight from disk."""
+        return None
+
+    async def open_stream(
+        self, project: str, path: str | None, request_headers: Mapping[str, str]
+    ) -> httpx.Response | None:
+        """
+        Upstream response streaming a file too large to be read into memory, see github_async.open_raw_file.
+        None when the file is served from memory or from disk instead.
+        """
+        return None
+
+    @abstractmethod
+    def catalog_snapshot(self) -> CatalogSnapshot: ...
+
+    @abstractmethod
+    def last_modified(self, project: str, commit: str) -> datetime | None:
+        """Date of the newest commit up to `commit` that changed the project, None if there is none."""
+
+    @abstractmethod
+    def list_project(self, project: str) -> list[str]:
+        """Paths of every file in the project, relative to the project folder."""
+
+    @abstractmethod
+    def write_files(self, project: str, files: Mapping[str, str | None], message: str) -> None:
+        """Writes the files in a single commit. A None content deletes the file if it exists."""
+
+    @abstractmethod
+    def delete_project(self, project: str) -> None: ...
+
+    @abstractmethod
+    def history(self, project: str, path: str, limit: int = 2) -> list[CommitInfo]:
+        """Most recent commits touching the file, newest first."""
+
+    @abstractmethod
+    def previous_version(self, project: str, path: str) -> str:
+        """Content of the file before the latest commit that touched it."""
+
+    def is_last_committer_token_user(self, project: str, path: str) -> bool:
+        """Whether the latest commit touching the file was made by the user of GITHUB_API_TOKEN."""
+        commits = self.history(project, path, limit=1)
+        return bool(commits) and commits[0].author == github.get_token_user()
+
+
+class GithubApiStorage(StorageBackend):
+    """Every read and write goes through the GitHub REST API."""
+
+    def read_file(self, project: str, path: str | None = None) -> bytes:
+        return github.get_raw_file_content(project, path)
+
+    async def read_file_async(self, project: str, path: str | None = None) -> bytes:
+        return await github_async.get_raw_file_content(project, path)
+
+    async def file_etag(self, project: str, path: str | None = None) -> str:
+        # The cached sha while fresh, then a conditional request that only downloads the file if it changed.
+        return (await github_async._fetch_file(project, path or "index.html")).sha
+
+    async def read_file_with_etag(self, project: str, path: str | None = None) -> tuple[bytes, str]:
+        # Files too large for the cache are streamed instead, so this is one cached fetch for both.
+        file = await github_async._fetch_file(project, path or "index.html")
+        return file.content, file.sha
+
+    async def open_stream(
+        self, project: str, path: str | None, request_headers: Mapping[str, str]
+    ) -> httpx.Response | None:
+        opened = await github_async.open_raw_file(project, path or "index.html", request_headers)
+        return None if isinstance(opened, CachedFile) else opened
+
+    def catalog_snapshot(self) -> CatalogSnapshot:
+        commit, date, trees = github.get_project_trees()
+        return CatalogSnapshot(commit, datetime.fromisoformat(date), trees)
+
+    def last_modified(self, project: str, commit: str) -> datetime | None:
+        date = github.get_last_commit_date(project, commit)
+        return datetime.fromisoformat(date) if date else None
+
+    def list_project(self, project: str) -> list[str]:
+        return github.get_project_files(project)
+
+    def write_files(self, project: str, files: Mapping[str, str | None], message: str) -> None:
+        if len(files) == 1:
+            [(path, content)] = files.items()
+            if content is not None:
+                # The contents API needs two requests for a single file, the Git Data API five.
+                github.update_or_create_file(path, content, project)
+                return
+        github.commit_files(project, files, message)
+
+    def delete_project(self, project: str) -> None:
+        github.delete_project(project)
+
+    def history(self, project: str, path: str, limit: int = 2) -> list[CommitInfo]:
+        commits = github.get_commits(project, path, limit)
+        return [CommitInfo(sha=commit["sha"], author=commit["commit"]["author"]["name"]) for commit in commits]
+
+    def previous_version(self, project: str, path: str) -> str:
+        return github.get_previous_file_content(project, path)
+
+
+class GitMirrorStorage(StorageBackend):
+    """
+    Keeps a local clone of GITHUB_REPOSITORY and reads from its working tree, so GitHub is off the read path.
+
+    Writes are committed locally and pushed. The clone is shared by all worker processes: every git command
+    that changes it runs under an exclusive file lock, and one background thread per worker fetches the
+    branch every GIT_MIRROR_FETCH_INTERVAL_SECONDS unless another worker did so recently. Reads hold a shared
+    lock on the working tree, which resets and writes take exclusively, so a read never sees a file half
+    updated. Files handed to FileResponse are opened after that, git replaces files rather than rewriting them.
+
+    The token is passed to git in its environment as an Authorization header, it is never in the remote URL,
+    in .git/config or on a command line.
+    """
+
+    push_attempts = 3
+
+    def __init__(self, root: Path, branch: str) -> None:
+        self.root = root
+        self.branch = branch
+        self.projects_root = root / settings.PROJECTS_PATH
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        with self._locked():
+            if not (self.root / ".git").exists():
+                self.root.parent.mkdir(parents=True, exist_ok=True)
+                # Blobs of old revisions are only downloaded when a revert needs them.
+                self._git("clone", "--filter=blob:none", "--branch", self.branch, self._remote_url(), str(self.root))
+            else:
+                # Clones made before the token left the URL still have it in .git/config.
+                self._git("remote", "set-url", "origin", self._remote_url())
+            self._sync()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._fetch_loop, name="git-mirror-fetch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def local_path(self, project: str, path: str | None = None) -> Path:
+        with self._reading():
+            return self._existing_file(project, path)
+
+    def read_file(self, project: str, path: str | None = None) -> bytes:
+        with self._reading():
+            return self._existing_file(project, path).read_bytes()
+
+    async def file_etag(self, project: str, path: str | None = None) -> str:
+        def etag() -> str:
+            with self._reading():
+                file_path = self._existing_file(project, path)
+                stat = file_path.stat()
+                return _file_blob_sha(file_path, stat.st_mtime_ns, stat.st_size)
+
+        return await anyio.to_thread.run_sync(etag)
+
+    def catalog_snapshot(self) -> CatalogSnapshot:
+        commit, date = self._git("log", "-1", "--format=%H %cI", "HEAD").split()
+        trees = {}
+        for entry in self._git("ls-tree", "-z", commit, f"{settings.PROJECTS_PATH}/").split("\0"):
+            info, _, path = entry.partition("\t")
+            if info.split()[1:2] == ["tree"]:
+                trees[path.rsplit("/", 1)[-1]] = info.split()[2]
+        return CatalogSnapshot(commit, datetime.fromisoformat(date), trees)
+
+    def last_modified(self, project: str, commit: str) -> datetime | None:
+        date = self._git("log", "-1", "--format=%cI", commit, "--", self._repo_path(project)).strip()
+        return datetime.fromisoformat(date) if date else None
+
+    def list_project(self, project: str) -> list[str]:
+        project_dir = self.projects_root / project
+        with self._reading():
+            return sorted(str(p.relative_to(project_dir)) for p in project_dir.rglob("*") if p.is_file())
+
+    def write_files(self, project: str, files: Mapping[str, str | None], message: str) -> None:
+        def apply() -> None:
+            for path, content in files.items():
+                file_path = self._project_file(project, path)
+                if content is None:
+                    self._git("rm", "-q", "--ignore-unmatch", "--", self._repo_path(project, path))
+                    continue
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                file_path.write_text(content, encoding="utf-8")
+                self._git("add", "--", self._repo_path(project, path))
+
+        self._commit_and_push(apply, message)
+
+    def delete_project(self, project: str) -> None:
+        repo_path = self._repo_path(project)
+        self._commit_and_push(lambda: self._git("rm", "-rq", "--", repo_path), "Delete project via API")
+
+    def history(self, project: str, path: str, limit: int = 2) -> list[CommitInfo]:
+        out = self._git("log", f"-n{limit}", "--format=%H %an", "HEAD", "--", self._repo_path(project, path))
+        return [CommitInfo(*line.split(" ", 1)) for line in out.splitlines()]
+
+    def previous_version(self, project: str, path: str) -> str:
+        commits = self.history(project, path)
+        if not commits:
+            raise github.GithubFileNotFoundError(f"File not found or has no commit history: {path}")
+        if len(commits) < 2:
+            raise github.GithubNoLastCommitError(f"No previous commit found for file: {path}")
+        return self._git("show", f"{commits[1].sha}:{self._repo_path(project, path)}")
+
+    def _commit_and_push(self, apply: Callable[[], object], message: str) -> None:
+        author = github.get_token_user()
+        with self._locked():
+            for attempt in range(self.push_attempts):
+                self._sync()
+                with self._locked("tree.lock"):
+                    apply()
+                if not self._git("diff", "--cached", "--name-only"):
+                    return
+                self._git(
+                    "-c",
+                    f"user.name={author}",
+                    "-c",
+                    f"user.email={author}@users.noreply.github.com",
+                    "commit",
+                    "-q",
+                    "-m",
+                    message,
+                )
+                try:
+                    self._git("push", "-q", "origin", f"HEAD:{self.branch}")
+                    return
+                except subprocess.CalledProcessError:
+                    # Someone pushed in between, start over from the new remote head.
+                    if attempt == self.push_attempts - 1:
+                        raise
+                    logging.warning(f"Push to {self.branch} rejected, retrying")
+
+    def _fetch_loop(self) -> None:
+        while not self._stopping.wait(settings.GIT_MIRROR_FETCH_INTERVAL_SECONDS):
+            fetch_head = self.root / ".git" / "FETCH_HEAD"
+            try:
+                with self._locked():
+                    # Another worker may have just fetched.
+                    if fetch_head.exists() and time.time() - fetch_head.stat().st_mtime < (
+                        settings.GIT_MIRROR_FETCH_INTERVAL_SECONDS / 2
+                    ):
+                        continue
+                    self._sync()
+            except subprocess.CalledProcessError as e:
+                logging.error(f"Failed to fetch git mirror: {e.stderr}")
+
+    def _sync(self) -> None:
+        """Moves the working tree to the remote head, dropping anything that was not pushed."""
+        self._git("fetch", "-q", "origin", self.branch)
+        with self._locked("tree.lock"):
+            self._git("reset", "-q", "--hard", f"origin/{self.branch}")
+
+    @contextmanager
+    def _locked(self, name: str = "lock", operation: int = fcntl.LOCK_EX) -> Iterator[None]:
+        self.root.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.root.parent / f".{self.root.name}.{name}", "w") as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reading(self) -> AbstractContextManager[None]:
+        """Keeps the working tree from being reset or written while the caller reads it."""
+        return self._locked("tree.lock", fcntl.LOCK_SH)
+
+    def _git(self, *args: str) -> str:
+        cwd = self.root if (self.root / ".git").exists() else None
+        result = subprocess.run(
+            ["git", *args],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0", **self._credentials()},
+        )
+        return result.stdout
+
+    def _credentials(self) -> dict[str, str]:
+        """Git configuration in environment variables adding the token to the requests sent to the remote."""
+        basic = base64.b64encode(f"x-access-token:{settings.GITHUB_API_TOKEN}".encode()).decode()
+        return {
+            "GIT_CONFIG_COUNT": "1",
+            "GIT_CONFIG_KEY_0": f"http.{self._remote_url()}.extraHeader",
+            "GIT_CONFIG_VALUE_0": f"Authorization: Basic {basic}",
+        }
+
+    def _project_file(self, project: str, path: str) -> Path:
+        """Resolves a path inside the project folder, refusing anything that would escape it."""
+        project_dir = (self.projects_root / project).resolve()
+        file_path = (project_dir / path).resolve()
+        if project_dir.parent != self.projects_root.resolve() or not file_path.is_relative_to(project_dir):
+            raise github.GithubFileNotFoundError(f"File not found: {project}/{path}")
+        return file_path
+
+    def _repo_path(self, project: str, path: str | None = None) -> str:
+        return f"{settings.PROJECTS_PATH}/{project}/{path}" if path else f"{settings.PROJECTS_PATH}/{project}"
+
+    def _existing_file(self, project: str, path: str | None) -> Path:
+        file_path = self._project_file(project, path or "index.html")
+        if not file_path.is_file():
+            raise github.GithubFileNotFoundError(f"File not found: {project}/{path or 'index.html'}")
+        return file_path
+
+    def _remote_url(self) -> str:
+        return settings.GITHUB_REPOSITORY
+
+
+@lru_cache(maxsize=4096)
+def _file_blob_sha(file_path: Path, mtime_ns: int, size: int) -> str:
+    """Blob sha of a file of the mirror, cached for the version of the file given by its mtime and size."""
+    return git_blob_sha(file_path.read_bytes())
+
+
+def create_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "git_mirror":
+        return GitMirrorStorage(Path(settings.GIT_MIRROR_PATH).resolve(), settings.GITHUB_BRANCH)
+    return GithubApiStorage()
+
+
+storage = create_storage()
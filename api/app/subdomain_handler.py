@@ -1,18 +1,22 @@
+from pathlib import Path
+
 from fastapi import HTTPException
-from fastapi import Response
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
 from starlette.requests import Request
 from starlette.responses import Response as StarletteResponse
 
 from app import github
-from app.database import get_db
+from app.database import AsyncReadSessionLocal
+from app.http_cache import game_file_response
+from app.open_counter import opens_counter
 from app.project_naming import extract_subdomain
-from app.project_naming import find_project_by_name_case_insensitive
+from app.project_naming import find_project_by_name_case_insensitive_async
 from app.project_naming import get_host_from_headers
 from app.project_naming import sanitize_project_name
 from app.settings import settings
+from app.static_assets import StaticAsset
+from app.static_assets import load_static_assets
+from app.static_assets import static_asset_response
 
 
 class SubdomainStaticFiles(StaticFiles):
@@ -20,6 +24,12 @@ class SubdomainStaticFiles(StaticFiles):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.assets: dict[str, StaticAsset] = {}
+
+    def load_assets(self) -> None:
+        """Builds the table of frontend files served without touching the disk, see load_static_assets."""
+        assert self.directory is not None
+        self.assets = load_static_assets(Path(self.directory))
 
     async def get_response(self, path: str, scope) -> StarletteResponse:
         """Override to check for subdomain games first."""
@@ -32,30 +42,29 @@ class SubdomainStaticFiles(StaticFiles):
                 subdomain = extract_subdomain(host, settings.BASE_DOMAIN)
                 if subdomain:
                     # Try to serve the game directly
-                    db: Session = next(get_db())
-                    try:
+                    async with AsyncReadSessionLocal() as db:
                         # Find project with case-insensitive sanitized lookup
-                        game = find_project_by_name_case_insensitive(db, subdomain)
-
-                        if game:
-                            try:
-                                content = github.get_file_content(game.project)
-                                # Update the number of opens for the game.
-                                game.num_opens += 1
-                                flag_modified(game, "num_opens")
-                                db.commit()
-                                return Response(content, media_type="text/html")
-                            except github.GithubFileNotFoundError:
-                                pass
-
-                        # If project not found, return detailed 404
-                        sanitized_subdomain = sanitize_project_name(subdomain)
-                        raise HTTPException(
-                            status_code=404,
-                            detail=f"Game project '{subdomain}' (sanitized: '{sanitized_subdomain}') not found",
-                        )
-                    finally:
-                        db.close()
-
-        # Fall back to regular static file serving
+                        game = await find_project_by_name_case_insensitive_async(db, subdomain)
+
+                    if game:
+                        try:
+                            response = await game_file_response(
+                                request, game, None, "text/html", settings.GAME_HTML_CACHE_CONTROL
+                            )
+                            opens_counter.increment(game.id)
+                            return response
+                        except github.GithubFileNotFoundError:
+                            pass
+
+                    # If project not found, return detailed 404
+                    sanitized_subdomain = sanitize_project_name(subdomain)
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"Game project '{subdomain}' (sanitized: '{sanitized_subdomain}') not found",
+                    )
+
+        # Fall back to regular static file serving, from the table of the frontend build when the file is in it
+        asset = self.assets.get("index.html" if path == "." else path)
+        if asset is not None and scope["method"] in ("GET", "HEAD"):
+            return static_asset_response(Request(scope), asset)
         return await super().get_response(path, scope)
@@ -0,0 +1,196 @@
+import logging
+import queue
+import threading
+from datetime import datetime
+from datetime import timedelta
+
+import pytz
+from sqlalchemy import Select
+from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import aliased
+
+from app import thumbs
+from app.database import ReadSessionLocal
+from app.database import SessionLocal
+from app.models import Game
+from app.models import ThumbnailJob
+from app.settings import settings
+
+# project, game_url and requested_at of a claimed job.
+ClaimedJob = tuple[str, str, datetime]
+
+
+class ThumbnailQueue:
+    """
+    Thumbnail refreshes waiting in the thumbnail_jobs table, rendered by a few background threads per worker.
+
+    There is at most one job per project: enqueueing again replaces the pending job and pushes it back by
+    `quiet_period`, so a burst of uploads to a project ends in a single capture. Jobs are claimed with a
+    lease in one UPDATE, which also refuses the claim while `concurrency` leases are live, so the cap holds
+    across worker processes. One poller thread per worker claims jobs for its idle threads, and only takes the
+    write lock once a read found a due job. Jobs survive restarts; a job whose worker died is retried once its
+    lease expires.
+    """
+
+    def __init__(self, quiet_period: float, concurrency: int, poll_interval: float, max_attempts: int) -> None:
+        self.quiet_period = timedelta(seconds=quiet_period)
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        # Long enough for a capture request with all of its retries.
+        self.lease = timedelta(
+            seconds=(settings.CAPTURE_CONNECT_TIMEOUT + settings.CAPTURE_READ_TIMEOUT) * (settings.HTTP_MAX_RETRIES + 1)
+        )
+        self._stopping = threading.Event()
+        self._jobs: queue.Queue[ClaimedJob | None] = queue.Queue()
+        self._idle = threading.Semaphore(concurrency)
+        self._threads: list[threading.Thread] = []
+
+    def enqueue(self, db: Session, project: str, game_url: str) -> None:
+        """Schedules a refresh of the project's thumbnail. Committed along with the caller's session."""
+        now = datetime.now(pytz.utc)
+        stmt = insert(ThumbnailJob).values(
+            project=project, game_url=game_url, requested_at=now, due_at=now + self.quiet_period, attempts=0
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ThumbnailJob.project],
+            set_={
+                "game_url": stmt.excluded.game_url,
+                "requested_at": stmt.excluded.requested_at,
+                "due_at": stmt.excluded.due_at,
+                "attempts": 0,
+            },
+        )
+        db.execute(stmt)
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._jobs = queue.Queue()
+        self._idle = threading.Semaphore(self.concurrency)
+        self._threads = [threading.Thread(target=self._poll, name="thumbnail-queue-poller", daemon=True)] + [
+            threading.Thread(target=self._work, name=f"thumbnail-queue-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stops claiming jobs. Renders in flight are not waited for, their jobs are retried after the lease."""
+        self._stopping.set()
+        for _ in range(self.concurrency):
+            self._jobs.put(None)
+        self._threads = []
+
+    def _poll(self) -> None:
+        while not self._stopping.is_set():
+            if not self._idle.acquire(timeout=self.poll_interval):
+                continue
+            try:
+                job = self._claim()
+            except Exception as e:
+                logging.error(f"Failed to claim thumbnail job: {e}")
+                job = None
+            if job is not None:
+                self._jobs.put(job)
+                continue
+            self._idle.release()
+            self._stopping.wait(self.poll_interval)
+
+    def _work(self) -> None:
+        while (job := self._jobs.get()) is not None:
+            try:
+                self._render(*job)
+            finally:
+                self._idle.release()
+
+    def _next_job(self, now: datetime) -> Select[tuple[str]]:
+        """The job due the longest that is not leased, while fewer than `concurrency` leases are live."""
+        running = aliased(ThumbnailJob)
+        candidate = aliased(ThumbnailJob)
+        running_count = select(func.count()).where(running.claimed_until >= now).scalar_subquery()
+        return (
+            select(candidate.project)
+            .where(
+                candidate.due_at <= now,
+                or_(candidate.claimed_until.is_(None), candidate.claimed_until < now),
+                running_count < self.concurrency,
+            )
+            .order_by(candidate.due_at)
+            .limit(1)
+        )
+
+    def _claim(self) -> ClaimedJob | None:
+        now = datetime.now(pytz.utc)
+        next_job = self._next_job(now)
+        with ReadSessionLocal() as db:
+            if db.execute(next_job).first() is None:
+                return None
+        # Another worker may claim it first, the UPDATE checks again.
+        stmt = (
+            update(ThumbnailJob)
+            .where(ThumbnailJob.project == next_job.scalar_subquery())
+            .values(claimed_until=now + self.lease)
+            .returning(ThumbnailJob.project, ThumbnailJob.game_url, ThumbnailJob.requested_at)
+            .execution_options(synchronize_session=False)
+        )
+        with SessionLocal() as db:
+            row = db.execute(stmt).one_or_none()
+            db.commit()
+        return None if row is None else (row.project, row.game_url, row.requested_at)
+
+    def _render(self, project: str, game_url: str, requested_at: datetime) -> None:
+        logging.info(f"Refreshing thumbnail for {game_url}")
+        try:
+            thumbs.refresh_thumb(game_url)
+        except Exception as e:
+            logging.error(f"Failed to refresh thumbnail for {game_url}: {e}")
+            self._release(project, requested_at, failed=True)
+            return
+        record_thumbnail(project)
+        self._release(project, requested_at, failed=False)
+
+    def _release(self, project: str, requested_at: datetime, failed: bool) -> None:
+        """
+        Drops the job once rendered, or pushes it back with exponential backoff after a failure.
+        A job that was enqueued again while rendering is left pending, as the render may predate the change.
+        """
+        with SessionLocal() as db:
+            job = db.get(ThumbnailJob, project)
+            if job is None:
+                return
+            if job.requested_at != requested_at:
+                job.claimed_until = None
+            elif not failed or job.attempts + 1 >= self.max_attempts:
+                if failed:
+                    logging.error(f"Giving up on thumbnail for {job.game_url} after {self.max_attempts} attempts")
+                db.delete(job)
+            else:
+                job.attempts += 1
+                job.claimed_until = None
+                job.due_at = datetime.now(pytz.utc) + self.quiet_period * 2**job.attempts
+            db.commit()
+
+
+def record_thumbnail(project: str) -> None:
+    """Remembers that the game's thumbnail is up to date as of now."""
+    with SessionLocal() as db:
+        # A new thumbnail does not modify the game, keep date_modified from its onupdate.
+        db.execute(
+            update(Game)
+            .where(Game.project == project)
+            .values(thumbnail_date=datetime.now(pytz.utc), date_modified=Game.date_modified)
+        )
+        db.commit()
+
+
+thumbnail_queue = ThumbnailQueue(
+    settings.THUMBNAIL_QUIET_PERIOD_SECONDS,
+    settings.THUMBNAIL_QUEUE_CONCURRENCY,
+    settings.THUMBNAIL_QUEUE_POLL_SECONDS,
+    settings.THUMBNAIL_MAX_ATTEMPTS,
+)
@@ -1,5 +1,5 @@
-import requests
-
+from app.http_client import capture_client
+from app.metrics import upstream_call
 from app.settings import settings
 
 
@@ -7,11 +7,12 @@ def get_thumb_url(game_url: str) -> str:
     return f"{settings.CAPTURE_API_URL}/capture?url={game_url}&format=webp&length=4"
 
 
+@upstream_call("capture")
 def refresh_thumb(game_url: str, force_recreate=True) -> None:
     """Refreshes the thumbnail for a game URL."""
     api_url = get_thumb_url(game_url)
     if force_recreate:
         api_url += "&nocache"
     headers = {"Authorization": f"Bearer {settings.CAPTURE_API_KEY}"}
-    resp = requests.get(api_url, headers=headers)
+    resp = capture_client.get(api_url, headers=headers)
     resp.raise_for_status()
@@ -0,0 +1,223 @@
+"""
+Benchmarks the API against local stand-ins for GitHub, the capture service and g4f, so that runs are
+reproducible and measure the app rather than the network.
+
+    cd api && python -m bench --duration 10 --output before.json
+
+Starts the fakes and `python -m app` on free ports with a temporary database, imports the seeded games with
+/admin/reset, then runs each scenario for --duration seconds. The JSON report has the throughput, latency
+percentiles, error rate and response statuses of every scenario, with the requests each fake received meanwhile,
+and can be diffed against the report of another run.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import ExitStack
+from contextlib import contextmanager
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from bench.fake_server import STATS_PATH
+from bench.scenarios import SCENARIOS
+from bench.scenarios import run_scenario
+
+API_DIR = Path(__file__).resolve().parent.parent
+API_KEY = "bench"
+BASE_DOMAIN = "games.bench"
+PROJECTS_PATH = "games"
+STARTUP_TIMEOUT_SECONDS = 60.0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def running(
+    name: str, command: list[str], log_dir: Path, ready_url: str, env: dict[str, str] | None = None
+) -> Iterator[None]:
+    """Runs the command until the block exits, once `ready_url` answers. Its output goes to <log_dir>/<name>.log."""
+    log_path = log_dir / f"{name}.log"
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(command, cwd=API_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+        while True:
+            if process.poll() is not None or time.monotonic() > deadline:
+                sys.stderr.write(log_path.read_text()[-4000:])
+                raise SystemExit(f"{name} did not start, see its output above")
+            try:
+                if httpx.get(ready_url).status_code < 500:
+                    break
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+        logging.info(f"Started {name}")
+        yield
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=API_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the API against fake upstream services")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios to run")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds each scenario runs for")
+    parser.add_argument("--concurrency", type=int, default=16, help="Simulated clients of the read scenarios")
+    parser.add_argument("--write-concurrency", type=int, default=4, help="Simulated clients of the write scenarios")
+    parser.add_argument("--workers", type=int, default=1, help="WORKERS of the app")
+    parser.add_argument(
+        "--app-env", action="append", default=[], metavar="NAME=VALUE", help="Extra app setting, can be repeated"
+    )
+    parser.add_argument("--projects", type=int, default=200, help="Games seeded in the fake GitHub")
+    parser.add_argument("--page-size", type=int, default=8 * 1024, help="Approximate size of each index.html")
+    parser.add_argument("--asset-size", type=int, default=64 * 1024, help="Approximate size of each game.js")
+    parser.add_argument("--github-latency-ms", type=float, default=50)
+    parser.add_argument("--github-rate-limit", type=int, default=5000, help="GitHub requests allowed per hour")
+    parser.add_argument("--capture-latency-ms", type=float, default=1500)
+    parser.add_argument("--g4f-latency-ms", type=float, default=500, help="Time to the first completion chunk")
+    parser.add_argument("--g4f-chunk-delay-ms", type=float, default=2)
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra latency of every fake response")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Where to write the report instead of stdout")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - SCENARIOS.keys()
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def fake_command(module: str, port: int, latency_ms: float, args: argparse.Namespace, *extra: str) -> list[str]:
+    return [
+        sys.executable,
+        "-m",
+        f"bench.{module}",
+        "--port",
+        str(port),
+        "--latency-ms",
+        str(latency_ms),
+        "--jitter-ms",
+        str(args.jitter_ms),
+        *extra,
+    ]
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    args = parse_args()
+    ports = {name: free_port() for name in ("github", "capture", "g4f", "app")}
+    fake_urls = {name: f"http://127.0.0.1:{ports[name]}" for name in ("github", "capture", "g4f")}
+    app_url = f"http://127.0.0.1:{ports['app']}"
+
+    with tempfile.TemporaryDirectory(prefix="vibegames-bench-") as tmp, ExitStack() as stack:
+        tmp_dir = Path(tmp)
+        github = fake_command(
+            "fake_github",
+            ports["github"],
+            args.github_latency_ms,
+            args,
+            *("--projects-path", PROJECTS_PATH, "--projects", str(args.projects), "--seed", str(args.seed)),
+            *("--page-size", str(args.page_size), "--asset-size", str(args.asset_size)),
+            *("--rate-limit", str(args.github_rate_limit)),
+        )
+        capture = fake_command("fake_capture", ports["capture"], args.capture_latency_ms, args)
+        g4f = fake_command(
+            "fake_g4f", ports["g4f"], args.g4f_latency_ms, args, "--chunk-delay-ms", str(args.g4f_chunk_delay_ms)
+        )
+        for name, command in (("github", github), ("capture", capture), ("g4f", g4f)):
+            stack.enter_context(running(f"fake_{name}", command, tmp_dir, f"{fake_urls[name]}{STATS_PATH}"))
+
+        app_env = {
+            **os.environ,
+            "GITHUB_API_URL": fake_urls["github"],
+            "GITHUB_API_TOKEN": API_KEY,
+            "GITHUB_REPOSITORY": "https://github.com/bench/games",
+            "GITHUB_BRANCH": "main",
+            "PROJECTS_PATH": PROJECTS_PATH,
+            "STORAGE_BACKEND": "github",
+            "CAPTURE_API_URL": fake_urls["capture"],
+            "CAPTURE_API_KEY": API_KEY,
+            "GPT4F_API_URL": fake_urls["g4f"],
+            "API_KEYS": API_KEY,
+            "DB_PATH": f"sqlite:///{tmp_dir / 'bench.db'}",
+            "APP_URL": app_url,
+            "PORT": str(ports["app"]),
+            "WORKERS": str(args.workers),
+            "RELOAD": "false",
+            "DEBUG": "false",
+            "ENABLE_SUBDOMAINS": "true",
+            "BASE_DOMAIN": BASE_DOMAIN,
+            "METRICS_MULTIPROC_DIR": str(tmp_dir / "metrics"),
+            "GITHUB_BUDGET_PATH": str(tmp_dir / "github-budget.json"),
+            **dict(setting.split("=", 1) for setting in args.app_env),
+        }
+        stack.enter_context(running("app", [sys.executable, "-m", "app"], tmp_dir, f"{app_url}/api/games", app_env))
+
+        auth = {"Authorization": f"Bearer {API_KEY}"}
+        resp = httpx.get(f"{app_url}/admin/reset", headers=auth, timeout=60)
+        resp.raise_for_status()
+        projects = resp.json()["added"]
+        logging.info(f"Imported {len(projects)} games")
+
+        report: dict[str, Any] = {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "config": {name: str(value) if isinstance(value, Path) else value for name, value in vars(args).items()},
+            "scenarios": {},
+        }
+        for name in args.scenarios.split(","):
+            scenario = SCENARIOS[name]
+            for url in fake_urls.values():
+                httpx.delete(f"{url}{STATS_PATH}").raise_for_status()
+            concurrency = args.write_concurrency if scenario.writes else args.concurrency
+            logging.info(f"Running {name} with {concurrency} clients for {args.duration}s")
+            results = asyncio.run(
+                run_scenario(scenario, app_url, concurrency, args.duration, projects, BASE_DOMAIN, API_KEY, args.seed)
+            )
+            summary = results.summary()
+            summary["upstream"] = {
+                fake: httpx.get(f"{url}{STATS_PATH}").raise_for_status().json() for fake, url in fake_urls.items()
+            }
+            report["scenarios"][name] = summary
+            logging.info(
+                f"{name}: {summary['throughput_rps']} req/s, p50 {summary['latency_ms']['p50']} ms,"
+                f" p99 {summary['latency_ms']['p99']} ms, {summary['errors']} errors"
+            )
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        args.output.write_text(f"{output}\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
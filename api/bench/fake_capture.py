@@ -0,0 +1,38 @@
+"""
+Stand-in for the webcapture service that renders game thumbnails, answering every capture with the same image
+after the time a render takes.
+
+    python -m bench.fake_capture --port 9002
+"""
+
+import random
+
+from fastapi import FastAPI
+from fastapi import Response
+
+from bench.fake_server import argument_parser
+from bench.fake_server import instrument
+from bench.fake_server import serve
+
+
+def create_app(image: bytes, latency_ms: float, jitter_ms: float) -> FastAPI:
+    app = FastAPI()
+    instrument(app, latency_ms, jitter_ms)
+
+    @app.get("/capture")
+    async def capture(url: str, format: str = "webp") -> Response:
+        return Response(image, media_type=f"image/{format}")
+
+    return app
+
+
+def main() -> None:
+    parser = argument_parser("Fake capture service", latency_ms=1500)
+    parser.add_argument("--image-size", type=int, default=16 * 1024, help="Size of the captured image")
+    args = parser.parse_args()
+    image = random.Random(0).randbytes(args.image_size)
+    serve(create_app(image, args.latency_ms, args.jitter_ms), args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Stand-in for the g4f completions endpoint, answering every prompt with a generated page in a code block. The
+first chunk comes after --latency-ms, then one every --chunk-delay-ms, streamed as server-sent events when
+asked to and all at once otherwise.
+
+    python -m bench.fake_g4f --port 9003
+"""
+
+import asyncio
+import json
+import random
+from collections.abc import AsyncIterator
+from typing import Any
+
+from fastapi import Body
+from fastapi import FastAPI
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+
+from bench.fake_github import game_page
+from bench.fake_github import script_lines
+from bench.fake_server import argument_parser
+from bench.fake_server import instrument
+from bench.fake_server import serve
+
+# Characters per streamed chunk, about as many as in a few tokens.
+CHUNK_SIZE = 16
+
+
+def create_app(completion_size: int, chunk_delay_ms: float, latency_ms: float, jitter_ms: float) -> FastAPI:
+    app = FastAPI()
+    instrument(app, latency_ms, jitter_ms)
+    rng = random.Random(0)
+
+    @app.post("/api/completions")
+    async def completions(body: dict[str, Any] = Body(...)) -> Response:
+        page = game_page("AI game", script_lines(rng, completion_size))
+        completion = f"Here is the updated game:\n\n```html\n{page}```\n"
+        chunks = [completion[i : i + CHUNK_SIZE] for i in range(0, len(completion), CHUNK_SIZE)]
+        if not body.get("stream"):
+            await asyncio.sleep(len(chunks) * chunk_delay_ms / 1000)
+            return JSONResponse({"completion": completion})
+
+        async def events() -> AsyncIterator[str]:
+            for chunk in chunks:
+                await asyncio.sleep(chunk_delay_ms / 1000)
+                yield f"data: {json.dumps({'content': chunk})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    parser = argument_parser("Fake g4f API", latency_ms=500)
+    parser.add_argument("--completion-size", type=int, default=6000, help="Approximate size of the generated page")
+    parser.add_argument("--chunk-delay-ms", type=float, default=2.0, help="Delay between streamed chunks")
+    args = parser.parse_args()
+    serve(create_app(args.completion_size, args.chunk_delay_ms, args.latency_ms, args.jitter_ms), args.port)
+
+
+if __name__ == "__main__":
+    main()
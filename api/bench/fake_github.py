@@ -0,0 +1,379 @@
+"""
+Stand-in for the parts of the GitHub REST API used by app/github.py: the contents, commits and Git Data endpoints
+of a single branch, backed by a temporary directory and seeded with generated game projects.
+
+    python -m bench.fake_github --port 9001 --projects 200
+
+Like GitHub, responses carry X-RateLimit-* headers, conditional requests answered with a 304 do not count against
+the limit, and once it is used up requests are refused with a 403 until the window resets.
+"""
+
+import base64
+import hashlib
+import json
+import random
+import tempfile
+import time
+from collections import defaultdict
+from collections.abc import Awaitable
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from typing import Any
+
+from fastapi import Body
+from fastapi import FastAPI
+from fastapi import Request
+from fastapi import Response
+from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse
+
+from bench.fake_server import STATS_PATH
+from bench.fake_server import argument_parser
+from bench.fake_server import instrument
+from bench.fake_server import serve
+
+# Login of the token, every commit is authored by it.
+TOKEN_USER = "bench"
+# Seeded project names are made of these, so that searches for them find a few games each.
+WORDS = ["space", "snake", "pong", "maze", "racer", "puzzle", "tower", "jump", "block", "star", "ninja", "tank"]
+
+
+def blob_sha(content: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+@dataclass
+class Commit:
+    sha: str
+    tree: str
+    parents: list[str]
+    message: str
+    date: str
+
+
+class FakeRepository:
+    """
+    Commits, trees and blobs of one branch. Blobs are files of the directory named after their sha, trees map the
+    path of every file below them to its blob sha, so that equal trees get equal shas like in git.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.objects = directory / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.trees: dict[str, dict[str, str]] = {}
+        self.commits: dict[str, Commit] = {}
+        self.head = self.commit(self.put_tree({}), [], "Initial commit")
+
+    def put_blob(self, content: bytes) -> str:
+        sha = blob_sha(content)
+        path = self.blob_path(sha)
+        if not path.exists():
+            path.write_bytes(content)
+        return sha
+
+    def blob_path(self, sha: str) -> Path:
+        return self.objects / sha
+
+    def put_tree(self, files: dict[str, str]) -> str:
+        sha = hashlib.sha1(json.dumps(sorted(files.items())).encode()).hexdigest()
+        self.trees.setdefault(sha, files)
+        return sha
+
+    def commit(self, tree: str, parents: list[str], message: str) -> str:
+        date = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        sha = hashlib.sha1(json.dumps([tree, parents, message, date, len(self.commits)]).encode()).hexdigest()
+        self.commits[sha] = Commit(sha, tree, parents, message, date)
+        return sha
+
+    def resolve(self, rev: str | None = None) -> dict[str, str] | None:
+        """Files of a commit or tree, the head by default. "<sha>:<path>" is the subtree at the path."""
+        rev, _, path = (rev or self.head).partition(":")
+        files = self.trees.get(self.commits[rev].tree if rev in self.commits else rev)
+        if files is None or not path.strip("/"):
+            return files
+        prefix = f"{path.strip('/')}/"
+        subtree = {name.removeprefix(prefix): sha for name, sha in files.items() if name.startswith(prefix)}
+        return subtree or None
+
+    def write(self, changes: dict[str, bytes | None], message: str) -> str:
+        """Commits the files on top of the head, a None content deletes the file."""
+        files = dict(self.trees[self.commits[self.head].tree])
+        for path, content in changes.items():
+            if content is None:
+                files.pop(path, None)
+            else:
+                files[path] = self.put_blob(content)
+        self.head = self.commit(self.put_tree(files), [self.head], message)
+        return self.head
+
+    def history(self, path: str, limit: int, start: str | None = None) -> list[Commit]:
+        """
+        Commits that changed the file or folder, following first parents from `start` (the head if it is not a known
+        commit), newest first.
+        """
+        commits: list[Commit] = []
+        commit = self.commits.get(start or "") or self.commits[self.head]
+        while commit.parents and len(commits) < limit:
+            parent = self.commits[commit.parents[0]]
+            if self.at_path(commit.tree, path) != self.at_path(parent.tree, path):
+                commits.append(commit)
+            commit = parent
+        return commits
+
+    def at_path(self, tree: str, path: str) -> str | dict[str, str] | None:
+        """Blob sha of the file at the path, or the files of the folder."""
+        return self.trees[tree].get(path) or self.resolve(f"{tree}:{path}")
+
+    def tree_entries(self, files: dict[str, str], recursive: bool) -> list[dict[str, Any]]:
+        """Entries of the Git Trees API: the files and folders right below the tree, or all of them."""
+        subtrees: defaultdict[str, dict[str, str]] = defaultdict(dict)
+        entries: list[dict[str, Any]] = []
+        for path, sha in files.items():
+            parts = path.split("/")
+            for depth in range(1, len(parts) if recursive else min(len(parts), 2)):
+                subtrees["/".join(parts[:depth])]["/".join(parts[depth:])] = sha
+            if recursive or len(parts) == 1:
+                size = self.blob_path(sha).stat().st_size
+                entries.append({"path": path, "mode": "100644", "type": "blob", "sha": sha, "size": size})
+        entries.extend(
+            {"path": path, "mode": "040000", "type": "tree", "sha": self.put_tree(subtree)}
+            for path, subtree in subtrees.items()
+        )
+        return sorted(entries, key=lambda entry: entry["path"])
+
+
+class RateLimit:
+    def __init__(self, limit: int, window_seconds: float) -> None:
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.used = 0
+        self.reset_at = time.time() + window_seconds
+
+    @property
+    def exhausted(self) -> bool:
+        if time.time() >= self.reset_at:
+            self.used = 0
+            self.reset_at = time.time() + self.window_seconds
+        return self.used >= self.limit
+
+    def headers(self) -> dict[str, str]:
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(self.limit - self.used, 0)),
+            "X-RateLimit-Used": str(self.used),
+            "X-RateLimit-Reset": str(int(self.reset_at)),
+            "X-RateLimit-Resource": "core",
+        }
+
+
+def not_found() -> JSONResponse:
+    return JSONResponse({"message": "Not Found"}, status_code=404)
+
+
+def create_app(repo: FakeRepository, rate_limit: RateLimit, latency_ms: float, jitter_ms: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def limit_rate(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+        if request.url.path == STATS_PATH:
+            return await call_next(request)
+        if rate_limit.exhausted:
+            return JSONResponse({"message": "API rate limit exceeded"}, status_code=403, headers=rate_limit.headers())
+        response = await call_next(request)
+        if response.status_code != 304:
+            rate_limit.used += 1
+        response.headers.update(rate_limit.headers())
+        return response
+
+    # Added last so it wraps the rate limiting, refused requests are delayed and counted too.
+    instrument(app, latency_ms, jitter_ms)
+
+    @app.get("/user")
+    async def get_user() -> dict[str, str]:
+        return {"login": TOKEN_USER}
+
+    @app.get("/repos/{owner}/{repo_name}/contents/{path:path}")
+    async def get_contents(path: str, request: Request, ref: str | None = None) -> Response:
+        files = repo.resolve(ref) or {}
+        path = path.strip("/")
+        sha = files.get(path)
+        if sha is not None:
+            etag = f'"{sha}"'
+            if "raw" not in request.headers.get("accept", ""):
+                content = base64.b64encode(repo.blob_path(sha).read_bytes()).decode()
+                item = {"type": "file", "name": path.rsplit("/", 1)[-1], "path": path, "sha": sha}
+                return JSONResponse({**item, "encoding": "base64", "content": content}, headers={"ETag": etag})
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+            # Answers Range and If-Range requests as well.
+            return FileResponse(repo.blob_path(sha), media_type="application/vnd.github.raw", headers={"ETag": etag})
+
+        listing = repo.tree_entries(repo.resolve(f"{ref or repo.head}:{path}") or {}, recursive=False) if path else []
+        if not listing:
+            return not_found()
+        return JSONResponse(
+            [
+                {
+                    "type": "dir" if entry["type"] == "tree" else "file",
+                    "name": entry["path"],
+                    "path": f"{path}/{entry['path']}",
+                    "sha": entry["sha"],
+                }
+                for entry in listing
+            ]
+        )
+
+    @app.put("/repos/{owner}/{repo_name}/contents/{path:path}")
+    async def put_contents(path: str, body: dict[str, Any] = Body(...)) -> JSONResponse:
+        current = (repo.resolve() or {}).get(path)
+        if current is not None and "sha" not in body:
+            return JSONResponse({"message": '"sha" wasn\'t supplied.'}, status_code=422)
+        if current is not None and body["sha"] != current:
+            return JSONResponse({"message": f"{path} does not match {body['sha']}"}, status_code=409)
+        content = base64.b64decode(body["content"])
+        commit = repo.write({path: content}, body["message"])
+        return JSONResponse(
+            {"content": {"path": path, "sha": blob_sha(content)}, "commit": {"sha": commit}},
+            status_code=201 if current is None else 200,
+        )
+
+    @app.get("/repos/{owner}/{repo_name}/commits")
+    async def list_commits(path: str, per_page: int = 30, sha: str | None = None) -> list[dict[str, Any]]:
+        return [
+            {
+                "sha": commit.sha,
+                "commit": {
+                    "message": commit.message,
+                    "author": {"name": TOKEN_USER, "date": commit.date},
+                    "committer": {"name": TOKEN_USER, "date": commit.date},
+                    "tree": {"sha": commit.tree},
+                },
+                "parents": [{"sha": parent} for parent in commit.parents],
+            }
+            for commit in repo.history(path, per_page, sha)
+        ]
+
+    @app.get("/repos/{owner}/{repo_name}/git/ref/heads/{branch:path}")
+    async def get_ref(branch: str) -> dict[str, Any]:
+        return {"ref": f"refs/heads/{branch}", "object": {"sha": repo.head, "type": "commit"}}
+
+    @app.get("/repos/{owner}/{repo_name}/git/commits/{sha}")
+    async def get_commit(sha: str) -> Response:
+        commit = repo.commits.get(sha)
+        if commit is None:
+            return not_found()
+        return JSONResponse(
+            {
+                "sha": commit.sha,
+                "tree": {"sha": commit.tree},
+                "parents": [{"sha": parent} for parent in commit.parents],
+                "message": commit.message,
+                "author": {"name": TOKEN_USER, "date": commit.date},
+                "committer": {"name": TOKEN_USER, "date": commit.date},
+            }
+        )
+
+    @app.get("/repos/{owner}/{repo_name}/git/trees/{tree_ish:path}")
+    async def get_tree(tree_ish: str, recursive: bool = False) -> Response:
+        files = repo.resolve(tree_ish)
+        if files is None:
+            return not_found()
+        return JSONResponse(
+            {"sha": repo.put_tree(files), "tree": repo.tree_entries(files, recursive), "truncated": False}
+        )
+
+    @app.post("/repos/{owner}/{repo_name}/git/trees", status_code=201)
+    async def create_tree(body: dict[str, Any] = Body(...)) -> dict[str, str]:
+        files = dict(repo.trees.get(body.get("base_tree") or "", {}))
+        for entry in body["tree"]:
+            if entry.get("content") is not None:
+                files[entry["path"]] = repo.put_blob(entry["content"].encode())
+            elif entry.get("sha") is None:
+                files.pop(entry["path"], None)
+            else:
+                files[entry["path"]] = entry["sha"]
+        return {"sha": repo.put_tree(files)}
+
+    @app.post("/repos/{owner}/{repo_name}/git/commits", status_code=201)
+    async def create_commit(body: dict[str, Any] = Body(...)) -> dict[str, Any]:
+        sha = repo.commit(body["tree"], body["parents"], body["message"])
+        return {"sha": sha, "tree": {"sha": body["tree"]}}
+
+    @app.patch("/repos/{owner}/{repo_name}/git/refs/heads/{branch:path}")
+    async def update_ref(branch: str, body: dict[str, Any] = Body(...)) -> Response:
+        commit = repo.commits.get(body["sha"])
+        if commit is None:
+            return JSONResponse({"message": "Object does not exist"}, status_code=422)
+        if not body.get("force") and repo.head not in commit.parents:
+            return JSONResponse({"message": "Update is not a fast forward"}, status_code=422)
+        repo.head = commit.sha
+        return JSONResponse({"ref": f"refs/heads/{branch}", "object": {"sha": repo.head, "type": "commit"}})
+
+    return app
+
+
+def seed(
+    repo: FakeRepository, projects_path: str, projects: int, page_size: int, asset_size: int, random_seed: int
+) -> None:
+    """
+    Commits `projects` generated games, each with an index.html of about `page_size` bytes that loads a
+    game.js of about `asset_size` bytes, and the context.json of the AI conversation that made it.
+    """
+    rng = random.Random(random_seed)
+    changes: dict[str, bytes | None] = {}
+    for i in range(projects):
+        name = f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{i:04d}"
+        page = game_page(name, script_lines(rng, page_size))
+        context = {
+            "messages": [
+                {"role": "user", "content": f"Make a {name.rsplit('-', 1)[0].replace('-', ' ')} game"},
+                {"role": "assistant", "content": f"Here it is:\n```html\n{page}\n```"},
+            ]
+        }
+        changes[f"{projects_path}/{name}/index.html"] = page.encode()
+        changes[f"{projects_path}/{name}/game.js"] = script_lines(rng, asset_size).encode()
+        changes[f"{projects_path}/{name}/context.json"] = json.dumps(context, indent=2).encode()
+    repo.write(changes, f"Add {projects} games")
+
+
+def game_page(title: str, script: str) -> str:
+    return (
+        f"<!DOCTYPE html>\n<html>\n<head>\n<title>{title}</title>\n</head>\n<body>\n"
+        f'<canvas id="game"></canvas>\n<script>\n{script}</script>\n<script src="game.js"></script>\n</body>\n</html>\n'
+    )
+
+
+def script_lines(rng: random.Random, size: int) -> str:
+    """About `size` bytes of code-like text, compressing about as well as real scripts do."""
+    lines = []
+    length = 0
+    while length < size:
+        line = f"const {rng.choice(WORDS)}{length} = {rng.choice(WORDS)}.update({rng.random():.6f}, {rng.randint(0, 999)});\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines)
+
+
+def main() -> None:
+    parser = argument_parser("Fake GitHub API", latency_ms=50)
+    parser.add_argument("--projects-path", default="games", help="PROJECTS_PATH of the app")
+    parser.add_argument("--projects", type=int, default=200, help="Games to seed the repository with")
+    parser.add_argument("--page-size", type=int, default=8 * 1024, help="Approximate size of index.html")
+    parser.add_argument("--asset-size", type=int, default=64 * 1024, help="Approximate size of game.js")
+    parser.add_argument("--rate-limit", type=int, default=5000, help="Requests allowed per window")
+    parser.add_argument("--rate-limit-window", type=float, default=3600, help="Rate limit window, in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="fake-github-") as directory:
+        repo = FakeRepository(Path(directory))
+        seed(repo, args.projects_path, args.projects, args.page_size, args.asset_size, args.seed)
+        rate_limit = RateLimit(args.rate_limit, args.rate_limit_window)
+        serve(create_app(repo, rate_limit, args.latency_ms, args.jitter_ms), args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import random
+from collections import defaultdict
+from collections.abc import Awaitable
+from collections.abc import Callable
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi import Request
+from fastapi import Response
+
+STATS_PATH = "/_bench/stats"
+
+
+def argument_parser(description: str, latency_ms: float) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--latency-ms", type=float, default=latency_ms, help="Delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra delay, up to this much")
+    return parser
+
+
+def instrument(app: FastAPI, latency_ms: float, jitter_ms: float) -> None:
+    """
+    Delays every response of the fake by the configured latency and counts the requests by route and status.
+    GET /_bench/stats returns the counts, DELETE /_bench/stats resets them between scenarios.
+    """
+    counts: defaultdict[str, defaultdict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    @app.middleware("http")
+    async def delay_and_count(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+        if request.url.path == STATS_PATH:
+            return await call_next(request)
+        await asyncio.sleep((latency_ms + random.uniform(0, jitter_ms)) / 1000)
+        response = await call_next(request)
+        route = request.scope.get("route")
+        counts[f"{request.method} {route.path if route else request.url.path}"][str(response.status_code)] += 1
+        return response
+
+    @app.get(STATS_PATH)
+    async def get_stats() -> dict[str, dict[str, int]]:
+        return {route: dict(statuses) for route, statuses in counts.items()}
+
+    @app.delete(STATS_PATH, status_code=204)
+    async def reset_stats() -> None:
+        counts.clear()
+
+
+def serve(app: FastAPI, port: int) -> None:
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
@@ -0,0 +1,181 @@
+import asyncio
+import math
+import random
+import time
+from collections import Counter
+from collections.abc import Awaitable
+from collections.abc import Callable
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+
+import httpx
+
+from bench.fake_github import WORDS
+
+# Share of the opens that go to one of the HOT_GAMES first games of the catalog.
+HOT_GAMES = 10
+HOT_SHARE = 0.8
+LISTING_PAGES = 3
+# Projects each upload worker writes to in turn, so the burst both creates projects and updates them.
+UPLOAD_PROJECTS = 5
+BROWSER_HEADERS = {"Accept-Encoding": "br, gzip, deflate"}
+# AI edits wait for the whole completion.
+REQUEST_TIMEOUT = httpx.Timeout(300.0, connect=5.0)
+
+
+@dataclass
+class Results:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter[str] = field(default_factory=Counter)
+    errors: int = 0
+    duration: float = 0.0
+
+    def record(self, latency: float, status: str, error: bool) -> None:
+        self.latencies.append(latency)
+        self.statuses[status] += 1
+        self.errors += error
+
+    def summary(self) -> dict[str, Any]:
+        latencies = sorted(latency * 1000 for latency in self.latencies)
+        requests = len(latencies)
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / requests, 4) if requests else 0.0,
+            "throughput_rps": round(requests / self.duration, 2) if self.duration else 0.0,
+            "duration_seconds": round(self.duration, 2),
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "mean": round(sum(latencies) / requests, 2) if requests else 0.0,
+                "max": round(latencies[-1], 2) if requests else 0.0,
+            },
+            "statuses": dict(sorted(self.statuses.items())),
+        }
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not ordered:
+        return 0.0
+    return round(ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)], 2)
+
+
+@dataclass
+class Worker:
+    """One simulated client, running the steps of a scenario one after the other."""
+
+    client: httpx.AsyncClient
+    results: Results
+    index: int
+    rng: random.Random
+    projects: list[str]
+    base_domain: str
+    api_key: str
+    iteration: int = 0
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response | None:
+        """Sends the request and records it, any status of 400 and above or failure to get one is an error."""
+        start = time.perf_counter()
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.results.record(time.perf_counter() - start, type(e).__name__, error=True)
+            return None
+        self.results.record(time.perf_counter() - start, str(resp.status_code), error=resp.status_code >= 400)
+        return resp
+
+    def pick_game(self) -> str:
+        if self.rng.random() < HOT_SHARE:
+            return self.rng.choice(self.projects[:HOT_GAMES])
+        return self.rng.choice(self.projects)
+
+    @property
+    def auth(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+
+async def hot_game_opens(worker: Worker) -> None:
+    """A game page and its script, mostly of the same few games."""
+    project = worker.pick_game()
+    await worker.request("GET", f"/game/{project}/", headers=BROWSER_HEADERS)
+    await worker.request("GET", f"/game/{project}/game.js", headers=BROWSER_HEADERS)
+
+
+async def subdomain_opens(worker: Worker) -> None:
+    """A game page opened at its own subdomain."""
+    host = f"{worker.pick_game()}.{worker.base_domain}"
+    await worker.request("GET", "/", headers={**BROWSER_HEADERS, "Host": host})
+
+
+async def listing(worker: Worker) -> None:
+    """The front page in some order or searching for a word, then the next pages through X-Next-Cursor."""
+    params: dict[str, str] = {"sort_by": worker.rng.choice(["date_added", "date_modified", "hottest"])}
+    if worker.rng.random() < 0.3:
+        params = {"sort_by": "relevance", "search_query": worker.rng.choice(WORDS)}
+    for _ in range(LISTING_PAGES):
+        resp = await worker.request("GET", "/api/games", params=params)
+        if resp is None or "x-next-cursor" not in resp.headers:
+            return
+        params = {**params, "cursor": resp.headers["x-next-cursor"]}
+
+
+async def upload_bursts(worker: Worker) -> None:
+    """A page uploaded to one of the projects of the worker, every worker at once."""
+    project = f"upload-{worker.index}-{worker.iteration % UPLOAD_PROJECTS}"
+    content = f"<!DOCTYPE html>\n<html><body>Upload {worker.iteration} of worker {worker.index}</body></html>\n"
+    await worker.request("PUT", f"/api/project/{project}/index.html", headers=worker.auth, json={"content": content})
+
+
+async def ai_edits(worker: Worker) -> None:
+    """An AI edit of a seeded game, from the prompt to the commit of the new page and conversation."""
+    project = worker.rng.choice(worker.projects)
+    prompt = {"content": "Make the player move faster"}
+    await worker.request("PUT", f"/api/ai/{project}", headers=worker.auth, json=prompt)
+
+
+@dataclass(frozen=True)
+class Scenario:
+    step: Callable[[Worker], Awaitable[None]]
+    # Writes run with --write-concurrency workers instead of --concurrency.
+    writes: bool = False
+
+
+# In the order they run, the writes last as they leave background thumbnail renders behind.
+SCENARIOS = {
+    "hot_game_opens": Scenario(hot_game_opens),
+    "subdomain_opens": Scenario(subdomain_opens),
+    "listing": Scenario(listing),
+    "upload_bursts": Scenario(upload_bursts, writes=True),
+    "ai_edits": Scenario(ai_edits, writes=True),
+}
+
+
+async def run_scenario(
+    scenario: Scenario,
+    app_url: str,
+    concurrency: int,
+    duration: float,
+    projects: list[str],
+    base_domain: str,
+    api_key: str,
+    seed: int,
+) -> Results:
+    """Runs the steps of the scenario on `concurrency` workers until `duration` seconds are over."""
+    results = Results()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=REQUEST_TIMEOUT) as client:
+        deadline = time.perf_counter() + duration
+
+        async def work(index: int) -> None:
+            worker = Worker(client, results, index, random.Random(seed * 1000 + index), projects, base_domain, api_key)
+            while time.perf_counter() < deadline:
+                await scenario.step(worker)
+                worker.iteration += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(work(index) for index in range(concurrency)))
+        results.duration = time.perf_counter() - start
+    return results
@@ -0,0 +1,44 @@
+import os
+import tempfile
+from collections.abc import Iterator
+
+import pytest
+
+# Settings are read when app is first imported: a scratch database and upstreams that are never reached.
+_scratch = tempfile.mkdtemp(prefix="vibegames-tests-")
+os.environ.update(
+    {
+        "GITHUB_API_TOKEN": "test",
+        "GITHUB_REPOSITORY": "https://github.com/test/games",
+        "GITHUB_API_URL": "http://github.invalid",
+        "PROJECTS_PATH": "games",
+        "API_KEYS": "test",
+        "DB_PATH": f"sqlite:///{_scratch}/test.db",
+        "CAPTURE_API_URL": "http://capture.invalid",
+        "CAPTURE_API_KEY": "test",
+        "GPT4F_API_URL": "http://g4f.invalid",
+        "GITHUB_BUDGET_PATH": f"{_scratch}/github-budget.json",
+        "METRICS_MULTIPROC_DIR": f"{_scratch}/metrics",
+    }
+)
+
+from sqlalchemy import delete  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.database import engine  # noqa: E402
+from app.models import Base  # noqa: E402
+from app.models import Game  # noqa: E402
+
+Base.metadata.create_all(engine)
+
+
+@pytest.fixture
+def games() -> Iterator[None]:
+    """An empty games table, emptied again after the test."""
+    with SessionLocal() as db:
+        db.execute(delete(Game))
+        db.commit()
+    yield
+    with SessionLocal() as db:
+        db.execute(delete(Game))
+        db.commit()
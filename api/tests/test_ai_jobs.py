@@ -0,0 +1,67 @@
+import threading
+import time
+from collections.abc import Iterator
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy import select
+
+from app import ai_jobs
+from app.ai_jobs import AIJobQueue
+from app.database import SessionLocal
+from app.models import AIJob
+
+
+@pytest.fixture
+def jobs() -> Iterator[None]:
+    with SessionLocal() as db:
+        db.execute(delete(AIJob))
+        db.commit()
+    yield
+    with SessionLocal() as db:
+        db.execute(delete(AIJob))
+        db.commit()
+
+
+def test_idle_poll_does_not_write(jobs: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    def no_writes() -> None:
+        raise AssertionError("opened a write session")
+
+    monkeypatch.setattr(ai_jobs, "SessionLocal", no_writes)
+
+    assert AIJobQueue(2, 1, {}, 0.05)._claim() is None
+
+
+def test_jobs_run_within_the_limits(jobs: None) -> None:
+    job_queue = AIJobQueue(concurrency=2, per_key_limit=1, key_limits={"busy": 2}, poll_interval=0.05)
+    lock = threading.Lock()
+    running: list[str] = []
+    peak = {"total": 0, "quiet": 0}
+
+    def handler(kind: str, project: str, prompt: str) -> str:
+        with lock:
+            running.append(prompt)
+            peak["total"] = max(peak["total"], len(running))
+            peak["quiet"] = max(peak["quiet"], running.count("quiet"))
+        time.sleep(0.1)
+        with lock:
+            running.remove(prompt)
+        return f"/game/{project}/"
+
+    with SessionLocal() as db:
+        submitted = [job_queue.submit(db, "create", f"game-{i}", "quiet", "quiet").id for i in range(2)]
+        submitted += [job_queue.submit(db, "create", f"game-{i}", "busy", "busy").id for i in range(2, 5)]
+    job_queue.start(handler)
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            with SessionLocal() as db:
+                statuses = db.scalars(select(AIJob.status).where(AIJob.id.in_(submitted))).all()
+            if set(statuses) == {"done"}:
+                break
+            time.sleep(0.05)
+    finally:
+        job_queue.stop()
+
+    assert statuses == ["done"] * 5
+    assert peak == {"total": 2, "quiet": 1}
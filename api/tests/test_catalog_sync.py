@@ -0,0 +1,73 @@
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+import pytest
+from sqlalchemy import select
+
+from app import catalog_sync
+from app.database import SessionLocal
+from app.github import GithubTreeTruncatedError
+from app.models import Game
+from app.storage import CatalogSnapshot
+
+HEAD_DATE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class SnapshotStorage:
+    """The storage calls of sync_catalog, with the branch holding a single project."""
+
+    def catalog_snapshot(self) -> CatalogSnapshot:
+        return CatalogSnapshot("head", HEAD_DATE, {"kept": "tree-kept"})
+
+    def last_modified(self, project: str, commit: str) -> datetime | None:
+        return HEAD_DATE - timedelta(days=1)
+
+
+def test_vanished_games_are_removed_unless_just_created(games: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(catalog_sync, "storage", SnapshotStorage())
+    long_ago = HEAD_DATE - timedelta(days=90)
+    with SessionLocal() as db:
+        db.add_all(
+            [
+                Game(project="kept", sanitized_name="kept", tree_sha="tree-kept", date_added=long_ago),
+                # Played and rendered after its folder was deleted.
+                Game(
+                    project="played",
+                    sanitized_name="played",
+                    tree_sha="tree-played",
+                    date_added=long_ago,
+                    date_modified=HEAD_DATE + timedelta(hours=1),
+                    num_opens=500,
+                    thumbnail_date=HEAD_DATE + timedelta(hours=1),
+                ),
+                Game(project="legacy", sanitized_name="legacy", date_added=long_ago, date_modified=long_ago),
+                # Created through the API after the head commit was read.
+                Game(project="uploaded", sanitized_name="uploaded", date_added=HEAD_DATE + timedelta(seconds=5)),
+            ]
+        )
+        db.commit()
+
+        report = catalog_sync.sync_catalog(db)
+
+        assert report.removed == ["legacy", "played"]
+        assert report.unchanged == 1
+        assert set(db.scalars(select(Game.project))) == {"kept", "uploaded"}
+
+
+class TruncatedStorage(SnapshotStorage):
+    def catalog_snapshot(self) -> CatalogSnapshot:
+        raise GithubTreeTruncatedError("GitHub truncated the tree of games")
+
+
+def test_truncated_listing_keeps_the_catalog(games: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(catalog_sync, "storage", TruncatedStorage())
+    with SessionLocal() as db:
+        db.add(Game(project="listed-later", sanitized_name="listed-later", tree_sha="tree-listed-later"))
+        db.commit()
+
+        report = catalog_sync.sync_catalog(db)
+
+        assert report.error == "GitHub truncated the tree of games"
+        assert (report.commit, report.removed, report.unchanged) == (None, [], 1)
+        assert list(db.scalars(select(Game.project))) == ["listed-later"]
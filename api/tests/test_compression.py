@@ -0,0 +1,45 @@
+import gzip
+import os
+
+import anyio
+
+from app.compression import compressed_variant
+from app.compression import negotiate_encoding
+from app.content_cache import git_blob_sha
+from app.content_cache import variant_cache
+from app.settings import settings
+
+
+def test_negotiate_encoding() -> None:
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    # Equal weights go by our preference, explicit weights by the client's.
+    assert negotiate_encoding("gzip, br") == "br"
+    assert negotiate_encoding("br;q=0.5, gzip") == "gzip"
+    assert negotiate_encoding("br;q=0, gzip;q=0.1") == "gzip"
+    assert negotiate_encoding("gzip;q=nope") is None
+    assert negotiate_encoding("*;q=0.8, br;q=0") in ("zstd", "gzip")
+    assert negotiate_encoding("BR ; Q=1") == "br"
+    assert negotiate_encoding("gzip, br", encodings=["gzip"]) == "gzip"
+
+
+def test_compressed_variant_is_cached_per_version() -> None:
+    body = b"let variant = 1;\n" * 200
+    sha = git_blob_sha(body)
+    misses = variant_cache.stats()["misses"]
+
+    first = anyio.run(compressed_variant, sha, "gzip", body)
+    second = anyio.run(compressed_variant, sha, "gzip", body)
+
+    assert first is not None and gzip.decompress(first) == body
+    assert second == first
+    assert variant_cache.stats()["misses"] == misses + 1
+
+
+def test_small_or_incompressible_bodies_are_not_encoded() -> None:
+    small = b"x" * (settings.COMPRESSION_MIN_SIZE - 1)
+    noise = os.urandom(4096)
+
+    assert anyio.run(compressed_variant, git_blob_sha(small), "gzip", small) is None
+    assert anyio.run(compressed_variant, git_blob_sha(noise), "gzip", noise) is None
@@ -0,0 +1,129 @@
+import io
+from typing import Any
+
+import pytest
+import requests
+from fastapi.testclient import TestClient
+from requests.utils import get_encoding_from_headers
+
+from app import app
+from app import g4f
+from app.metrics import UPSTREAM_CALLS
+
+client = TestClient(app)
+
+
+def streamed_response(content_type: str, body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["content-type"] = content_type
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.raw = io.BytesIO(body)
+    return response
+
+
+@pytest.mark.parametrize(
+    ("content_type", "body"),
+    [
+        ("text/event-stream", 'data: {"content": "Café "}\n\ndata: {"content": "☕"}\n\ndata: [DONE]\n\n'),
+        ("application/x-ndjson", '{"content": "Café "}\n{"content": "☕"}\n'),
+    ],
+)
+def test_stream_completion_decodes_utf8(monkeypatch: pytest.MonkeyPatch, content_type: str, body: str) -> None:
+    def post(*args: Any, **kwargs: Any) -> requests.Response:
+        return streamed_response(content_type, body.encode())
+
+    monkeypatch.setattr(g4f.g4f_client, "post", post)
+    calls = UPSTREAM_CALLS.labels("g4f", "stream_completion", "ok")
+    before = calls._value.get()
+
+    chunks = list(g4f.stream_completion([g4f.Message(role="user", content="coffee")]))
+
+    assert "".join(chunks) == "Café ☕"
+    assert calls._value.get() == before + 1
+
+
+def test_ai_stream_reports_unexpected_failures(monkeypatch: pytest.MonkeyPatch, games: None) -> None:
+    def post(*args: Any, **kwargs: Any) -> requests.Response:
+        # A backend that does not stream and answers without a completion.
+        return streamed_response("application/json", b"{}")
+
+    monkeypatch.setattr(g4f.g4f_client, "post", post)
+
+    resp = client.post("/api/ai/broken/stream", headers={"Authorization": "Bearer test"}, json={"content": "a game"})
+
+    assert resp.status_code == 200
+    assert resp.text.endswith('event: error\ndata: {"detail": "AI generation failed"}\n\n')
+
+
+def code_message(role: g4f.RoleType, version: int) -> g4f.Message:
+    code = "\n".join(f"<p>{version}.{line}</p>" for line in range(40))
+    return g4f.Message(role=role, content=f"Version {version}:\n```html\n{code}\n```\nDone.")
+
+
+def test_compaction_keeps_only_the_latest_code() -> None:
+    messages = [
+        g4f.Message(role="user", content="Make a game"),
+        code_message("assistant", 1),
+        g4f.Message(role="user", content="Make it blue"),
+        code_message("assistant", 2),
+        g4f.Message(role="user", content="Now add sound"),
+    ]
+
+    context, report = g4f.compact_context(g4f.Context(messages=messages), max_tokens=10_000)
+
+    assert [message.content for message in context.messages] == [
+        "Make a game",
+        "Version 1:\n[40 lines of code omitted, superseded by a later version]\nDone.",
+        "Make it blue",
+        messages[3].content,
+        "Now add sound",
+    ]
+    assert report.messages_before == report.messages_after == 5
+    assert report.tokens_after < report.tokens_before
+    # The context passed in is left alone.
+    assert messages[1].content.count("```") == 2
+
+
+def test_compaction_drops_the_oldest_turns_to_fit() -> None:
+    messages = [g4f.Message(role="user", content="Make a game")]
+    for i in range(10):
+        messages += [g4f.Message(role="user", content="x" * 400), g4f.Message(role="assistant", content="y" * 400)]
+    messages += [code_message("assistant", 1), g4f.Message(role="user", content="Faster please")]
+
+    context, report = g4f.compact_context(g4f.Context(messages=messages), max_tokens=500)
+
+    assert context.messages[0].content == "Make a game"
+    assert (
+        context.messages[1].content
+        == f"[{report.messages_before - report.messages_after + 1} earlier messages omitted]"
+    )
+    assert [message.content for message in context.messages[-2:]] == [messages[-2].content, "Faster please"]
+    assert report.tokens_after <= 500
+
+
+def test_compaction_summarizes_dropped_turns(monkeypatch: pytest.MonkeyPatch) -> None:
+    prompts: list[str] = []
+
+    def get_completion(messages: list[g4f.Message]) -> str:
+        prompts.append(messages[0].content)
+        return "The user wants a red snake game."
+
+    monkeypatch.setattr(g4f, "get_completion", get_completion)
+    messages = [
+        g4f.Message(role="user", content="Make a snake game"),
+        g4f.Message(role="user", content="Make it red " * 200),
+        code_message("assistant", 1),
+    ]
+
+    context, _ = g4f.compact_context(g4f.Context(messages=messages), max_tokens=100, summarize=True)
+
+    assert context.messages[1].content == "Summary of the earlier conversation: The user wants a red snake game."
+    assert "Make it red" in prompts[0]
+
+    def failing_completion(messages: list[g4f.Message]) -> str:
+        raise requests.ConnectionError("g4f is down")
+
+    monkeypatch.setattr(g4f, "get_completion", failing_completion)
+    context, _ = g4f.compact_context(g4f.Context(messages=messages), max_tokens=100, summarize=True)
+    assert context.messages[1].content == "[1 earlier messages omitted]"
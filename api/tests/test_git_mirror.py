@@ -0,0 +1,70 @@
+import subprocess
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import anyio
+import pytest
+
+from app import github
+from app.content_cache import git_blob_sha
+from app.settings import settings
+from app.storage import GitMirrorStorage
+
+TOKEN = "ghp_mirrortesttoken"
+
+
+def git(cwd: Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+
+@pytest.fixture
+def mirror(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[GitMirrorStorage]:
+    remote = tmp_path / "remote.git"
+    seed = tmp_path / "seed"
+    git(tmp_path, "init", "-q", "--bare", "-b", "main", str(remote))
+    git(tmp_path, "clone", "-q", str(remote), str(seed))
+    (seed / settings.PROJECTS_PATH / "pong").mkdir(parents=True)
+    (seed / settings.PROJECTS_PATH / "pong" / "index.html").write_text("<p>pong</p>")
+    git(seed, "add", "-A")
+    git(seed, "commit", "-q", "-m", "Add pong")
+    git(seed, "push", "-q", "origin", "HEAD:main")
+
+    monkeypatch.setattr(settings, "GITHUB_API_TOKEN", TOKEN)
+    monkeypatch.setattr(settings, "GITHUB_REPOSITORY", str(remote))
+    monkeypatch.setattr(github, "get_token_user", lambda: "bot")
+    mirror = GitMirrorStorage(tmp_path / "mirror", "main")
+    mirror.start()
+    yield mirror
+    mirror.stop()
+
+
+def test_token_stays_out_of_the_clone(mirror: GitMirrorStorage) -> None:
+    assert TOKEN not in (mirror.root / ".git" / "config").read_text()
+    assert mirror._git("remote", "get-url", "origin").strip() == settings.GITHUB_REPOSITORY
+
+
+def test_file_etag_follows_writes(mirror: GitMirrorStorage) -> None:
+    assert anyio.run(mirror.file_etag, "pong") == git_blob_sha(b"<p>pong</p>")
+
+    mirror.write_files("pong", {"index.html": "<p>pong 2</p>"}, "Update pong")
+
+    assert anyio.run(mirror.file_etag, "pong") == git_blob_sha(b"<p>pong 2</p>")
+    assert git(mirror.root, "log", "-1", "--format=%s", "origin/main").strip() == "Update pong"
+
+
+def test_reads_wait_for_the_working_tree(mirror: GitMirrorStorage) -> None:
+    read: list[bytes] = []
+    reader = threading.Thread(target=lambda: read.append(mirror.read_file("pong")))
+    with mirror._locked("tree.lock"):
+        reader.start()
+        reader.join(0.2)
+        assert reader.is_alive()
+    reader.join(5)
+    assert read == [b"<p>pong</p>"]
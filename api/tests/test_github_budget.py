@@ -0,0 +1,55 @@
+import time
+from contextvars import copy_context
+from pathlib import Path
+
+import pytest
+
+from app.github_budget import GithubBudget
+from app.github_budget import GithubBudgetExhaustedError
+from app.github_budget import Priority
+from app.github_budget import current_priority
+
+RESERVES = {"user_write": 0, "ai_edit": 10, "game_read": 50, "admin": 100}
+
+
+def rate_limit_headers(remaining: int, used: int) -> dict[str, str]:
+    return {
+        "X-RateLimit-Limit": "5000",
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Used": str(used),
+        "X-RateLimit-Reset": str(int(time.time()) + 3600),
+    }
+
+
+def test_calls_do_not_touch_the_shared_file(tmp_path: Path) -> None:
+    budget = GithubBudget(str(tmp_path / "budget.json"), RESERVES, sync_interval=60)
+
+    with budget.spend():
+        pass
+    budget.update(rate_limit_headers(remaining=4000, used=1000))
+
+    assert not (tmp_path / "budget.json").exists()
+    assert budget.stats()["remaining"] == 4000
+
+
+def test_workers_share_the_budget_through_the_file(tmp_path: Path) -> None:
+    path = str(tmp_path / "budget.json")
+    reader = GithubBudget(path, RESERVES, sync_interval=60)
+    writer = GithubBudget(path, RESERVES, sync_interval=60)
+    writer.update(rate_limit_headers(remaining=40, used=4960))
+    # A response of an older call arriving late does not bring the budget back.
+    reader.update(rate_limit_headers(remaining=900, used=4100))
+
+    writer.sync()
+    reader.sync()
+
+    assert reader.stats()["remaining"] == 40
+
+    def spend_as(priority: Priority) -> None:
+        current_priority.set(priority)
+        with reader.spend():
+            pass
+
+    with pytest.raises(GithubBudgetExhaustedError):
+        copy_context().run(spend_as, "game_read")
+    copy_context().run(spend_as, "user_write")
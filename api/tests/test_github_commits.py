@@ -0,0 +1,106 @@
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import pytest
+import requests
+
+from app import github
+from app.http_client import github_client
+
+
+def response(status_code: int, body: Any = None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp._content = json.dumps(body).encode()
+    return resp
+
+
+class FakeBranch:
+    """
+    The Git Data API calls of github._commit_project_tree against one branch. Every call takes a little while,
+    so concurrent commits interleave, and `outside_commits` commits of another process land right before as many
+    ref updates, which are then rejected like GitHub does.
+    """
+
+    def __init__(self, outside_commits: int = 0) -> None:
+        self.trees: dict[str, dict[str, str]] = {"tree-0": {}}
+        self.commits: dict[str, tuple[str, str | None]] = {"commit-0": ("tree-0", None)}
+        self.head = "commit-0"
+        self.outside_commits = outside_commits
+        self.rejected = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, url: str, **_: Any) -> requests.Response:
+        time.sleep(0.005)
+        with self._lock:
+            if "/git/ref/heads/" in url:
+                return response(200, {"object": {"sha": self.head}})
+            if "/git/commits/" in url:
+                return response(200, {"tree": {"sha": self.commits[url.rsplit("/", 1)[1]][0]}})
+            # A new project has no tree yet.
+            return response(404, {})
+
+    def post(self, url: str, json: dict[str, Any], **_: Any) -> requests.Response:
+        time.sleep(0.005)
+        with self._lock:
+            sha = f"object-{next(self._ids)}"
+            if url.endswith("/git/trees"):
+                files = dict(self.trees[json["base_tree"]])
+                files.update({entry["path"]: entry["content"] for entry in json["tree"]})
+                self.trees[sha] = files
+            else:
+                self.commits[sha] = (json["tree"], json["parents"][0])
+            return response(201, {"sha": sha})
+
+    def patch(self, url: str, json: dict[str, Any], **_: Any) -> requests.Response:
+        time.sleep(0.005)
+        with self._lock:
+            if self.outside_commits:
+                self.outside_commits -= 1
+                outside = f"object-{next(self._ids)}"
+                self.commits[outside] = (self.commits[self.head][0], self.head)
+                self.head = outside
+            if self.commits[json["sha"]][1] != self.head:
+                self.rejected += 1
+                return response(422, {"message": "Update is not a fast forward"})
+            self.head = json["sha"]
+            return response(200, {"object": {"sha": self.head}})
+
+    def files(self) -> dict[str, str]:
+        return self.trees[self.commits[self.head][0]]
+
+
+@pytest.fixture
+def branch(monkeypatch: pytest.MonkeyPatch) -> FakeBranch:
+    fake = FakeBranch()
+    for method in ("get", "post", "patch"):
+        monkeypatch.setattr(github_client, method, getattr(fake, method))
+    monkeypatch.setattr(github, "COMMIT_BACKOFF_SECONDS", 0.01)
+    return fake
+
+
+def test_concurrent_commits_to_different_projects_all_land(branch: FakeBranch) -> None:
+    projects = [f"project-{index}" for index in range(8)]
+    with ThreadPoolExecutor(max_workers=len(projects)) as executor:
+        for future in [
+            executor.submit(github.commit_files, project, {"index.html": project}, f"Update {project}")
+            for project in projects
+        ]:
+            future.result()
+
+    assert branch.files() == {f"games/{project}/index.html": project for project in projects}
+    assert branch.rejected == 0
+
+
+def test_commit_retries_while_another_process_moves_the_branch(branch: FakeBranch) -> None:
+    branch.outside_commits = github.COMMIT_ATTEMPTS - 1
+
+    github.commit_files("project", {"index.html": "page"}, "Update project")
+
+    assert branch.files() == {"games/project/index.html": "page"}
+    assert branch.rejected == github.COMMIT_ATTEMPTS - 1
@@ -0,0 +1,199 @@
+from collections.abc import Iterator
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from app.content_cache import content_cache
+from app.content_cache import git_blob_sha
+from app.database import SessionLocal
+from app.http_cache import RangeNotSatisfiableError
+from app.http_cache import byte_range
+from app.http_cache import http_date
+from app.http_client import async_github_client
+from app.models import Game
+from app.open_counter import opens_counter
+from app.settings import settings
+
+client = TestClient(app)
+
+
+class FakeContents:
+    """Raw files of the contents API, answering If-None-Match and single Range requests, counting the bodies it sends."""
+
+    def __init__(self, files: dict[str, bytes]) -> None:
+        self.files = files
+        self.downloads = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = self.files.get(request.url.path.rsplit("/", 1)[-1])
+        if body is None:
+            return httpx.Response(404)
+        etag = f'"{git_blob_sha(body)}"'
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        self.downloads += 1
+        if "range" in request.headers:
+            first, last = (int(end) for end in request.headers["range"].removeprefix("bytes=").split("-"))
+            part = body[first : last + 1]
+            headers = {
+                "ETag": etag,
+                "Content-Length": str(len(part)),
+                "Content-Range": f"bytes {first}-{last}/{len(body)}",
+            }
+            return httpx.Response(206, stream=httpx.ByteStream(part), headers=headers)
+        headers = {"ETag": etag, "Content-Length": str(len(body))}
+        return httpx.Response(200, stream=httpx.ByteStream(body), headers=headers)
+
+
+@pytest.fixture
+def github() -> Iterator[FakeContents]:
+    fake = FakeContents({})
+    async_github_client._client = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+    yield fake
+    async_github_client._client = None
+    content_cache.invalidate("assets")
+
+
+def test_if_modified_since_survives_opens_and_locks(games: None) -> None:
+    modified = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=30)
+    with SessionLocal() as db:
+        db.add(Game(project="played", sanitized_name="played", date_modified=modified))
+        db.commit()
+    conditional = {"If-Modified-Since": http_date(modified)}
+
+    resp = client.get("/game/played/", headers=conditional)
+    assert resp.status_code == 304
+    assert resp.headers["Last-Modified"] == http_date(modified)
+
+    opens_counter.flush()
+    resp = client.put("/admin/lock/played", headers={"Authorization": "Bearer test"}, json={"locked": True})
+    assert resp.status_code == 200
+
+    resp = client.get("/game/played/", headers=conditional)
+    assert resp.status_code == 304
+    assert resp.headers["Last-Modified"] == http_date(modified)
+
+
+def test_large_compressible_file_is_streamed_once_and_revalidated_upstream(games: None, github: FakeContents) -> None:
+    body = b"x" * (settings.STREAM_THRESHOLD_BYTES + 1)
+    github.files["big.js"] = body
+    with SessionLocal() as db:
+        db.add(Game(project="assets", sanitized_name="assets"))
+        db.commit()
+
+    resp = client.get("/game/assets/big.js", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert "Content-Encoding" not in resp.headers
+    assert resp.content == body
+    assert github.downloads == 1
+
+    resp = client.get("/game/assets/big.js", headers={"Accept-Encoding": "gzip", "If-None-Match": resp.headers["ETag"]})
+    assert resp.status_code == 304
+    assert github.downloads == 1
+
+
+def test_small_compressible_file_is_encoded_from_the_cache(games: None, github: FakeContents) -> None:
+    github.files["small.js"] = b"let x = 1;\n" * 200
+    with SessionLocal() as db:
+        db.add(Game(project="assets", sanitized_name="assets"))
+        db.commit()
+
+    for _ in range(2):
+        resp = client.get("/game/assets/small.js", headers={"Accept-Encoding": "gzip"})
+        assert resp.status_code == 200
+        assert resp.headers["Content-Encoding"] == "gzip"
+        assert resp.content == github.files["small.js"]
+    assert github.downloads == 1
+
+
+def test_each_encoding_has_its_own_etag(games: None, github: FakeContents) -> None:
+    body = b"body { color: red; }\n" * 100
+    github.files["style.css"] = body
+    github.files["tiny.css"] = b"p {}"
+    with SessionLocal() as db:
+        db.add(Game(project="assets", sanitized_name="assets"))
+        db.commit()
+    sha = git_blob_sha(body)
+
+    gzipped = client.get("/game/assets/style.css", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["ETag"] == f'"{sha}-gzip"'
+    assert gzipped.headers["Vary"] == "Accept-Encoding"
+    brotli = client.get("/game/assets/style.css", headers={"Accept-Encoding": "gzip;q=0.5, br"})
+    assert brotli.headers["Content-Encoding"] == "br"
+    assert brotli.headers["ETag"] == f'"{sha}-br"'
+    assert brotli.content == body
+    identity = client.get("/game/assets/style.css", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in identity.headers
+    assert identity.headers["ETag"] == f'"{sha}"'
+
+    resp = client.get("/game/assets/style.css", headers={"Accept-Encoding": "gzip", "If-None-Match": f'"{sha}-gzip"'})
+    assert resp.status_code == 304
+    resp = client.get("/game/assets/style.css", headers={"Accept-Encoding": "br", "If-None-Match": f'"{sha}-gzip"'})
+    assert resp.status_code == 200
+
+    tiny = client.get("/game/assets/tiny.css", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in tiny.headers
+    assert tiny.headers["ETag"] == f'"{git_blob_sha(b"p {}")}"'
+
+
+def test_byte_range() -> None:
+    assert byte_range(None, 100) is None
+    assert byte_range("bytes=0-9", 100) == (0, 9)
+    assert byte_range("bytes=90-", 100) == (90, 99)
+    assert byte_range("bytes=-10", 100) == (90, 99)
+    assert byte_range("bytes=-500", 100) == (0, 99)
+    assert byte_range("bytes=50-500", 100) == (50, 99)
+    # Malformed, reversed and multiple ranges get the whole file.
+    assert byte_range("bytes=9-0", 100) is None
+    assert byte_range("bytes=0-1,5-6", 100) is None
+    assert byte_range("items=0-1", 100) is None
+    for unsatisfiable in ["bytes=100-", "bytes=-0"]:
+        with pytest.raises(RangeNotSatisfiableError):
+            byte_range(unsatisfiable, 100)
+
+
+def test_range_requests(games: None, github: FakeContents) -> None:
+    image = bytes(range(256)) * 8
+    github.files["sprite.png"] = image
+    with SessionLocal() as db:
+        db.add(Game(project="assets", sanitized_name="assets"))
+        db.commit()
+    etag = f'"{git_blob_sha(image)}"'
+    # Cached by a first request, the ranges are cut from memory.
+    assert client.get("/game/assets/sprite.png").headers["Accept-Ranges"] == "bytes"
+
+    resp = client.get("/game/assets/sprite.png", headers={"Range": "bytes=10-19"})
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == f"bytes 10-19/{len(image)}"
+    assert resp.content == image[10:20]
+
+    resp = client.get("/game/assets/sprite.png", headers={"Range": f"bytes={len(image)}-"})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == f"bytes */{len(image)}"
+
+    resp = client.get("/game/assets/sprite.png", headers={"Range": "bytes=10-19", "If-Range": etag})
+    assert resp.status_code == 206
+    resp = client.get("/game/assets/sprite.png", headers={"Range": "bytes=10-19", "If-Range": '"older"'})
+    assert resp.status_code == 200
+    assert resp.content == image
+    assert github.downloads == 1
+
+
+def test_range_of_a_large_file_is_asked_from_github(games: None, github: FakeContents) -> None:
+    body = b"x" * (settings.STREAM_THRESHOLD_BYTES + 1)
+    github.files["big.wasm"] = body
+    with SessionLocal() as db:
+        db.add(Game(project="assets", sanitized_name="assets"))
+        db.commit()
+
+    resp = client.get("/game/assets/big.wasm", headers={"Range": "bytes=0-99"})
+
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == f"bytes 0-99/{len(body)}"
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert resp.content == body[:100]
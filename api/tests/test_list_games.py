@@ -0,0 +1,88 @@
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from fastapi.testclient import TestClient
+
+from app import app
+from app import pagination
+from app.database import SessionLocal
+from app.listing_cache import bump_catalog_version
+from app.models import Game
+
+client = TestClient(app)
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def add_games(games: list[Game]) -> None:
+    with SessionLocal() as db:
+        db.add_all(games)
+        bump_catalog_version(db)
+        db.commit()
+
+
+def list_projects(**params: str | int) -> tuple[list[str], str | None]:
+    resp = client.get("/api/games", params=params)
+    assert resp.status_code == 200
+    return [game["project"] for game in resp.json()], resp.headers.get("X-Next-Cursor")
+
+
+def test_cursor_pages_cover_every_game_once(games: None) -> None:
+    add_games(
+        [
+            Game(project=f"game-{i:02}", sanitized_name=f"game-{i:02}", date_added=START + timedelta(hours=i))
+            for i in range(45)
+        ]
+    )
+
+    pages = []
+    projects, cursor = list_projects()
+    pages.append(projects)
+    while cursor is not None:
+        projects, cursor = list_projects(cursor=cursor)
+        pages.append(projects)
+
+    assert [len(page) for page in pages] == [20, 20, 5]
+    assert [project for page in pages for project in page] == [f"game-{i:02}" for i in reversed(range(45))]
+    # Page numbers still work, and agree with the cursors.
+    assert list_projects(page=2)[0] == pages[1]
+
+
+def test_hottest_breaks_ties_by_date_added(games: None) -> None:
+    add_games(
+        [
+            Game(project="old-hit", sanitized_name="old-hit", num_opens=10, date_added=START),
+            Game(project="new-hit", sanitized_name="new-hit", num_opens=10, date_added=START + timedelta(days=1)),
+            Game(project="quiet", sanitized_name="quiet", num_opens=1, date_added=START + timedelta(days=2)),
+        ]
+    )
+
+    projects, cursor = list_projects(sort_by="hottest")
+
+    assert projects == ["new-hit", "old-hit", "quiet"]
+    assert cursor is None
+
+
+def test_cursors_follow_the_stored_date_text(games: None) -> None:
+    # Dates written by func.now() and by Python are stored as differently formatted text.
+    add_games([Game(project=f"game-{i:02}", sanitized_name=f"game-{i:02}") for i in range(21)])
+    with SessionLocal() as db:
+        db.add(Game(project="dated", sanitized_name="dated", date_added=START))
+        bump_catalog_version(db)
+        db.commit()
+
+    first, cursor = list_projects()
+    assert cursor is not None
+    rest, cursor = list_projects(cursor=cursor)
+
+    assert sorted(first + rest) == sorted([f"game-{i:02}" for i in range(21)] + ["dated"])
+    assert rest[-1] == "dated"
+    assert cursor is None
+
+
+def test_invalid_cursors_are_refused(games: None) -> None:
+    cursor = pagination.encode_cursor("hottest", [1, "2025-01-01 00:00:00", "2025-01-01 00:00:00", 1])
+
+    assert client.get("/api/games", params={"cursor": cursor}).status_code == 400
+    assert client.get("/api/games", params={"cursor": "not a cursor"}).status_code == 400
+    assert client.get("/api/games", params={"cursor": pagination.encode_cursor("date_added", [1])}).status_code == 400
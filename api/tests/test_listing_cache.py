@@ -0,0 +1,56 @@
+from fastapi.testclient import TestClient
+
+from app import app
+from app.database import SessionLocal
+from app.listing_cache import CachedListing
+from app.listing_cache import ListingCache
+from app.listing_cache import bump_catalog_version
+from app.listing_cache import listing_cache
+from app.models import Game
+
+client = TestClient(app)
+ADMIN = {"Authorization": "Bearer test"}
+
+
+def add_game(project: str) -> None:
+    with SessionLocal() as db:
+        db.add(Game(project=project, sanitized_name=project))
+        bump_catalog_version(db)
+        db.commit()
+
+
+def test_listing_revalidates_until_the_catalog_changes(games: None) -> None:
+    add_game("pong")
+
+    first = client.get("/api/games")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    cached = client.get("/api/games", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+
+    # The listing is rebuilt after a lock, but its body and so its ETag are the same.
+    misses = listing_cache.stats()["misses"]
+    assert client.put("/admin/lock/pong", json={"locked": True}, headers=ADMIN).status_code == 200
+    assert client.get("/api/games", headers={"If-None-Match": etag}).status_code == 304
+    assert listing_cache.stats()["misses"] == misses + 1
+
+    add_game("tetris")
+    changed = client.get("/api/games", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert sorted(game["project"] for game in changed.json()) == ["pong", "tetris"]
+
+
+def test_cache_drops_stale_versions_and_old_entries() -> None:
+    cache = ListingCache(max_entries=2)
+    for page in (1, 2, 3):
+        cache.put(("date_added", None, page, None), CachedListing(b"[]", None, version=1))
+
+    assert cache.get(("date_added", None, 1, None), 1, 60) is None
+    assert cache.get(("date_added", None, 3, None), 1, 60) is not None
+    assert cache.get(("date_added", None, 3, None), 2, 60) is None
+    assert cache.get(("date_added", None, 3, None), 1, 0) is None
+    assert cache.stats() == {"entries": 2, "max_entries": 2, "hits": 1, "misses": 3}
@@ -0,0 +1,27 @@
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from app.database import SessionLocal
+from app.models import Game
+from app.open_counter import OpensCounter
+
+
+def test_flush_adds_opens_and_leaves_date_modified(games: None) -> None:
+    modified = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=30)
+    with SessionLocal() as db:
+        game = Game(project="played", sanitized_name="played", date_modified=modified, num_opens=1)
+        db.add(game)
+        db.commit()
+        game_id = game.id
+
+    counter = OpensCounter(flush_interval=60, flush_threshold=100)
+    counter.increment(game_id)
+    counter.increment(game_id)
+    counter.flush()
+
+    with SessionLocal() as db:
+        flushed = db.get(Game, game_id)
+        assert flushed is not None
+        assert flushed.num_opens == 3
+        assert flushed.date_modified.replace(tzinfo=timezone.utc) == modified
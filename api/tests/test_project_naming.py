@@ -0,0 +1,72 @@
+import importlib.util
+from pathlib import Path
+
+import anyio
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine
+from sqlalchemy import text
+
+from app.database import AsyncReadSessionLocal
+from app.database import SessionLocal
+from app.database import async_read_engine
+from app.models import Game
+from app.project_naming import find_project_by_name_case_insensitive
+from app.project_naming import find_project_by_name_case_insensitive_async
+from app.project_naming import sanitize_project_name
+
+MIGRATION = Path(__file__).resolve().parent.parent / "alembic/versions/1222e9ba6c9e_add_sanitized_name_column.py"
+
+
+def test_sanitize_project_name() -> None:
+    assert sanitize_project_name("  My Cool Game! ") == "my-cool-game"
+    assert sanitize_project_name("Snake_2.0") == "snake_2_0"
+    assert sanitize_project_name("") == ""
+
+
+def test_lookup_goes_through_sanitized_name(games: None) -> None:
+    with SessionLocal() as db:
+        # A legacy project whose stored name was never sanitized.
+        db.add(Game(project="Space Invaders", sanitized_name="space-invaders"))
+        db.commit()
+
+        for name in ["space-invaders", "Space Invaders", "SPACE   INVADERS"]:
+            game = find_project_by_name_case_insensitive(db, name)
+            assert game is not None and game.project == "Space Invaders"
+        assert find_project_by_name_case_insensitive(db, "space") is None
+
+    async def find_async(*names: str) -> list[str | None]:
+        async with AsyncReadSessionLocal() as db:
+            found = [await find_project_by_name_case_insensitive_async(db, name) for name in names]
+        # Pooled aiosqlite connections keep a thread bound to this event loop.
+        await async_read_engine.dispose()
+        return [None if game is None else game.project for game in found]
+
+    assert anyio.run(find_async, "Space Invaders", "space") == ["Space Invaders", None]
+
+
+def test_migration_backfills_and_resolves_collisions() -> None:
+    spec = importlib.util.spec_from_file_location("add_sanitized_name_column", MIGRATION)
+    assert spec is not None and spec.loader is not None
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE games (id INTEGER PRIMARY KEY, project VARCHAR NOT NULL)"))
+        connection.execute(
+            text(
+                "INSERT INTO games (id, project) VALUES (1, 'Pong'), (2, 'pong'), (3, 'Tetris Game'), (4, 'TETRIS game')"
+            )
+        )
+        with Operations.context(MigrationContext.configure(connection)):
+            migration.upgrade()
+        rows = connection.execute(text("SELECT project, sanitized_name FROM games ORDER BY id")).all()
+
+    # An already sanitized name wins the collision, otherwise the oldest row does.
+    assert [tuple(row) for row in rows] == [
+        ("Pong", None),
+        ("pong", "pong"),
+        ("Tetris Game", "tetris-game"),
+        ("TETRIS game", None),
+    ]
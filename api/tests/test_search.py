@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app import app
+from app.database import SessionLocal
+from app.listing_cache import bump_catalog_version
+from app.models import Game
+
+client = TestClient(app)
+
+
+def add_games(*projects: str) -> None:
+    with SessionLocal() as db:
+        db.add_all(Game(project=project, sanitized_name=project.lower()) for project in projects)
+        bump_catalog_version(db)
+        db.commit()
+
+
+def search(search_query: str, sort_by: str = "date_added") -> list[str]:
+    resp = client.get("/api/games", params={"search_query": search_query, "sort_by": sort_by})
+    assert resp.status_code == 200
+    return sorted(game["project"] for game in resp.json())
+
+
+def test_full_text_search_matches_substrings_case_insensitively(games: None) -> None:
+    add_games("Snake", "snake-deluxe", "Tetris", "rattlesnakes")
+
+    assert search("nake") == ["Snake", "rattlesnakes", "snake-deluxe"]
+    assert search("SNAKE-D") == ["snake-deluxe"]
+    assert search("pong") == []
+    # Quotes and FTS operators are matched as text.
+    assert search('"a" OR b*') == []
+
+
+def test_short_queries_are_scanned(games: None) -> None:
+    add_games("Snake", "Tetris", "2048")
+
+    assert search("et") == ["Tetris"]
+    assert search("20") == ["2048"]
+
+
+def test_relevance_puts_the_best_match_first(games: None) -> None:
+    add_games("space-invaders-space", "space", "spacecraft")
+
+    resp = client.get("/api/games", params={"search_query": "space", "sort_by": "relevance"})
+
+    projects = [game["project"] for game in resp.json()]
+    assert projects[0] == "space"
+    assert sorted(projects) == ["space", "space-invaders-space", "spacecraft"]
+
+
+def test_index_follows_renames_and_deletes(games: None) -> None:
+    add_games("Breakout", "Asteroids")
+    with SessionLocal() as db:
+        db.execute(update(Game).where(Game.project == "Breakout").values(project="Arkanoid"))
+        db.query(Game).filter(Game.project == "Asteroids").delete()
+        bump_catalog_version(db)
+        db.commit()
+
+    assert search("reak") == []
+    assert search("kano") == ["Arkanoid"]
+    assert search("oids") == []
@@ -0,0 +1,69 @@
+import gzip
+import os
+from pathlib import Path
+
+import brotli
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.settings import settings
+from app.static_assets import load_static_assets
+from app.subdomain_handler import SubdomainStaticFiles
+
+INDEX = b"<!doctype html><div id='root'></div>\n" * 100
+SCRIPT = b"console.log('main');\n" * 100
+
+
+def build(directory: Path) -> None:
+    (directory / "static/js").mkdir(parents=True)
+    (directory / "index.html").write_bytes(INDEX)
+    (directory / "static/js/main.3b1c2a4f.js").write_bytes(SCRIPT)
+    (directory / "favicon.ico").write_bytes(os.urandom(2048))
+    # A sibling left over from an older build.
+    stale = directory / "index.html.gz"
+    stale.write_bytes(gzip.compress(b"old"))
+    os.utime(stale, (0, 0))
+
+
+def test_build_is_compressed_once_on_load(tmp_path: Path) -> None:
+    build(tmp_path)
+
+    assets = load_static_assets(tmp_path)
+
+    assert sorted(assets) == ["favicon.ico", "index.html", "static/js/main.3b1c2a4f.js"]
+    assert gzip.decompress((tmp_path / "index.html.gz").read_bytes()) == INDEX
+    assert brotli.decompress((tmp_path / "static/js/main.3b1c2a4f.js.br").read_bytes()) == SCRIPT
+    assert assets["favicon.ico"].variants == {}
+    assert assets["index.html"].cache_control == settings.STATIC_CACHE_CONTROL
+    assert assets["static/js/main.3b1c2a4f.js"].cache_control == settings.STATIC_IMMUTABLE_CACHE_CONTROL
+
+    mtimes = {path: path.stat().st_mtime_ns for path in tmp_path.rglob("*.br")}
+    load_static_assets(tmp_path)
+    assert {path: path.stat().st_mtime_ns for path in tmp_path.rglob("*.br")} == mtimes
+
+
+def test_build_is_served_from_its_siblings(tmp_path: Path) -> None:
+    build(tmp_path)
+    static_files = SubdomainStaticFiles(directory=tmp_path, html=True)
+    static_files.load_assets()
+    frontend = FastAPI()
+    frontend.mount("/", static_files)
+    client = TestClient(frontend)
+
+    resp = client.get("/static/js/main.3b1c2a4f.js", headers={"Accept-Encoding": "br"})
+    assert resp.headers["Content-Encoding"] == "br"
+    assert resp.headers["Cache-Control"] == settings.STATIC_IMMUTABLE_CACHE_CONTROL
+    assert resp.content == SCRIPT
+    etag = resp.headers["ETag"]
+    assert etag.endswith('-br"')
+
+    resp = client.get("/static/js/main.3b1c2a4f.js", headers={"Accept-Encoding": "br", "If-None-Match": etag})
+    assert resp.status_code == 304
+    resp = client.get("/static/js/main.3b1c2a4f.js", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+
+    resp = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in resp.headers
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert resp.content == INDEX
@@ -0,0 +1,138 @@
+import time
+from collections.abc import Iterator
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy import select
+
+from app import thumb_queue
+from app import thumbs
+from app.database import SessionLocal
+from app.models import Game
+from app.models import ThumbnailJob
+from app.thumb_queue import ThumbnailQueue
+from app.thumb_queue import record_thumbnail
+
+
+@pytest.fixture
+def thumbnail_jobs() -> Iterator[None]:
+    with SessionLocal() as db:
+        db.execute(delete(ThumbnailJob))
+        db.commit()
+    yield
+    with SessionLocal() as db:
+        db.execute(delete(ThumbnailJob))
+        db.commit()
+
+
+def test_record_thumbnail_leaves_date_modified(games: None) -> None:
+    modified = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=30)
+    with SessionLocal() as db:
+        game = Game(project="rendered", sanitized_name="rendered", date_modified=modified)
+        db.add(game)
+        db.commit()
+        game_id = game.id
+
+    record_thumbnail("rendered")
+
+    with SessionLocal() as db:
+        rendered = db.get(Game, game_id)
+        assert rendered is not None
+        assert rendered.thumbnail_date is not None
+        assert rendered.date_modified.replace(tzinfo=timezone.utc) == modified
+
+
+def test_idle_poll_does_not_write(thumbnail_jobs: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    def no_writes() -> None:
+        raise AssertionError("opened a write session")
+
+    queue = ThumbnailQueue(quiet_period=3600, concurrency=2, poll_interval=0.05, max_attempts=3)
+    with SessionLocal() as db:
+        # Not due before its quiet period is over.
+        queue.enqueue(db, "later", "http://games.test/game/later/")
+        db.commit()
+    monkeypatch.setattr(thumb_queue, "SessionLocal", no_writes)
+
+    assert queue._claim() is None
+
+
+def test_due_jobs_are_rendered_and_dropped(games: None, thumbnail_jobs: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    rendered: list[str] = []
+    monkeypatch.setattr(thumbs, "refresh_thumb", rendered.append)
+    with SessionLocal() as db:
+        db.add(Game(project="fresh", sanitized_name="fresh"))
+        db.commit()
+    queue = ThumbnailQueue(quiet_period=0, concurrency=2, poll_interval=0.05, max_attempts=3)
+    with SessionLocal() as db:
+        queue.enqueue(db, "fresh", "http://games.test/game/fresh/")
+        db.commit()
+
+    queue.start()
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            with SessionLocal() as db:
+                if db.get(ThumbnailJob, "fresh") is None:
+                    break
+            time.sleep(0.05)
+    finally:
+        queue.stop()
+
+    assert rendered == ["http://games.test/game/fresh/"]
+    with SessionLocal() as db:
+        game = db.scalar(select(Game).where(Game.project == "fresh"))
+        assert game is not None and game.thumbnail_date is not None
+
+
+def test_jobs_coalesce_and_back_off(thumbnail_jobs: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    def fail(game_url: str) -> None:
+        raise RuntimeError("capture failed")
+
+    def make_due() -> None:
+        with SessionLocal() as db:
+            job = db.get(ThumbnailJob, "busy")
+            assert job is not None
+            job.due_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+            db.commit()
+
+    queue = ThumbnailQueue(quiet_period=60, concurrency=2, poll_interval=0.05, max_attempts=2)
+    for version in (1, 2):
+        with SessionLocal() as db:
+            queue.enqueue(db, "busy", f"http://games.test/game/busy/?v={version}")
+            db.commit()
+    with SessionLocal() as db:
+        assert db.scalars(select(ThumbnailJob.game_url)).all() == ["http://games.test/game/busy/?v=2"]
+
+    # Enqueued again while rendering, the job stays pending.
+    make_due()
+    job = queue._claim()
+    assert job is not None and queue._claim() is None
+    with SessionLocal() as db:
+        queue.enqueue(db, "busy", "http://games.test/game/busy/?v=3")
+        db.commit()
+    monkeypatch.setattr(thumbs, "refresh_thumb", lambda game_url: None)
+    queue._render(*job)
+    with SessionLocal() as db:
+        pending = db.get(ThumbnailJob, "busy")
+        assert pending is not None and pending.claimed_until is None
+
+    monkeypatch.setattr(thumbs, "refresh_thumb", fail)
+    make_due()
+    job = queue._claim()
+    assert job is not None
+    queue._render(*job)
+    with SessionLocal() as db:
+        retried = db.get(ThumbnailJob, "busy")
+        assert retried is not None and retried.attempts == 1
+        backoff = retried.due_at.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)
+        assert timedelta(seconds=100) < backoff <= timedelta(seconds=120)
+
+    make_due()
+    job = queue._claim()
+    assert job is not None
+    queue._render(*job)
+    with SessionLocal() as db:
+        assert db.get(ThumbnailJob, "busy") is None
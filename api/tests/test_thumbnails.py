@@ -0,0 +1,67 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from app import routes
+from app import thumbs
+from app.database import SessionLocal
+from app.models import Game
+from app.settings import settings
+
+client = TestClient(app)
+ADMIN = {"Authorization": "Bearer test"}
+
+
+def add_games(*projects: str) -> None:
+    with SessionLocal() as db:
+        db.add_all(Game(project=project, sanitized_name=project) for project in projects)
+        db.commit()
+
+
+def test_create_thumbnails_streams_progress(games: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    def refresh_thumb(game_url: str, force_recreate: bool = True) -> None:
+        if "broken" in game_url:
+            raise RuntimeError("capture failed")
+
+    monkeypatch.setattr(thumbs, "refresh_thumb", refresh_thumb)
+    add_games("pong", "tetris", "broken")
+
+    resp = client.get("/admin/create_thumbnails", headers=ADMIN)
+
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert sorted((line["project"], line["status"]) for line in lines[:-1]) == [
+        ("broken", "failed"),
+        ("pong", "success"),
+        ("tetris", "success"),
+    ]
+    assert lines[-1]["status"] == "done"
+    assert (lines[-1]["success"], lines[-1]["failed"], lines[-1]["skipped"]) == (2, 1, 0)
+
+    # The broken game is the only one left without a thumbnail.
+    resp = client.get("/admin/create_thumbnails", headers=ADMIN)
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["project"] for line in lines[:-1]] == ["broken"]
+    assert lines[-1]["skipped"] == 2
+
+
+def test_thumbnail_progress_stops_when_the_client_leaves(monkeypatch: pytest.MonkeyPatch) -> None:
+    rendered: list[str] = []
+
+    def render_thumbnail(project: str, html_path: str, force_recreate: bool) -> dict:
+        time.sleep(0.1)
+        rendered.append(project)
+        return {"project": project, "status": "success"}
+
+    monkeypatch.setattr(routes, "render_thumbnail", render_thumbnail)
+    monkeypatch.setattr(settings, "THUMBNAIL_CONCURRENCY", 1)
+    progress = routes.thumbnail_progress([(f"game-{i}", f"/game/game-{i}/") for i in range(10)], 0, False)
+
+    assert json.loads(next(progress))["project"] == "game-0"
+    progress.close()
+    # Only the render in flight finishes.
+    time.sleep(0.5)
+
+    assert len(rendered) == 2